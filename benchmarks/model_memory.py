@@ -0,0 +1,92 @@
+# benchmarks/model_memory.py - память и скорость моделей до и после __slots__
+#
+# Запуск: python -m benchmarks.model_memory [--count 100000]
+
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from db.models import User
+
+class LegacyUser:
+    """Прежняя модель пользователя: __dict__ на экземпляр и ISO строка даты"""
+    def __init__(self, user_id, username=None, first_name=None, last_name=None,
+                 language_code=None, created_at=None):
+        self.user_id = user_id
+        self.username = username
+        self.first_name = first_name
+        self.last_name = last_name
+        self.language_code = language_code
+        self.created_at = created_at or datetime.now().isoformat()
+
+def make_lines(count: int, epoch: bool = True) -> list:
+    """Записи пользователей в том виде, в каком они лежат в хранилище (строки JSON).
+
+    epoch=False - записи старого формата с ISO строкой даты.
+    """
+    started = datetime(2024, 1, 1)
+    return [json.dumps({
+        'user_id': 100000000 + i,
+        'username': f"user{i}",
+        'first_name': 'Иван',
+        'last_name': None,
+        'language_code': 'ru',
+        'created_at': (int((started + timedelta(seconds=i * 7)).timestamp()) if epoch
+                       else (started + timedelta(seconds=i * 7, microseconds=i)).isoformat())
+    }, ensure_ascii=False) for i in range(count)]
+
+def measure(factory, items: list):
+    """Байты, которые удерживает список построенных объектов, и время построения"""
+    started = time.perf_counter()
+    objects = [factory(item) for item in items]
+    elapsed = time.perf_counter() - started
+    del objects
+
+    # tracemalloc замедляет выделение памяти, поэтому память меряем отдельным проходом
+    tracemalloc.start()
+    objects = [factory(item) for item in items]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return objects, size, elapsed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark model memory usage')
+    parser.add_argument('--count', type=int, default=100000)
+    args = parser.parse_args(argv)
+
+    iso_lines = make_lines(args.count, epoch=False)
+    lines = make_lines(args.count)
+    _, legacy_bytes, legacy_time = measure(lambda line: LegacyUser(**json.loads(line)), iso_lines)
+    _, iso_bytes, iso_time = measure(lambda line: User(**json.loads(line)), iso_lines)
+    # Так загружает записи db/database.py (get_user, iter_users)
+    users, slotted_bytes, slotted_time = measure(lambda line: User(**json.loads(line)), lines)
+
+    tuples = [user.to_tuple() for user in users]
+    _, tuple_bytes, tuple_time = measure(User.from_tuple, tuples)
+
+    started = time.perf_counter()
+    for user in users:
+        user.to_tuple()
+    to_tuple_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for user in users:
+        user.to_dict()
+    to_dict_time = time.perf_counter() - started
+
+    print(f"{args.count} users")
+    print(f"{'variant':<28} {'MB':>8} {'bytes/user':>11} {'build, s':>9}")
+    for name, size, elapsed in [
+        ('legacy (__dict__, ISO str)', legacy_bytes, legacy_time),
+        ('slots (old ISO record)', iso_bytes, iso_time),
+        ('slots (epoch record)', slotted_bytes, slotted_time),
+        ('slots (from tuple)', tuple_bytes, tuple_time),
+    ]:
+        print(f"{name:<28} {size / 1024 / 1024:>8.1f} {size / args.count:>11.0f} {elapsed:>9.3f}")
+    print(f"to_tuple: {to_tuple_time:.3f}s, to_dict: {to_dict_time:.3f}s")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,82 @@
+# benchmarks/status_render.py - построение текста статуса и сообщений оплаты: без кэша и из кэша
+#
+# Запуск: python -m benchmarks.status_render [--users 1000 --repeats 20]
+
+import argparse
+import sys
+import time
+from config import PLANS
+from db.models import Subscription
+from services import messages
+from services.subscription_service import (render_subscription_status_text, get_subscription_status_text,
+                                           status_text_cache)
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+def make_subscriptions(count: int) -> list:
+    """Активные подписки с разными тарифами и датами окончания"""
+    now = int(time.time())
+    plans = list(PLANS.items())
+    subscriptions = []
+    for i in range(count):
+        plan, plan_info = plans[i % len(plans)]
+        start = now - (i % 30) * SECONDS_PER_DAY
+        subscriptions.append(Subscription(
+            user_id=100000000 + i, plan=plan, plan_name=plan_info['name'], price=plan_info['price'],
+            start_date=start, end_date=start + 30 * SECONDS_PER_DAY, status='active', payment_id=f"p{i}"))
+    return subscriptions
+
+def per_call_us(func, calls: int) -> float:
+    started = time.perf_counter()
+    func()
+    return (time.perf_counter() - started) / calls * 1e6
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark subscription status rendering')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--repeats', type=int, default=20, help='status checks per user')
+    args = parser.parse_args(argv)
+
+    subscriptions = make_subscriptions(args.users)
+    calls = args.users * args.repeats
+
+    def render_uncached():
+        for _ in range(args.repeats):
+            for subscription in subscriptions:
+                render_subscription_status_text(subscription, int(time.time()))
+
+    def render_cached():
+        for _ in range(args.repeats):
+            for subscription in subscriptions:
+                get_subscription_status_text(subscription)
+
+    # Первый проход заполняет кэш - он входит в замер, как при реальных повторных /status
+    status_text_cache.max_size = max(status_text_cache.max_size, args.users)
+    uncached = per_call_us(render_uncached, calls)
+    cached = per_call_us(render_cached, calls)
+
+    plan_args = [(info['name'], info['price'], info['description']) for info in PLANS.values()]
+
+    def payment_texts(get_text):
+        def run():
+            for _ in range(calls // len(plan_args)):
+                for plan_name, price, description in plan_args:
+                    get_text(plan_name, price, description)
+        return run
+
+    payment_calls = calls // len(plan_args) * len(plan_args)
+    payment_uncached = per_call_us(payment_texts(messages.get_payment_text.__wrapped__), payment_calls)
+    payment_cached = per_call_us(payment_texts(messages.get_payment_text), payment_calls)
+
+    print(f"{args.users} users x {args.repeats} status checks")
+    print(f"{'text':<16} {'uncached, us':>13} {'cached, us':>11} {'speedup':>8}")
+    for name, before, after in [
+        ('status', uncached, cached),
+        ('payment', payment_uncached, payment_cached),
+    ]:
+        print(f"{name:<16} {before:>13.2f} {after:>11.2f} {before / after:>7.1f}x")
+    print(f"status cache: {status_text_cache.stats()}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
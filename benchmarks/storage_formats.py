@@ -0,0 +1,88 @@
+# benchmarks/storage_formats.py - сравнение форматов файлов таблиц
+#
+# Запуск: python -m benchmarks.storage_formats [--sizes 10000,100000,1000000]
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from db import serializers, storage
+from db.storage import _load_json_file, _save_json_file
+
+def make_payments(count: int) -> dict:
+    """Синтетическая таблица платежей того же вида, что и payments.json"""
+    started = datetime(2024, 1, 1)
+    plans = [('basic', 999), ('premium', 1999), ('vip', 3999)]
+    payments = {}
+    for i in range(count):
+        payment_id = str(uuid.UUID(int=i))
+        plan, amount = plans[i % len(plans)]
+        created_at = started + timedelta(minutes=i)
+        payments[payment_id] = {
+            'payment_id': payment_id,
+            'user_id': 100000000 + i % 50000,
+            'plan': plan,
+            'amount': amount,
+            'status': 'succeeded' if i % 4 else 'pending',
+            'created_at': created_at.isoformat(),
+            'confirmed_at': (created_at + timedelta(minutes=3)).isoformat() if i % 4 else None,
+            'yookassa_id': f"2d{i:032x}"[:36]
+        }
+    return payments
+
+def bench_format(name: str, data: dict, directory: str) -> dict:
+    serializer = serializers.get_serializer(name)
+    file_path = os.path.join(directory, f"payments.{name}")
+
+    started = time.perf_counter()
+    _save_json_file(file_path, data, fsync=False, serializer=serializer)
+    save_time = time.perf_counter() - started
+
+    # Первое чтение - без кэша разобранных файлов
+    storage._read_cache.clear()
+
+    started = time.perf_counter()
+    loaded = _load_json_file(file_path)
+    load_time = time.perf_counter() - started
+    assert len(loaded) == len(data)
+
+    started = time.perf_counter()
+    _load_json_file(file_path)
+    cached_time = time.perf_counter() - started
+
+    return {
+        'format': serializer.name,
+        'save_s': save_time,
+        'load_s': load_time,
+        'cached_load_s': cached_time,
+        'size_mb': os.path.getsize(file_path) / 1024 / 1024
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark storage file formats')
+    parser.add_argument('--sizes', default='10000,100000,1000000', help='comma separated record counts')
+    parser.add_argument('--formats', default='json,compact,orjson,msgpack')
+    args = parser.parse_args(argv)
+
+    formats = [name for name in args.formats.split(',')
+               if not (name == 'orjson' and serializers.orjson is None)
+               and not (name == 'msgpack' and serializers.msgpack is None)]
+    skipped = set(args.formats.split(',')) - set(formats)
+    if skipped:
+        print(f"Skipping formats that are not installed: {', '.join(sorted(skipped))}")
+
+    print(f"{'records':>9} {'format':>8} {'save, s':>9} {'load, s':>9} {'cached, s':>10} {'size, MB':>9}")
+    with tempfile.TemporaryDirectory() as directory:
+        for size in (int(value) for value in args.sizes.split(',')):
+            data = make_payments(size)
+            for name in formats:
+                result = bench_format(name, data, directory)
+                print(f"{size:>9} {result['format']:>8} {result['save_s']:>9.3f} {result['load_s']:>9.3f} "
+                      f"{result['cached_load_s']:>10.4f} {result['size_mb']:>9.1f}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -12,6 +12,17 @@ API_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN', '8579553512:AAFd_9Rm2oxJV01BDkLlonXU
 # === YOOKASSA PAYMENT ===
 YOOKASSA_SHOP_ID = os.getenv('YOOKASSA_SHOP_ID', '1227929')
 YOOKASSA_SECRET_KEY = os.getenv('YOOKASSA_SECRET_KEY', 'test_nGg_nxAslebQ_bX-K2U43g8RK4XaejdPxsKQpVtqo8o')
+YOOKASSA_API_URL = os.getenv('YOOKASSA_API_URL', 'https://api.yookassa.ru/v3')  # для тестов - локальный сервер
+YOOKASSA_CONNECT_TIMEOUT = float(os.getenv('YOOKASSA_CONNECT_TIMEOUT', '3'))  # сек
+YOOKASSA_READ_TIMEOUT = float(os.getenv('YOOKASSA_READ_TIMEOUT', '10'))  # сек
+YOOKASSA_POOL_SIZE = int(os.getenv('YOOKASSA_POOL_SIZE', '10'))  # keep-alive соединений
+YOOKASSA_ATTEMPTS = int(os.getenv('YOOKASSA_ATTEMPTS', '2'))  # попыток запроса (с тем же ключом идемпотентности)
+YOOKASSA_BREAKER_THRESHOLD = int(os.getenv('YOOKASSA_BREAKER_THRESHOLD', '5'))  # сбоев подряд до отключения
+YOOKASSA_BREAKER_RESET = float(os.getenv('YOOKASSA_BREAKER_RESET', '30'))  # сек до пробного запроса
+PAYMENT_WORKERS = int(os.getenv('PAYMENT_WORKERS', '8'))  # потоков для запросов к YooKassa
+PENDING_PAYMENT_TTL = float(os.getenv('PENDING_PAYMENT_TTL', '600'))  # сек, сколько показывать ту же ссылку на оплату
+PAYMENT_CONTEXT_TTL = float(os.getenv('PAYMENT_CONTEXT_TTL', '86400'))  # сек, сколько хранить сообщение неоплаченного платежа
+PAYMENT_CONTEXT_MAX = int(os.getenv('PAYMENT_CONTEXT_MAX', '10000'))  # максимум неоплаченных платежей в хранилище
 
 # === APPLICATION SETTINGS ===
 DEBUG = os.getenv('DEBUG', 'False').lower() == 'true'
@@ -21,34 +32,83 @@ ENVIRONMENT = os.getenv('ENVIRONMENT', 'development')  # development / productio
 WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', 'localhost')
 WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '5000'))
 WEBHOOK_PATH = '/yookassa/webhook'
+WEBHOOK_QUEUE_FILE = os.getenv('WEBHOOK_QUEUE_FILE', 'webhook_queue.db')  # очередь необработанных уведомлений
+WEBHOOK_WORKERS = int(os.getenv('WEBHOOK_WORKERS', '4'))  # потоков обработки уведомлений
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv('WEBHOOK_MAX_ATTEMPTS', '8'))  # попыток до переноса в dead
+WEBHOOK_RETRY_MAX = float(os.getenv('WEBHOOK_RETRY_MAX', '300'))  # сек, максимальная пауза между попытками
+WEBHOOK_DEDUP_TTL = float(os.getenv('WEBHOOK_DEDUP_TTL', '172800'))  # сек, сколько помнить принятые уведомления
 
 # === DATABASE ===
 USERS_FILE = os.getenv('USERS_FILE', 'users.json')
 SUBSCRIPTIONS_FILE = os.getenv('SUBSCRIPTIONS_FILE', 'subscriptions.json')
 PAYMENTS_FILE = os.getenv('PAYMENTS_FILE', 'payments.json')
+PAYMENT_CONTEXTS_FILE = os.getenv('PAYMENT_CONTEXTS_FILE', 'payment_contexts.json')  # общий для бота и webhook сервера
+DB_BACKEND = os.getenv('DB_BACKEND', 'journal')  # journal (в памяти + журнал изменений) / sqlite / json
+DB_JOURNAL_FILE = os.getenv('DB_JOURNAL_FILE', 'db.journal')
+DB_SQLITE_FILE = os.getenv('DB_SQLITE_FILE', 'bot.db')
+DB_FSYNC = os.getenv('DB_FSYNC', 'True').lower() == 'true'
+DB_COMPACT_BYTES = int(os.getenv('DB_COMPACT_BYTES', str(4 * 1024 * 1024)))
+DB_FORMAT = os.getenv('DB_FORMAT', 'compact')  # compact / json / orjson / msgpack, при чтении определяется сам
+DB_SCAN_CHUNK = int(os.getenv('DB_SCAN_CHUNK', '500'))  # размер порции при потоковом чтении таблиц
+
+# === INTERFACE ===
+EDIT_DELAY = float(os.getenv('EDIT_DELAY', '1'))  # задержка перед правкой сообщения по кнопке, сек
+DELAYED_ACTION_WORKERS = int(os.getenv('DELAYED_ACTION_WORKERS', '4'))
+CHAT_HISTORY_SIZE = int(os.getenv('CHAT_HISTORY_SIZE', '50'))  # сколько последних сообщений бота помнить в чате
+CHAT_HISTORY_CHATS = int(os.getenv('CHAT_HISTORY_CHATS', '10000'))  # сколько чатов помнить
+RENDER_CACHE_SIZE = int(os.getenv('RENDER_CACHE_SIZE', '50000'))  # сообщений в кэше отображенного содержимого
+STATUS_CACHE_SIZE = int(os.getenv('STATUS_CACHE_SIZE', '10000'))  # готовых текстов статуса подписки
+
+# === RUNTIME ===
+UPDATE_WORKERS = int(os.getenv('UPDATE_WORKERS', '8'))  # потоков обработки обновлений (шарды по chat_id)
+BOT_RUNTIME = os.getenv('BOT_RUNTIME', 'sync')  # sync (TeleBot + потоки) / async (AsyncTeleBot)
+ASYNC_HTTP_LIMIT = int(os.getenv('ASYNC_HTTP_LIMIT', '100'))  # соединений в общей aiohttp сессии
+ASYNC_OFFLOAD_WORKERS = int(os.getenv('ASYNC_OFFLOAD_WORKERS', '16'))  # потоков для хранилища и YooKassa
+
+# === SEND QUEUE ===
+SEND_RATE_GLOBAL = float(os.getenv('SEND_RATE_GLOBAL', '30'))  # сообщений в секунду на весь бот
+SEND_RATE_CHAT = float(os.getenv('SEND_RATE_CHAT', '1'))  # сообщений в секунду в один чат
+SEND_CHAT_BURST = float(os.getenv('SEND_CHAT_BURST', '3'))  # сообщений подряд в чат без ожидания
+SEND_WORKERS = int(os.getenv('SEND_WORKERS', '8'))  # потоков для запросов к Bot API
+SEND_MAX_RETRIES = int(os.getenv('SEND_MAX_RETRIES', '5'))  # повторов после 429 Too Many Requests
+
+# === BROADCAST ===
+BROADCAST_FILE = os.getenv('BROADCAST_FILE', 'broadcast.journal')  # прогресс рассылки для возобновления
+BROADCAST_CONCURRENCY = int(os.getenv('BROADCAST_CONCURRENCY', '30'))  # одновременных отправок
+BROADCAST_REPORT_INTERVAL = float(os.getenv('BROADCAST_REPORT_INTERVAL', '15'))  # секунд между отчетами
 
 # === PLANS CONFIGURATION ===
 PLANS = {
     'basic': {
         'price': 999,
         'name': 'Базовый тариф',
+        'short_name': 'Базовый',  # название на кнопке оплаты
+        'emoji': '🟢',
         'description': 'Основные функции продукта',
         'duration_days': 30
     },
     'premium': {
         'price': 1999,
         'name': 'Премиум тариф',
+        'short_name': 'Премиум',  # название на кнопке оплаты
+        'emoji': '🟡',
         'description': 'Расширенные возможности',
         'duration_days': 30
     },
     'vip': {
         'price': 3999,
         'name': 'VIP тариф',
+        'short_name': 'VIP',  # название на кнопке оплаты
+        'emoji': '🟠',
         'description': 'Максимум преимуществ',
         'duration_days': 30
     }
 }
 
+# === ADMINISTRATION ===
+# Telegram ID администраторов через запятую
+ADMIN_IDS = [int(admin_id) for admin_id in os.getenv('ADMIN_IDS', '').split(',') if admin_id.strip()]
+
 # === LOGGING ===
 LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
 LOG_FILE = os.getenv('LOG_FILE', 'bot.log')
@@ -2,49 +2,83 @@
 
 import json
 import os
-from datetime import datetime
-from typing import Optional, Dict, List
-from .models import User, Subscription, Payment
+import threading
+import time
+from typing import Optional, Dict, List, Tuple, Iterator
+from config import (USERS_FILE, SUBSCRIPTIONS_FILE, PAYMENTS_FILE, PAYMENT_CONTEXTS_FILE, DB_BACKEND,
+                    DB_JOURNAL_FILE, DB_SQLITE_FILE, DB_FSYNC, DB_COMPACT_BYTES, DB_FORMAT, DB_SCAN_CHUNK)
+from .models import User, Subscription, Payment, Timestamp, to_epoch
+from .serializers import get_serializer
+from .storage import BaseStorage, JsonFileStorage, get_read_cache_stats
 
-# Файлы для хранения данных
-USERS_FILE = os.getenv('USERS_FILE', 'users.json')
-SUBSCRIPTIONS_FILE = os.getenv('SUBSCRIPTIONS_FILE', 'subscriptions.json')
-PAYMENTS_FILE = os.getenv('PAYMENTS_FILE', 'payments.json')
+_storage: Optional[BaseStorage] = None
+_storage_lock = threading.Lock()
+
+def _create_storage() -> BaseStorage:
+    """Создание хранилища согласно DB_BACKEND"""
+    files = {
+        'users': USERS_FILE,
+        'subscriptions': SUBSCRIPTIONS_FILE,
+        'payments': PAYMENTS_FILE,
+        'payment_contexts': PAYMENT_CONTEXTS_FILE
+    }
+    if DB_BACKEND == 'json':
+        return JsonFileStorage(files, fsync=DB_FSYNC, serializer=get_serializer(DB_FORMAT))
+    if DB_BACKEND == 'journal':
+        from .journal import JournalStorage
+        return JournalStorage(files, DB_JOURNAL_FILE, fsync=DB_FSYNC, compact_bytes=DB_COMPACT_BYTES,
+                              serializer=get_serializer(DB_FORMAT))
+    if DB_BACKEND == 'sqlite':
+        from .sqlite_storage import SqliteStorage
+        return SqliteStorage(files, DB_SQLITE_FILE, fsync=DB_FSYNC)
+    raise ValueError(f"Unknown DB_BACKEND: {DB_BACKEND}")
+
+def get_storage() -> BaseStorage:
+    """Получение хранилища (создается при первом обращении)"""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                _storage = _create_storage()
+    return _storage
+
+def close_database():
+    """Закрытие хранилища"""
+    global _storage
+    with _storage_lock:
+        if _storage is not None:
+            _storage.close()
+            _storage = None
+
+def transaction():
+    """Транзакция хранилища: чтения и записи внутри фиксируются атомарно одной операцией.
+
+    with transaction():
+        payment = get_payment(payment_id)
+        update_payment_status(payment_id, 'succeeded')
+    """
+    return get_storage().transaction()
 
 def init_database():
     """Инициализация базы данных"""
-    for file_path in [USERS_FILE, SUBSCRIPTIONS_FILE, PAYMENTS_FILE]:
+    if DB_BACKEND == 'sqlite':
+        get_storage()
+        return
+    for file_path in [USERS_FILE, SUBSCRIPTIONS_FILE, PAYMENTS_FILE, PAYMENT_CONTEXTS_FILE]:
         if not os.path.exists(file_path):
             with open(file_path, 'w', encoding='utf-8') as f:
                 json.dump({}, f, ensure_ascii=False, indent=2)
-
-def _load_json_file(file_path: str) -> Dict:
-    """Загрузка JSON файла"""
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {}
-    except json.JSONDecodeError:
-        return {}
-
-def _save_json_file(file_path: str, data: Dict):
-    """Сохранение JSON файла"""
-    with open(file_path, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2, default=str)
+    get_storage()
 
 # ===== ФУНКЦИИ ДЛЯ РАБОТЫ С ПОЛЬЗОВАТЕЛЯМИ =====
 
 def save_user(user: User):
     """Сохранение пользователя"""
-    users = _load_json_file(USERS_FILE)
-    users[str(user.user_id)] = user.to_dict()
-    _save_json_file(USERS_FILE, users)
+    get_storage().put('users', str(user.user_id), user.to_dict())
 
 def get_user(user_id: int) -> Optional[User]:
     """Получение пользователя по ID"""
-    users = _load_json_file(USERS_FILE)
-    user_data = users.get(str(user_id))
+    user_data = get_storage().get('users', str(user_id))
     if user_data:
         return User(**user_data)
     return None
@@ -79,105 +113,145 @@ def get_or_create_user(user_id: int, username: Optional[str] = None,
         save_user(user)
         return user
 
+def iter_users(chunk_size: int = DB_SCAN_CHUNK) -> Iterator[User]:
+    """Потоковый проход по всем пользователям (читаются порциями по chunk_size)"""
+    for user_data in get_storage().scan('users', chunk_size):
+        yield User(**user_data)
+
 def get_all_users() -> List[User]:
     """Получение всех пользователей"""
-    users = _load_json_file(USERS_FILE)
-    return [User(**user_data) for user_data in users.values()]
+    return list(iter_users())
 
 # ===== ФУНКЦИИ ДЛЯ РАБОТЫ С ПОДПИСКАМИ =====
 
 def save_subscription(subscription: Subscription):
     """Сохранение подписки"""
-    subscriptions = _load_json_file(SUBSCRIPTIONS_FILE)
-    subscriptions[str(subscription.user_id)] = subscription.to_dict()
-    _save_json_file(SUBSCRIPTIONS_FILE, subscriptions)
+    get_storage().put('subscriptions', str(subscription.user_id), subscription.to_dict())
 
 def get_user_subscription(user_id: int) -> Optional[Subscription]:
     """Получение подписки пользователя"""
-    subscriptions = _load_json_file(SUBSCRIPTIONS_FILE)
-    sub_data = subscriptions.get(str(user_id))
+    sub_data = get_storage().get('subscriptions', str(user_id))
     if sub_data:
         return Subscription(**sub_data)
     return None
 
 def check_expired_subscriptions() -> int:
     """Проверка и обновление истекших подписок. Возвращает количество обновленных подписок."""
-    subscriptions = _load_json_file(SUBSCRIPTIONS_FILE)
-    updated_count = 0
+    storage = get_storage()
+    # Даты в хранилище - epoch (to_epoch разбирает только записи старого формата)
+    now = int(time.time())
+    expired = {}
+
+    for sub in storage.scan('subscriptions', DB_SCAN_CHUNK, status='active'):
+        if to_epoch(sub['end_date']) < now:
+            expired[str(sub['user_id'])] = {**sub, 'status': 'expired'}
+
+    if expired:
+        storage.put_many('subscriptions', expired)
 
-    for user_id, sub in subscriptions.items():
-        if sub['status'] == 'active':
-            end_date = datetime.fromisoformat(sub['end_date'])
-            if end_date < datetime.now():
-                sub['status'] = 'expired'
-                updated_count += 1
+    return len(expired)
 
-    if updated_count > 0:
-        _save_json_file(SUBSCRIPTIONS_FILE, subscriptions)
+def iter_subscriptions(status: Optional[str] = None, chunk_size: int = DB_SCAN_CHUNK) -> Iterator[Subscription]:
+    """Потоковый проход по подпискам, при необходимости - только с заданным статусом"""
+    filters = {'status': status} if status is not None else {}
+    for sub_data in get_storage().scan('subscriptions', chunk_size, **filters):
+        yield Subscription(**sub_data)
 
-    return updated_count
+def get_active_subscriptions() -> List[Subscription]:
+    """Получение всех активных подписок"""
+    return list(iter_subscriptions(status='active'))
+
+def expire_subscriptions(user_ids: List[int]) -> Tuple[List[int], List[Subscription]]:
+    """Пакетное истечение подписок пользователей одной записью.
+
+    Каждая подписка перепроверяется: истекают только активные с наступившей
+    датой окончания. Возвращает (ID истекших, подписки, которые оказались продлены).
+    """
+    storage = get_storage()
+    now = int(time.time())
+    expired = {}
+    extended = []
+
+    with storage.transaction():
+        for user_id in user_ids:
+            sub = storage.get('subscriptions', str(user_id))
+            if not sub or sub['status'] != 'active':
+                continue
+            if to_epoch(sub['end_date']) <= now:
+                expired[str(user_id)] = {**sub, 'status': 'expired'}
+            else:
+                extended.append(Subscription(**sub))
+
+        if expired:
+            storage.put_many('subscriptions', expired)
+
+    return [int(user_id) for user_id in expired], extended
 
 # ===== ФУНКЦИИ ДЛЯ РАБОТЫ С ПЛАТЕЖАМИ =====
 
 def save_payment(payment: Payment):
     """Сохранение платежа"""
-    payments = _load_json_file(PAYMENTS_FILE)
-    payments[payment.payment_id] = payment.to_dict()
-    _save_json_file(PAYMENTS_FILE, payments)
+    get_storage().put('payments', payment.payment_id, payment.to_dict())
 
 def get_payment(payment_id: str) -> Optional[Payment]:
     """Получение платежа по ID"""
-    payments = _load_json_file(PAYMENTS_FILE)
-    payment_data = payments.get(payment_id)
+    payment_data = get_storage().get('payments', payment_id)
     if payment_data:
         return Payment(**payment_data)
     return None
 
-def update_payment_status(payment_id: str, status: str, confirmed_at: Optional[str] = None) -> bool:
+def update_payment_status(payment_id: str, status: str, confirmed_at: Optional[Timestamp] = None) -> bool:
     """Обновление статуса платежа"""
-    payments = _load_json_file(PAYMENTS_FILE)
-    if payment_id in payments:
-        payments[payment_id]['status'] = status
-        if confirmed_at:
-            payments[payment_id]['confirmed_at'] = confirmed_at
-        _save_json_file(PAYMENTS_FILE, payments)
-        return True
-    return False
+    fields = {'status': status}
+    if confirmed_at:
+        fields['confirmed_at'] = to_epoch(confirmed_at)
+    return get_storage().update('payments', payment_id, fields)
+
+def iter_payments(status: Optional[str] = None, user_id: Optional[int] = None,
+                  chunk_size: int = DB_SCAN_CHUNK) -> Iterator[Payment]:
+    """Потоковый проход по платежам с фильтром по статусу и/или пользователю"""
+    filters = {}
+    if status is not None:
+        filters['status'] = status
+    if user_id is not None:
+        filters['user_id'] = user_id
+    for payment_data in get_storage().scan('payments', chunk_size, **filters):
+        yield Payment(**payment_data)
 
 def get_user_payments(user_id: int) -> List[Payment]:
     """Получение всех платежей пользователя"""
-    payments = _load_json_file(PAYMENTS_FILE)
-    user_payments = []
-    for payment_data in payments.values():
-        if payment_data['user_id'] == user_id:
-            user_payments.append(Payment(**payment_data))
-    return user_payments
+    return list(iter_payments(user_id=user_id))
+
+def get_payments_by_status(status: str) -> List[Payment]:
+    """Получение платежей с заданным статусом"""
+    return list(iter_payments(status=status))
 
 def get_pending_payments() -> List[Payment]:
     """Получение платежей со статусом pending"""
-    payments = _load_json_file(PAYMENTS_FILE)
-    pending_payments = []
-    for payment_data in payments.values():
-        if payment_data['status'] == 'pending':
-            pending_payments.append(Payment(**payment_data))
-    return pending_payments
+    return get_payments_by_status('pending')
+
+def get_payment_by_yookassa_id(yookassa_id: str) -> Optional[Payment]:
+    """Получение платежа по ID платежа в YooKassa (object.id в webhook)"""
+    if not yookassa_id:
+        return None
+    payments = get_storage().find('payments', yookassa_id=yookassa_id)
+    if payments:
+        return Payment(**payments[0])
+    return None
 
 # ===== СТАТИСТИКА =====
 
 def get_statistics() -> Dict:
-    """Получение общей статистики"""
-    users = get_all_users()
-    subscriptions = _load_json_file(SUBSCRIPTIONS_FILE)
-    payments = _load_json_file(PAYMENTS_FILE)
-
-    active_subscriptions = sum(1 for sub in subscriptions.values() if sub['status'] == 'active')
-    total_payments = len(payments)
-    successful_payments = sum(1 for p in payments.values() if p['status'] == 'succeeded')
+    """Получение общей статистики (по счетчикам хранилища, без прохода по данным)"""
+    stats = get_storage().stats()
+    payments_by_status = stats['payments_by_status']
 
     return {
-        'total_users': len(users),
-        'active_subscriptions': active_subscriptions,
-        'total_payments': total_payments,
-        'successful_payments': successful_payments,
-        'failed_payments': sum(1 for p in payments.values() if p['status'] == 'failed')
+        'total_users': stats['users'],
+        'active_subscriptions': stats['active_subscriptions'],
+        'total_payments': sum(payments_by_status.values()),
+        'successful_payments': payments_by_status.get('succeeded', 0),
+        'failed_payments': payments_by_status.get('failed', 0),
+        'payments_by_status': payments_by_status,
+        'revenue_by_plan': stats['revenue_by_plan']
     }
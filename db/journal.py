@@ -0,0 +1,445 @@
+# db/journal.py - хранилище в памяти с журналом изменений (append-only)
+
+import bisect
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Optional, Dict, List, Iterable, Iterator, Tuple, Set
+from .stats import StatsCounters
+from .storage import BaseStorage, _load_json_file, _save_json_file, _write_file_atomic
+from utils.logger import get_logger
+
+try:
+    import fcntl
+except ImportError:  # Windows: межпроцессная блокировка недоступна, только один процесс
+    fcntl = None
+
+logger = get_logger(__name__)
+
+# Вторичные индексы: таблица -> поля, по которым поддерживается value -> {ключи}
+INDEXED_FIELDS = {
+    'payments': ('user_id', 'status', 'yookassa_id'),
+    'subscriptions': ('status',)
+}
+
+# Упорядоченные индексы: таблица -> поля, по которым поддерживается отсортированный список (value, ключ)
+ORDERED_FIELDS = {
+    'payment_contexts': ('expires_at',)
+}
+
+@contextmanager
+def _flock(lock_file, mode):
+    """Межпроцессная блокировка файла (flock)"""
+    if fcntl is None:
+        yield
+        return
+    fcntl.flock(lock_file.fileno(), mode)
+    try:
+        yield
+    finally:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+def _encode_entry(table: str, key: str, record: Optional[Dict]) -> bytes:
+    """Одна строка журнала: [таблица, ключ, запись]"""
+    line = json.dumps([table, key, record], ensure_ascii=False, separators=(',', ':'), default=str)
+    return (line + '\n').encode('utf-8')
+
+class JournalStorage(BaseStorage):
+    """Хранилище, держащее все таблицы в памяти.
+
+    JSON файлы таблиц служат снимком (snapshot), каждое изменение дописывается
+    одной строкой в журнал. При старте снимок загружается и журнал проигрывается,
+    фоновый поток периодически сворачивает журнал в новый снимок.
+    Несколько процессов (бот и webhook) могут работать с одним журналом:
+    запись идет под flock, а перед каждым чтением подхватываются чужие строки.
+    """
+
+    def __init__(self, files: Dict[str, str], journal_path: str, fsync: bool = True,
+                 compact_bytes: int = 4 * 1024 * 1024, compact_interval: float = 60.0, serializer=None):
+        super().__init__(files)
+        self.serializer = serializer
+        self.journal_path = journal_path
+        self.fsync = fsync
+        self.compact_bytes = compact_bytes
+        self.compact_interval = compact_interval
+
+        self._data: Dict[str, Dict[str, Dict]] = {table: {} for table in self.tables}
+        self._indexes: Dict[str, Dict[str, Dict[object, Set[str]]]] = {
+            table: {field: {} for field in INDEXED_FIELDS.get(table, ())} for table in self.tables
+        }
+        self._ordered: Dict[str, Dict[str, List[Tuple[object, str]]]] = {
+            table: {field: [] for field in ORDERED_FIELDS.get(table, ())} for table in self.tables
+        }
+        self._stats = StatsCounters()
+        self._lock = threading.RLock()
+        self._write_depth = 0
+        self._tx: Optional[List[Tuple[str, str, Optional[Dict]]]] = None
+        self._tx_undo: Dict[Tuple[str, str], Optional[Dict]] = {}
+        self._journal = None
+        self._inode = None
+        self._offset = 0
+
+        self._lock_file = open(f"{journal_path}.lock", 'a+b')
+        self._compact_lock_file = open(f"{journal_path}.compact.lock", 'a+b')
+
+        with self._lock, _flock(self._lock_file, fcntl.LOCK_EX if fcntl else None):
+            self._repair_journal()
+            self._reload()
+
+        self._stop = threading.Event()
+        self._compactor = threading.Thread(target=self._compact_loop, name='journal-compactor', daemon=True)
+        self._compactor.start()
+
+    # ===== ЗАГРУЗКА И ПРОИГРЫВАНИЕ ЖУРНАЛА =====
+
+    def _repair_journal(self):
+        """Обрезка недописанной последней строки после аварийного завершения"""
+        try:
+            with open(self.journal_path, 'r+b') as f:
+                data = f.read()
+                if data and not data.endswith(b'\n'):
+                    valid_size = data.rfind(b'\n') + 1
+                    f.truncate(valid_size)
+                    logger.warning(f"Journal {self.journal_path}: truncated {len(data) - valid_size} bytes of incomplete entry")
+        except FileNotFoundError:
+            pass
+
+    def _reload(self):
+        """Загрузка снимков и проигрывание журнала с начала (под блокировкой файла)"""
+        for table, file_path in self.files.items():
+            self._data[table] = _load_json_file(file_path)
+            self._rebuild_indexes(table)
+        self._stats.rebuild({table: data.values() for table, data in self._data.items()})
+
+        if self._journal:
+            self._journal.close()
+        self._journal = open(self.journal_path, 'a+b')
+        self._inode = os.fstat(self._journal.fileno()).st_ino
+        self._offset = 0
+        replayed = self._replay()
+        if replayed:
+            logger.info(f"Journal {self.journal_path}: replayed {replayed} entries")
+
+    def _replay(self) -> int:
+        """Применение новых строк журнала начиная с текущего смещения"""
+        self._journal.seek(self._offset)
+        chunk = self._journal.read()
+        # Недописанную строку (ее может писать другой процесс) оставляем на потом
+        end = chunk.rfind(b'\n') + 1
+        if not end:
+            return 0
+
+        count = 0
+        for line in chunk[:end].splitlines():
+            try:
+                table, key, record = json.loads(line)
+            except (ValueError, TypeError):
+                logger.warning(f"Journal {self.journal_path}: skipping corrupted entry")
+                continue
+            if table in self._data:
+                self._apply(table, key, record)
+                count += 1
+        self._offset += end
+        return count
+
+    def _catch_up(self, locked: bool = False):
+        """Подхватить изменения других процессов: новые строки или свернутый журнал"""
+        try:
+            st = os.stat(self.journal_path)
+        except FileNotFoundError:
+            return
+        if st.st_ino != self._inode:
+            # Журнал свернули в другом процессе - перечитываем снимки
+            if locked:
+                self._reload()
+            else:
+                with _flock(self._lock_file, fcntl.LOCK_SH if fcntl else None):
+                    self._reload()
+        elif st.st_size > self._offset:
+            self._replay()
+
+    def _apply(self, table: str, key: str, record: Optional[Dict]):
+        """Применение одной записи журнала к данным в памяти"""
+        old = self._data[table].get(key)
+        self._stats.apply(table, old, record)
+
+        indexes = self._indexes[table]
+        if indexes:
+            for field, index in indexes.items():
+                old_value = old.get(field) if old else None
+                new_value = record.get(field) if record else None
+                if old is not None and (record is None or old_value != new_value):
+                    self._index_remove(index, old_value, key)
+                if record is not None and (old is None or old_value != new_value):
+                    index.setdefault(new_value, set()).add(key)
+
+        for field, entries in self._ordered[table].items():
+            old_value = old.get(field) if old else None
+            new_value = record.get(field) if record else None
+            if old_value == new_value:
+                continue
+            if old_value is not None:
+                position = bisect.bisect_left(entries, (old_value, key))
+                if position < len(entries) and entries[position] == (old_value, key):
+                    del entries[position]
+            if new_value is not None:
+                bisect.insort(entries, (new_value, key))
+
+        if record is None:
+            self._data[table].pop(key, None)
+        else:
+            self._data[table][key] = record
+
+    @staticmethod
+    def _index_remove(index: Dict[object, Set[str]], value, key: str):
+        keys = index.get(value)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del index[value]
+
+    def _rebuild_indexes(self, table: str):
+        """Построение вторичных индексов таблицы с нуля"""
+        for field in self._indexes[table]:
+            index = {}
+            for key, record in self._data[table].items():
+                index.setdefault(record.get(field), set()).add(key)
+            self._indexes[table][field] = index
+        for field in self._ordered[table]:
+            self._ordered[table][field] = sorted(
+                (record[field], key) for key, record in self._data[table].items() if record.get(field) is not None)
+
+    # ===== ЗАПИСЬ =====
+
+    @contextmanager
+    def _writing(self):
+        """Эксклюзивный доступ на запись: поток + процесс, с подхватом чужих изменений"""
+        with self._lock:
+            # Вложенный вызов (например, внутри транзакции) - блокировка уже взята
+            if self._write_depth:
+                self._write_depth += 1
+                try:
+                    yield
+                finally:
+                    self._write_depth -= 1
+                return
+
+            with _flock(self._lock_file, fcntl.LOCK_EX if fcntl else None):
+                self._write_depth = 1
+                try:
+                    self._catch_up(locked=True)
+                    self._truncate_partial()
+                    yield
+                finally:
+                    self._write_depth = 0
+
+    def _truncate_partial(self):
+        """Обрезка строки, недописанной упавшим писателем другого процесса (под эксклюзивной блокировкой).
+
+        Иначе следующая запись склеится с ней в одну строку, которая не разберется при проигрывании.
+        """
+        size = os.fstat(self._journal.fileno()).st_size
+        if size > self._offset:
+            self._journal.truncate(self._offset)
+            logger.warning(f"Journal {self.journal_path}: truncated {size - self._offset} bytes of incomplete entry")
+
+    def _write(self, entries: List[Tuple[str, str, Optional[Dict]]]):
+        """Запись пачки изменений в журнал одним write и одним fsync"""
+        payload = b''.join(_encode_entry(table, key, record) for table, key, record in entries)
+        self._journal.write(payload)
+        self._journal.flush()
+        if self.fsync:
+            os.fsync(self._journal.fileno())
+        self._offset = os.fstat(self._journal.fileno()).st_size
+
+    def _append(self, entries: List[Tuple[str, str, Optional[Dict]]]):
+        """Запись изменений в журнал и применение в памяти (в транзакции - откладывается до commit)"""
+        if self._tx is not None:
+            for table, key, record in entries:
+                # Для отката запоминаем значение до первого изменения в транзакции
+                self._tx_undo.setdefault((table, key), self._data[table].get(key))
+                self._apply(table, key, record)
+            self._tx.extend(entries)
+            return
+
+        self._write(entries)
+        for table, key, record in entries:
+            self._apply(table, key, record)
+
+    @contextmanager
+    def transaction(self):
+        with self._writing():
+            if self._tx is not None:
+                yield
+                return
+
+            self._tx = []
+            self._tx_undo = {}
+            try:
+                yield
+                if self._tx:
+                    self._write(self._tx)
+            except BaseException:
+                for (table, key), record in self._tx_undo.items():
+                    self._apply(table, key, record)
+                raise
+            finally:
+                self._tx = None
+                self._tx_undo = {}
+
+    def put_many(self, table: str, records: Dict[str, Dict]):
+        if not records:
+            return
+        with self._writing():
+            self._append([(table, key, record) for key, record in records.items()])
+
+    def update(self, table: str, key: str, fields: Dict) -> bool:
+        with self._writing():
+            current = self._data[table].get(key)
+            if current is None:
+                return False
+            # Записи в памяти не изменяются на месте - создаем новый словарь
+            self._append([(table, key, {**current, **fields})])
+            return True
+
+    def delete_many(self, table: str, keys: Iterable[str]) -> int:
+        with self._writing():
+            # Удаление - запись журнала с пустым значением
+            entries = [(table, key, None) for key in dict.fromkeys(keys) if key in self._data[table]]
+            if entries:
+                self._append(entries)
+            return len(entries)
+
+    # ===== ЧТЕНИЕ =====
+
+    def get(self, table: str, key: str) -> Optional[Dict]:
+        with self._lock:
+            self._catch_up()
+            return self._data[table].get(key)
+
+    def values(self, table: str) -> List[Dict]:
+        with self._lock:
+            self._catch_up()
+            return list(self._data[table].values())
+
+    def items(self, table: str) -> Iterable[Tuple[str, Dict]]:
+        with self._lock:
+            self._catch_up()
+            return list(self._data[table].items())
+
+    def find(self, table: str, **filters) -> List[Dict]:
+        with self._lock:
+            self._catch_up()
+            indexes = self._indexes[table]
+            indexed = [field for field in filters if field in indexes]
+            if not indexed:
+                return super().find(table, **filters)
+
+            # Начинаем с самого маленького множества ключей из индексов
+            candidates = min((indexes[field].get(filters[field], ()) for field in indexed), key=len)
+            data = self._data[table]
+            return [data[key] for key in candidates
+                    if all(data[key].get(field) == value for field, value in filters.items())]
+
+    def scan(self, table: str, chunk_size: int = 500, **filters) -> Iterator[Dict]:
+        # Под блокировкой снимаем только список ключей (из индекса, если есть),
+        # записи выбираются порциями, блокировка между порциями отпускается
+        with self._lock:
+            self._catch_up()
+            indexes = self._indexes[table]
+            indexed = [field for field in filters if field in indexes]
+            if indexed:
+                keys = list(min((indexes[field].get(filters[field], ()) for field in indexed), key=len))
+            else:
+                keys = list(self._data[table])
+
+        for start in range(0, len(keys), chunk_size):
+            with self._lock:
+                self._catch_up()
+                data = self._data[table]
+                chunk = [data[key] for key in keys[start:start + chunk_size] if key in data]
+            for record in chunk:
+                if all(record.get(field) == value for field, value in filters.items()):
+                    yield record
+
+    def ordered(self, table: str, field: str, below=None, limit: Optional[int] = None) -> List[Dict]:
+        with self._lock:
+            self._catch_up()
+            entries = self._ordered[table].get(field)
+            if entries is None:
+                return super().ordered(table, field, below, limit)
+            # Начало отсортированного списка: без прохода по всей таблице
+            end = len(entries) if below is None else bisect.bisect_left(entries, (below,))
+            if limit is not None:
+                end = min(end, limit)
+            data = self._data[table]
+            return [data[key] for _, key in entries[:end]]
+
+    def count(self, table: str) -> int:
+        with self._lock:
+            self._catch_up()
+            return len(self._data[table])
+
+    def stats(self) -> Dict:
+        with self._lock:
+            self._catch_up()
+            return self._stats.snapshot()
+
+    # ===== СВОРАЧИВАНИЕ ЖУРНАЛА =====
+
+    def compact(self) -> bool:
+        """Свернуть журнал в снимки таблиц. Возвращает True, если свертка выполнена."""
+        if fcntl is not None:
+            try:
+                fcntl.flock(self._compact_lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False  # Сворачивает другой процесс
+        try:
+            with self._writing():
+                if self._offset == 0:
+                    return False
+                # Записи не меняются на месте, поэтому достаточно поверхностной копии
+                snapshot = {table: dict(data) for table, data in self._data.items()}
+                base_offset = self._offset
+                base_inode = self._inode
+
+            # Снимки пишем без блокировки: запись в журнал в это время продолжается
+            for table, file_path in self.files.items():
+                _save_json_file(file_path, snapshot[table], self.fsync, self.serializer)
+
+            with self._writing():
+                if self._inode != base_inode:
+                    return False
+                # Переносим в новый журнал строки, дописанные во время записи снимков
+                self._journal.seek(base_offset)
+                tail = self._journal.read(self._offset - base_offset)
+                _write_file_atomic(self.journal_path, tail, self.fsync)
+                self._journal.close()
+                self._journal = open(self.journal_path, 'a+b')
+                self._inode = os.fstat(self._journal.fileno()).st_ino
+                self._offset = len(tail)
+
+            logger.info(f"Journal {self.journal_path} compacted ({base_offset} bytes folded into snapshots)")
+            return True
+        finally:
+            if fcntl is not None:
+                fcntl.flock(self._compact_lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _compact_loop(self):
+        """Фоновая свертка журнала при превышении размера"""
+        while not self._stop.wait(self.compact_interval):
+            try:
+                if self._offset >= self.compact_bytes:
+                    self.compact()
+            except Exception as e:
+                logger.error(f"Journal compaction error: {e}")
+
+    def close(self):
+        self._stop.set()
+        with self._lock:
+            if self._journal:
+                self._journal.close()
+                self._journal = None
+        self._lock_file.close()
+        self._compact_lock_file.close()
@@ -0,0 +1,72 @@
+# db/migrate.py - перенос данных из JSON файлов (и журнала) в SQLite
+#
+# Запуск: python -m db.migrate [--sqlite bot.db]
+
+import argparse
+import os
+import sys
+import time
+from typing import Dict, Iterable, Iterator
+from .database import (USERS_FILE, SUBSCRIPTIONS_FILE, PAYMENTS_FILE, PAYMENT_CONTEXTS_FILE, DB_JOURNAL_FILE,
+                       DB_SQLITE_FILE)
+from .models import to_epoch
+from .storage import JsonFileStorage
+from .sqlite_storage import SqliteStorage
+
+# Поля дат: записи старого формата хранят ISO строки, колонки SQLite - epoch.
+# Без преобразования строки попадают в INTEGER колонки как TEXT и сортируются после всех чисел.
+DATE_FIELDS = {
+    'users': ('created_at',),
+    'subscriptions': ('start_date', 'end_date'),
+    'payments': ('created_at', 'confirmed_at')
+}
+
+def _with_epoch_dates(table: str, records: Iterable[Dict]) -> Iterator[Dict]:
+    """Записи таблицы с датами в epoch"""
+    fields = DATE_FIELDS.get(table, ())
+    for record in records:
+        if fields:
+            record = {**record, **{field: to_epoch(record.get(field)) for field in fields}}
+        yield record
+
+def migrate_to_sqlite(db_path: str, journal_path: str = DB_JOURNAL_FILE) -> dict:
+    """Загрузка всех таблиц в SQLite. Возвращает количество перенесенных записей по таблицам."""
+    files = {
+        'users': USERS_FILE,
+        'subscriptions': SUBSCRIPTIONS_FILE,
+        'payments': PAYMENTS_FILE,
+        'payment_contexts': PAYMENT_CONTEXTS_FILE
+    }
+
+    # Если есть журнал, в нем могут быть изменения, еще не попавшие в JSON файлы
+    if os.path.exists(journal_path):
+        from .journal import JournalStorage
+        source = JournalStorage(files, journal_path, compact_interval=3600)
+    else:
+        source = JsonFileStorage(files)
+
+    target = SqliteStorage(files, db_path)
+    try:
+        return {table: target.bulk_load(table, _with_epoch_dates(table, source.scan(table))) for table in files}
+    finally:
+        source.close()
+        target.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Migrate JSON storage to SQLite')
+    parser.add_argument('--sqlite', default=DB_SQLITE_FILE, help='path to the SQLite database')
+    parser.add_argument('--journal', default=DB_JOURNAL_FILE, help='path to the journal file')
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    counts = migrate_to_sqlite(args.sqlite, args.journal)
+    elapsed = time.perf_counter() - started
+
+    for table, count in counts.items():
+        print(f"{table}: {count} records")
+    print(f"Migrated to {args.sqlite} in {elapsed:.2f}s")
+    print("Set DB_BACKEND=sqlite to use the new database")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,19 +1,63 @@
 # db/models.py - модели данных для базы данных
+#
+# Модели используют __slots__ (без __dict__ на каждый экземпляр), даты хранятся
+# как целые секунды epoch - и в объектах, и в записях хранилища (to_dict), поэтому
+# загрузка записи не разбирает даты. ISO строки появляются только в свойствах
+# created_at / start_date / end_date для отображения; записи старого формата
+# с ISO строками по-прежнему читаются.
 
+import time
 from datetime import datetime
-from typing import Optional
+from typing import Optional, Union
+
+Timestamp = Union[int, float, str, datetime]
+
+def to_epoch(value: Optional[Timestamp]) -> Optional[int]:
+    """Преобразование числа / datetime / ISO строки в секунды epoch"""
+    if value is None:
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        return int(value)
+    if isinstance(value, datetime):
+        return int(value.timestamp())
+    try:
+        # Число в строке: TEXT колонка SQLite базы, созданной до перехода на epoch,
+        # или дробное epoch ("1700000000.5") из REAL колонки / orjson / msgpack
+        return int(float(value))
+    except (ValueError, OverflowError):
+        pass
+    # Запись старого формата
+    return int(datetime.fromisoformat(value).timestamp())
+
+def to_iso(timestamp: Optional[int]) -> Optional[str]:
+    """Преобразование секунд epoch в ISO строку (локальное время, как datetime.now())"""
+    if timestamp is None:
+        return None
+    return datetime.fromtimestamp(timestamp).isoformat()
 
 class User:
     """Модель пользователя"""
+    __slots__ = ('user_id', 'username', 'first_name', 'last_name', 'language_code', 'created_ts')
+
     def __init__(self, user_id: int, username: Optional[str] = None,
                  first_name: Optional[str] = None, last_name: Optional[str] = None,
-                 language_code: Optional[str] = None, created_at: Optional[str] = None):
+                 language_code: Optional[str] = None, created_at: Optional[Timestamp] = None):
         self.user_id = user_id
         self.username = username
         self.first_name = first_name
         self.last_name = last_name
         self.language_code = language_code
-        self.created_at = created_at or datetime.now().isoformat()
+        self.created_ts = to_epoch(created_at) if created_at is not None else int(time.time())
+
+    @property
+    def created_at(self) -> str:
+        return to_iso(self.created_ts)
+
+    @created_at.setter
+    def created_at(self, value: Timestamp):
+        self.created_ts = to_epoch(value)
 
     def to_dict(self):
         return {
@@ -22,51 +66,116 @@ class User:
             'first_name': self.first_name,
             'last_name': self.last_name,
             'language_code': self.language_code,
-            'created_at': self.created_at
+            'created_at': self.created_ts
         }
 
+    def to_tuple(self) -> tuple:
+        """Быстрая сериализация: значения слотов по порядку, даты - в epoch"""
+        return (self.user_id, self.username, self.first_name, self.last_name,
+                self.language_code, self.created_ts)
+
+    @classmethod
+    def from_tuple(cls, values: tuple) -> 'User':
+        """Быстрая десериализация из to_tuple() без разбора дат"""
+        user = cls.__new__(cls)
+        (user.user_id, user.username, user.first_name, user.last_name,
+         user.language_code, user.created_ts) = values
+        return user
+
 class Subscription:
     """Модель подписки"""
+    __slots__ = ('user_id', 'plan', 'plan_name', 'price', 'start_ts', 'end_ts',
+                 'status', 'auto_renewal', 'payment_id')
+
     def __init__(self, user_id: int, plan: str, plan_name: str, price: float,
-                 start_date: str, end_date: str, status: str = 'active',
+                 start_date: Timestamp, end_date: Timestamp, status: str = 'active',
                  auto_renewal: bool = True, payment_id: Optional[str] = None):
         self.user_id = user_id
         self.plan = plan
         self.plan_name = plan_name
         self.price = price
-        self.start_date = start_date
-        self.end_date = end_date
+        self.start_ts = to_epoch(start_date)
+        self.end_ts = to_epoch(end_date)
         self.status = status  # active, expired, canceled
         self.auto_renewal = auto_renewal
         self.payment_id = payment_id
 
+    @property
+    def start_date(self) -> str:
+        return to_iso(self.start_ts)
+
+    @start_date.setter
+    def start_date(self, value: Timestamp):
+        self.start_ts = to_epoch(value)
+
+    @property
+    def end_date(self) -> str:
+        return to_iso(self.end_ts)
+
+    @end_date.setter
+    def end_date(self, value: Timestamp):
+        self.end_ts = to_epoch(value)
+
     def to_dict(self):
         return {
             'user_id': self.user_id,
             'plan': self.plan,
             'plan_name': self.plan_name,
             'price': self.price,
-            'start_date': self.start_date,
-            'end_date': self.end_date,
+            'start_date': self.start_ts,
+            'end_date': self.end_ts,
             'status': self.status,
             'auto_renewal': self.auto_renewal,
             'payment_id': self.payment_id
         }
 
+    def to_tuple(self) -> tuple:
+        """Быстрая сериализация: значения слотов по порядку, даты - в epoch"""
+        return (self.user_id, self.plan, self.plan_name, self.price, self.start_ts,
+                self.end_ts, self.status, self.auto_renewal, self.payment_id)
+
+    @classmethod
+    def from_tuple(cls, values: tuple) -> 'Subscription':
+        """Быстрая десериализация из to_tuple() без разбора дат"""
+        subscription = cls.__new__(cls)
+        (subscription.user_id, subscription.plan, subscription.plan_name, subscription.price,
+         subscription.start_ts, subscription.end_ts, subscription.status,
+         subscription.auto_renewal, subscription.payment_id) = values
+        return subscription
+
 class Payment:
     """Модель платежа"""
+    __slots__ = ('payment_id', 'user_id', 'plan', 'amount', 'status', 'created_ts',
+                 'confirmed_ts', 'yookassa_id')
+
     def __init__(self, payment_id: str, user_id: int, plan: str, amount: float,
-                 status: str = 'pending', created_at: Optional[str] = None,
-                 confirmed_at: Optional[str] = None, yookassa_id: Optional[str] = None):
+                 status: str = 'pending', created_at: Optional[Timestamp] = None,
+                 confirmed_at: Optional[Timestamp] = None, yookassa_id: Optional[str] = None):
         self.payment_id = payment_id
         self.user_id = user_id
         self.plan = plan
         self.amount = amount
         self.status = status  # pending, succeeded, canceled, failed
-        self.created_at = created_at or datetime.now().isoformat()
-        self.confirmed_at = confirmed_at
+        self.created_ts = to_epoch(created_at) if created_at is not None else int(time.time())
+        self.confirmed_ts = to_epoch(confirmed_at)
         self.yookassa_id = yookassa_id
 
+    @property
+    def created_at(self) -> str:
+        return to_iso(self.created_ts)
+
+    @created_at.setter
+    def created_at(self, value: Timestamp):
+        self.created_ts = to_epoch(value)
+
+    @property
+    def confirmed_at(self) -> Optional[str]:
+        return to_iso(self.confirmed_ts)
+
+    @confirmed_at.setter
+    def confirmed_at(self, value: Optional[Timestamp]):
+        self.confirmed_ts = to_epoch(value)
+
     def to_dict(self):
         return {
             'payment_id': self.payment_id,
@@ -74,7 +183,20 @@ class Payment:
             'plan': self.plan,
             'amount': self.amount,
             'status': self.status,
-            'created_at': self.created_at,
-            'confirmed_at': self.confirmed_at,
+            'created_at': self.created_ts,
+            'confirmed_at': self.confirmed_ts,
             'yookassa_id': self.yookassa_id
         }
+
+    def to_tuple(self) -> tuple:
+        """Быстрая сериализация: значения слотов по порядку, даты - в epoch"""
+        return (self.payment_id, self.user_id, self.plan, self.amount, self.status,
+                self.created_ts, self.confirmed_ts, self.yookassa_id)
+
+    @classmethod
+    def from_tuple(cls, values: tuple) -> 'Payment':
+        """Быстрая десериализация из to_tuple() без разбора дат"""
+        payment = cls.__new__(cls)
+        (payment.payment_id, payment.user_id, payment.plan, payment.amount, payment.status,
+         payment.created_ts, payment.confirmed_ts, payment.yookassa_id) = values
+        return payment
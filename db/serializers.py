@@ -0,0 +1,82 @@
+# db/serializers.py - форматы хранения файлов таблиц
+
+import codecs
+import json
+from typing import Dict
+from utils.logger import get_logger
+
+# Необязательные ускорители: используются, только если установлены
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+logger = get_logger(__name__)
+
+class JsonSerializer:
+    """JSON с отступами (исходный формат файлов)"""
+    name = 'json'
+
+    def dumps(self, data: Dict) -> bytes:
+        return json.dumps(data, ensure_ascii=False, indent=2, default=str).encode('utf-8')
+
+class CompactJsonSerializer:
+    """JSON без отступов и пробелов"""
+    name = 'compact'
+
+    def dumps(self, data: Dict) -> bytes:
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8')
+
+class OrjsonSerializer:
+    """Компактный JSON через orjson"""
+    name = 'orjson'
+
+    def dumps(self, data: Dict) -> bytes:
+        return orjson.dumps(data, default=str)
+
+class MsgpackSerializer:
+    """Бинарный формат MessagePack"""
+    name = 'msgpack'
+
+    def dumps(self, data: Dict) -> bytes:
+        return msgpack.packb(data, use_bin_type=True, default=str)
+
+SERIALIZERS = {
+    'json': JsonSerializer,
+    'compact': CompactJsonSerializer,
+    'orjson': OrjsonSerializer,
+    'msgpack': MsgpackSerializer
+}
+
+def get_serializer(name: str):
+    """Сериализатор по имени формата (недоступные форматы заменяются компактным JSON)"""
+    if name not in SERIALIZERS:
+        raise ValueError(f"Unknown storage format: {name}")
+    if name == 'orjson' and orjson is None:
+        logger.warning("orjson is not installed, falling back to compact JSON")
+        name = 'compact'
+    if name == 'msgpack' and msgpack is None:
+        logger.warning("msgpack is not installed, falling back to compact JSON")
+        name = 'compact'
+    return SERIALIZERS[name]()
+
+def loads(payload: bytes) -> Dict:
+    """Разбор файла любого поддерживаемого формата (формат определяется по первому байту)"""
+    if payload.startswith(codecs.BOM_UTF8):
+        payload = payload[len(codecs.BOM_UTF8):]
+    stripped = payload.lstrip()
+    if not stripped:
+        return {}
+    # JSON-документ таблицы всегда начинается с '{', MessagePack-словарь - с 0x80-0x8f, 0xde или 0xdf
+    if stripped[:1] in (b'{', b'['):
+        if orjson is not None:
+            return orjson.loads(payload)
+        return json.loads(payload.decode('utf-8'))
+    if msgpack is None:
+        raise ValueError("File is not JSON and msgpack is not installed")
+    return msgpack.unpackb(payload, raw=False, strict_map_key=False)
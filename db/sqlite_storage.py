@@ -0,0 +1,323 @@
+# db/sqlite_storage.py - хранилище в SQLite (WAL) с индексами
+
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Optional, Dict, List, Iterable, Iterator, Tuple
+from .storage import BaseStorage
+
+# Схема таблиц: первичный ключ и колонки (совпадают с полями моделей, даты - epoch)
+SCHEMA = {
+    'users': {
+        'key': 'user_id',
+        'columns': {
+            'user_id': 'INTEGER PRIMARY KEY',
+            'username': 'TEXT',
+            'first_name': 'TEXT',
+            'last_name': 'TEXT',
+            'language_code': 'TEXT',
+            'created_at': 'INTEGER'
+        }
+    },
+    'subscriptions': {
+        'key': 'user_id',
+        'columns': {
+            'user_id': 'INTEGER PRIMARY KEY',
+            'plan': 'TEXT',
+            'plan_name': 'TEXT',
+            'price': 'REAL',
+            'start_date': 'INTEGER',
+            'end_date': 'INTEGER',
+            'status': 'TEXT',
+            'auto_renewal': 'BOOLEAN',
+            'payment_id': 'TEXT'
+        }
+    },
+    'payments': {
+        'key': 'payment_id',
+        'columns': {
+            'payment_id': 'TEXT PRIMARY KEY',
+            'user_id': 'INTEGER',
+            'plan': 'TEXT',
+            'amount': 'REAL',
+            'status': 'TEXT',
+            'created_at': 'INTEGER',
+            'confirmed_at': 'INTEGER',
+            'yookassa_id': 'TEXT'
+        }
+    },
+    'payment_contexts': {
+        'key': 'payment_id',
+        'columns': {
+            'payment_id': 'TEXT PRIMARY KEY',
+            'user_id': 'INTEGER',
+            'plan': 'TEXT',
+            'chat_id': 'INTEGER',
+            'message_id': 'INTEGER',
+            'yookassa_id': 'TEXT',
+            'expires_at': 'REAL'
+        }
+    }
+}
+
+INDEXES = [
+    'CREATE INDEX IF NOT EXISTS idx_payments_user_id ON payments(user_id)',
+    'CREATE INDEX IF NOT EXISTS idx_payments_status ON payments(status)',
+    'CREATE INDEX IF NOT EXISTS idx_payments_yookassa_id ON payments(yookassa_id)',
+    'CREATE INDEX IF NOT EXISTS idx_subscriptions_end_date ON subscriptions(end_date)',
+    'CREATE INDEX IF NOT EXISTS idx_subscriptions_status ON subscriptions(status)',
+    'CREATE INDEX IF NOT EXISTS idx_payment_contexts_expires_at ON payment_contexts(expires_at)'
+]
+
+# Счетчики статистики поддерживаются триггерами в той же транзакции, что и запись,
+# поэтому они точны для всех процессов, работающих с базой
+def _add_stat(name: str, delta: str) -> str:
+    return (f"INSERT INTO stats (name, value) VALUES ({name}, {delta}) "
+            f"ON CONFLICT(name) DO UPDATE SET value = value + excluded.value;")
+
+def _payment_stats(row: str, sign: str) -> str:
+    return (_add_stat(f"'payments:' || {row}.status", f"{sign}1")
+            + _add_stat(f"'revenue:' || {row}.plan",
+                        f"{sign}(CASE WHEN {row}.status = 'succeeded' THEN {row}.amount ELSE 0 END)"))
+
+STATS_TRIGGERS = {
+    'stats_users_insert': "AFTER INSERT ON users BEGIN " + _add_stat("'users'", "1") + " END",
+    'stats_users_delete': "AFTER DELETE ON users BEGIN " + _add_stat("'users'", "-1") + " END",
+    'stats_subscriptions_insert': "AFTER INSERT ON subscriptions BEGIN "
+        + _add_stat("'active_subscriptions'", "(NEW.status = 'active')") + " END",
+    'stats_subscriptions_update': "AFTER UPDATE OF status ON subscriptions BEGIN "
+        + _add_stat("'active_subscriptions'", "(NEW.status = 'active') - (OLD.status = 'active')") + " END",
+    'stats_subscriptions_delete': "AFTER DELETE ON subscriptions BEGIN "
+        + _add_stat("'active_subscriptions'", "-(OLD.status = 'active')") + " END",
+    'stats_payments_insert': "AFTER INSERT ON payments BEGIN " + _payment_stats('NEW', '+') + " END",
+    'stats_payments_update': "AFTER UPDATE OF status, plan, amount ON payments BEGIN "
+        + _payment_stats('OLD', '-') + _payment_stats('NEW', '+') + " END",
+    'stats_payments_delete': "AFTER DELETE ON payments BEGIN " + _payment_stats('OLD', '-') + " END"
+}
+
+# Пересчет счетчиков по существующим данным (для баз, созданных до появления таблицы stats)
+STATS_REBUILD = [
+    "DELETE FROM stats",
+    "INSERT INTO stats (name, value) SELECT 'users', COUNT(*) FROM users",
+    "INSERT INTO stats (name, value) SELECT 'active_subscriptions', COUNT(*) FROM subscriptions WHERE status = 'active'",
+    "INSERT INTO stats (name, value) SELECT 'payments:' || status, COUNT(*) FROM payments GROUP BY status",
+    "INSERT INTO stats (name, value) SELECT 'revenue:' || plan, SUM(amount) FROM payments "
+    "WHERE status = 'succeeded' GROUP BY plan"
+]
+
+class SqliteStorage(BaseStorage):
+    """Хранилище в SQLite.
+
+    База работает в режиме WAL: читатели не блокируют писателя, поэтому бот
+    и webhook сервер могут одновременно работать с одним файлом. У каждого
+    потока свое соединение, записи идут в транзакциях BEGIN IMMEDIATE.
+    """
+
+    def __init__(self, files: Dict[str, str], db_path: str, fsync: bool = True, timeout: float = 10.0):
+        super().__init__(files)
+        self.db_path = db_path
+        self.fsync = fsync
+        self.timeout = timeout
+        self._local = threading.local()
+
+        with self._transaction() as conn:
+            for table, schema in SCHEMA.items():
+                columns = ', '.join(f"{name} {col_type}" for name, col_type in schema['columns'].items())
+                conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({columns})")
+            for statement in INDEXES:
+                conn.execute(statement)
+
+            has_stats = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'stats'").fetchone()
+            conn.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value REAL NOT NULL)")
+            for name, body in STATS_TRIGGERS.items():
+                conn.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {body}")
+            if not has_stats:
+                for statement in STATS_REBUILD:
+                    conn.execute(statement)
+
+    def _connection(self) -> sqlite3.Connection:
+        """Соединение текущего потока"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=self.timeout, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(f"PRAGMA synchronous={'FULL' if self.fsync else 'NORMAL'}")
+            conn.execute(f"PRAGMA busy_timeout={int(self.timeout * 1000)}")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """Транзакция на запись (вложенная присоединяется к внешней)"""
+        conn = self._connection()
+        if conn.in_transaction:
+            yield conn
+            return
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    @staticmethod
+    def _to_record(table: str, row: sqlite3.Row) -> Dict:
+        """Преобразование строки таблицы в запись-словарь"""
+        record = dict(row)
+        if table == 'subscriptions' and record.get('auto_renewal') is not None:
+            record['auto_renewal'] = bool(record['auto_renewal'])
+        return record
+
+    @staticmethod
+    def _columns(table: str) -> List[str]:
+        return list(SCHEMA[table]['columns'])
+
+    def get(self, table: str, key: str) -> Optional[Dict]:
+        key_column = SCHEMA[table]['key']
+        row = self._connection().execute(
+            f"SELECT * FROM {table} WHERE {key_column} = ?", (key,)).fetchone()
+        return self._to_record(table, row) if row else None
+
+    @staticmethod
+    def _upsert_statement(table: str) -> str:
+        """INSERT ... ON CONFLICT DO UPDATE: в отличие от REPLACE, вызывает UPDATE триггеры"""
+        columns = SqliteStorage._columns(table)
+        key_column = SCHEMA[table]['key']
+        placeholders = ', '.join('?' for _ in columns)
+        assignments = ', '.join(f"{name} = excluded.{name}" for name in columns if name != key_column)
+        return (f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders}) "
+                f"ON CONFLICT({key_column}) DO UPDATE SET {assignments}")
+
+    def put_many(self, table: str, records: Dict[str, Dict]):
+        if not records:
+            return
+        columns = self._columns(table)
+        rows = [tuple(record.get(column) for column in columns) for record in records.values()]
+        with self._transaction() as conn:
+            conn.executemany(self._upsert_statement(table), rows)
+
+    def update(self, table: str, key: str, fields: Dict) -> bool:
+        columns = SCHEMA[table]['columns']
+        unknown = set(fields) - set(columns)
+        if unknown:
+            raise ValueError(f"Unknown columns for {table}: {', '.join(sorted(unknown))}")
+        assignments = ', '.join(f"{name} = ?" for name in fields)
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                f"UPDATE {table} SET {assignments} WHERE {SCHEMA[table]['key']} = ?",
+                (*fields.values(), key))
+            return cursor.rowcount > 0
+
+    def delete_many(self, table: str, keys: Iterable[str]) -> int:
+        rows = [(key,) for key in keys]
+        if not rows:
+            return 0
+        with self._transaction() as conn:
+            cursor = conn.executemany(f"DELETE FROM {table} WHERE {SCHEMA[table]['key']} = ?", rows)
+            return cursor.rowcount
+
+    def values(self, table: str) -> List[Dict]:
+        rows = self._connection().execute(f"SELECT * FROM {table}").fetchall()
+        return [self._to_record(table, row) for row in rows]
+
+    def items(self, table: str) -> Iterable[Tuple[str, Dict]]:
+        key_column = SCHEMA[table]['key']
+        return [(str(record[key_column]), record) for record in self.values(table)]
+
+    def find(self, table: str, **filters) -> List[Dict]:
+        columns = SCHEMA[table]['columns']
+        unknown = set(filters) - set(columns)
+        if unknown:
+            raise ValueError(f"Unknown columns for {table}: {', '.join(sorted(unknown))}")
+        where = ' AND '.join(f"{name} = ?" for name in filters) or '1'
+        rows = self._connection().execute(
+            f"SELECT * FROM {table} WHERE {where}", tuple(filters.values())).fetchall()
+        return [self._to_record(table, row) for row in rows]
+
+    def scan(self, table: str, chunk_size: int = 500, **filters) -> Iterator[Dict]:
+        # Keyset-пагинация по первичному ключу: каждая порция - отдельный короткий запрос,
+        # поэтому проход не держит курсор и не мешает писателям
+        columns = SCHEMA[table]['columns']
+        unknown = set(filters) - set(columns)
+        if unknown:
+            raise ValueError(f"Unknown columns for {table}: {', '.join(sorted(unknown))}")
+        key_column = SCHEMA[table]['key']
+        conditions = [f"{name} = ?" for name in filters]
+        params = tuple(filters.values())
+
+        last_key = None
+        while True:
+            where = conditions if last_key is None else conditions + [f"{key_column} > ?"]
+            query = (f"SELECT * FROM {table} WHERE {' AND '.join(where) or '1'} "
+                     f"ORDER BY {key_column} LIMIT ?")
+            args = params + ((last_key,) if last_key is not None else ()) + (chunk_size,)
+            rows = self._connection().execute(query, args).fetchall()
+            for row in rows:
+                yield self._to_record(table, row)
+            if len(rows) < chunk_size:
+                return
+            last_key = rows[-1][key_column]
+
+    def ordered(self, table: str, field: str, below=None, limit: Optional[int] = None) -> List[Dict]:
+        if field not in SCHEMA[table]['columns']:
+            raise ValueError(f"Unknown column for {table}: {field}")
+        # Для полей с индексом (payment_contexts.expires_at) читается только начало индекса
+        where = f"{field} IS NOT NULL" + (f" AND {field} < ?" if below is not None else '')
+        params = ((below,) if below is not None else ()) + ((limit,) if limit is not None else ())
+        rows = self._connection().execute(
+            f"SELECT * FROM {table} WHERE {where} ORDER BY {field}" + (" LIMIT ?" if limit is not None else ''),
+            params).fetchall()
+        return [self._to_record(table, row) for row in rows]
+
+    def count(self, table: str) -> int:
+        return self._connection().execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def stats(self) -> Dict:
+        result = {
+            'users': 0,
+            'active_subscriptions': 0,
+            'payments_by_status': {},
+            'revenue_by_plan': {}
+        }
+        for name, value in self._connection().execute("SELECT name, value FROM stats"):
+            if name.startswith('payments:'):
+                if value:
+                    result['payments_by_status'][name[len('payments:'):]] = int(value)
+            elif name.startswith('revenue:'):
+                if value:
+                    result['revenue_by_plan'][name[len('revenue:'):]] = value
+            else:
+                result[name] = int(value)
+        return result
+
+    @contextmanager
+    def transaction(self):
+        with self._transaction():
+            yield
+
+    def bulk_load(self, table: str, records: Iterable[Dict], batch_size: int = 10000) -> int:
+        """Массовая загрузка записей (для миграции). Возвращает количество записей."""
+        columns = self._columns(table)
+        statement = self._upsert_statement(table)
+        total = 0
+        batch = []
+        with self._transaction() as conn:
+            for record in records:
+                batch.append(tuple(record.get(column) for column in columns))
+                if len(batch) >= batch_size:
+                    conn.executemany(statement, batch)
+                    total += len(batch)
+                    batch = []
+            if batch:
+                conn.executemany(statement, batch)
+                total += len(batch)
+        return total
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
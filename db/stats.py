@@ -0,0 +1,60 @@
+# db/stats.py - счетчики статистики, обновляемые при каждой записи
+
+from collections import Counter, defaultdict
+from typing import Optional, Dict, Iterable
+
+class StatsCounters:
+    """Счетчики: пользователи, активные подписки, платежи по статусам и выручка по тарифам.
+
+    Хранилище вызывает apply() для каждого изменения записи (старое и новое
+    значение), поэтому получение статистики не требует прохода по данным.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.users = 0
+        self.active_subscriptions = 0
+        self.payments_by_status: Dict[str, int] = Counter()
+        self.revenue_by_plan: Dict[str, float] = defaultdict(float)
+
+    def apply(self, table: str, old: Optional[Dict], new: Optional[Dict]):
+        """Учет изменения записи: old - значение до записи, new - после (None - записи нет)"""
+        if table == 'users':
+            self.users += (new is not None) - (old is not None)
+        elif table == 'subscriptions':
+            self.active_subscriptions += self._is_active(new) - self._is_active(old)
+        elif table == 'payments':
+            if old is not None:
+                self._count_payment(old, -1)
+            if new is not None:
+                self._count_payment(new, 1)
+
+    def rebuild(self, tables: Dict[str, Iterable[Dict]]):
+        """Пересчет счетчиков с нуля по всем записям"""
+        self.reset()
+        for table, records in tables.items():
+            for record in records:
+                self.apply(table, None, record)
+
+    @staticmethod
+    def _is_active(subscription: Optional[Dict]) -> int:
+        return int(subscription is not None and subscription.get('status') == 'active')
+
+    def _count_payment(self, payment: Dict, sign: int):
+        status = payment.get('status')
+        self.payments_by_status[status] += sign
+        if not self.payments_by_status[status]:
+            del self.payments_by_status[status]
+        if status == 'succeeded':
+            self.revenue_by_plan[payment.get('plan')] += sign * (payment.get('amount') or 0)
+
+    def snapshot(self) -> Dict:
+        """Копия текущих значений счетчиков"""
+        return {
+            'users': self.users,
+            'active_subscriptions': self.active_subscriptions,
+            'payments_by_status': dict(self.payments_by_status),
+            'revenue_by_plan': {plan: amount for plan, amount in self.revenue_by_plan.items() if amount}
+        }
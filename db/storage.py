@@ -0,0 +1,262 @@
+# db/storage.py - базовые классы хранилищ и работа с JSON файлами
+
+import heapq
+import os
+import threading
+from contextlib import contextmanager
+from typing import Optional, Dict, List, Iterable, Iterator, Tuple
+from . import serializers
+from .stats import StatsCounters
+
+# Кэш разобранных JSON файлов: путь -> ((inode, mtime_ns, size), данные).
+# Файлы пишутся только через rename, поэтому любое изменение (в том числе
+# из другого процесса) меняет inode и кэш не отдает устаревшие данные.
+_read_cache: Dict[str, Tuple[Tuple[int, int, int], Dict]] = {}
+_read_cache_lock = threading.Lock()
+_read_cache_stats = {'hits': 0, 'misses': 0}
+
+_default_serializer = serializers.CompactJsonSerializer()
+
+def _file_signature(file_path: str) -> Tuple[int, int, int]:
+    st = os.stat(file_path)
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+def _write_file_atomic(file_path: str, payload: bytes, fsync: bool = True):
+    """Запись файла через временный файл и rename, чтобы читатели не видели половину файла"""
+    tmp_path = f"{file_path}.tmp.{os.getpid()}.{threading.get_ident()}"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(payload)
+            f.flush()
+            if fsync:
+                os.fsync(f.fileno())
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def _load_json_file(file_path: str) -> Dict:
+    """Загрузка JSON файла (повторно разбирается только если файл изменился)"""
+    try:
+        signature = _file_signature(file_path)
+    except FileNotFoundError:
+        return {}
+
+    with _read_cache_lock:
+        cached = _read_cache.get(file_path)
+        if cached and cached[0] == signature:
+            _read_cache_stats['hits'] += 1
+            # Копия верхнего уровня: вызывающий код может добавлять и заменять записи
+            return dict(cached[1])
+        _read_cache_stats['misses'] += 1
+
+    try:
+        with open(file_path, 'rb') as f:
+            data = serializers.loads(f.read())
+    except FileNotFoundError:
+        return {}
+    except (ValueError, TypeError):
+        return {}
+
+    with _read_cache_lock:
+        _read_cache[file_path] = (signature, data)
+    return dict(data)
+
+def _save_json_file(file_path: str, data: Dict, fsync: bool = True, serializer=None):
+    """Сохранение файла таблицы (атомарно, через временный файл). По умолчанию - компактный JSON."""
+    payload = (serializer or _default_serializer).dumps(data)
+    _write_file_atomic(file_path, payload, fsync)
+
+    # Записанные данные сразу кладем в кэш, чтобы следующее чтение было попаданием
+    try:
+        signature = _file_signature(file_path)
+    except FileNotFoundError:
+        return
+    with _read_cache_lock:
+        _read_cache[file_path] = (signature, dict(data))
+
+def get_read_cache_stats() -> Dict[str, int]:
+    """Счетчики кэша чтения JSON файлов"""
+    with _read_cache_lock:
+        return {**_read_cache_stats, 'files': len(_read_cache)}
+
+class BaseStorage:
+    """Базовый интерфейс хранилища: таблицы из записей-словарей с строковыми ключами"""
+
+    def __init__(self, files: Dict[str, str]):
+        self.files = files  # table -> путь к JSON файлу
+        self.tables = tuple(files)
+
+    def get(self, table: str, key: str) -> Optional[Dict]:
+        """Получение записи по ключу"""
+        raise NotImplementedError
+
+    def put_many(self, table: str, records: Dict[str, Dict]):
+        """Сохранение нескольких записей одной операцией записи"""
+        raise NotImplementedError
+
+    def values(self, table: str) -> List[Dict]:
+        """Все записи таблицы"""
+        raise NotImplementedError
+
+    def put(self, table: str, key: str, record: Dict):
+        """Сохранение записи"""
+        self.put_many(table, {key: record})
+
+    def update(self, table: str, key: str, fields: Dict) -> bool:
+        """Частичное обновление записи. Возвращает False, если записи нет."""
+        raise NotImplementedError
+
+    def delete_many(self, table: str, keys: Iterable[str]) -> int:
+        """Удаление записей по ключам одной операцией. Возвращает количество удаленных."""
+        raise NotImplementedError
+
+    def delete(self, table: str, key: str) -> bool:
+        """Удаление записи. Возвращает False, если записи нет."""
+        return self.delete_many(table, [key]) > 0
+
+    def items(self, table: str) -> Iterable[Tuple[str, Dict]]:
+        """Пары (ключ, запись) таблицы"""
+        raise NotImplementedError
+
+    def find(self, table: str, **filters) -> List[Dict]:
+        """Записи, у которых поля равны заданным значениям (по умолчанию - полный проход)"""
+        return [record for record in self.values(table)
+                if all(record.get(field) == value for field, value in filters.items())]
+
+    def scan(self, table: str, chunk_size: int = 500, **filters) -> Iterator[Dict]:
+        """Потоковый проход по записям (с фильтром как в find), чтение порциями по chunk_size.
+
+        Записи, измененные во время прохода, могут быть выданы в старом или новом виде.
+        """
+        for record in self.values(table):
+            if all(record.get(field) == value for field, value in filters.items()):
+                yield record
+
+    def ordered(self, table: str, field: str, below=None, limit: Optional[int] = None) -> List[Dict]:
+        """Записи по возрастанию поля: не больше limit, со значением меньше below.
+
+        Записи без значения поля пропускаются. По умолчанию - полный проход.
+        """
+        records = [record for record in self.values(table)
+                   if record.get(field) is not None and (below is None or record[field] < below)]
+        if limit is None:
+            return sorted(records, key=lambda record: record[field])
+        return heapq.nsmallest(limit, records, key=lambda record: record[field])
+
+    def count(self, table: str) -> int:
+        """Количество записей в таблице"""
+        return len(self.values(table))
+
+    def stats(self) -> Dict:
+        """Счетчики статистики (см. StatsCounters.snapshot). По умолчанию - пересчет по всем записям."""
+        counters = StatsCounters()
+        counters.rebuild({table: self.values(table) for table in self.tables})
+        return counters.snapshot()
+
+    def transaction(self):
+        """Контекстный менеджер транзакции: все записи внутри фиксируются одной операцией.
+
+        Чтения внутри транзакции видят ее собственные изменения, при исключении
+        изменения отбрасываются. Вложенные транзакции присоединяются к внешней.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """Освобождение ресурсов хранилища"""
+        pass
+
+class JsonFileStorage(BaseStorage):
+    """Хранилище, которое читает и перезаписывает JSON файл целиком на каждую операцию.
+
+    В транзакции каждый затронутый файл читается и записывается один раз,
+    но атомарность между разными файлами не гарантируется.
+    """
+
+    def __init__(self, files: Dict[str, str], fsync: bool = True, serializer=None):
+        super().__init__(files)
+        self.fsync = fsync
+        self.serializer = serializer
+        # Сериализуем read-modify-write внутри процесса
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._stats_cache = (None, None)  # (подписи файлов, счетчики)
+
+    def _load(self, table: str) -> Dict:
+        """Данные таблицы: из транзакции текущего потока или из файла"""
+        tx = getattr(self._local, 'tx', None)
+        if tx is None:
+            return _load_json_file(self.files[table])
+        if table not in tx:
+            tx[table] = _load_json_file(self.files[table])
+        return tx[table]
+
+    def _store(self, table: str, data: Dict):
+        tx = getattr(self._local, 'tx', None)
+        if tx is None:
+            _save_json_file(self.files[table], data, self.fsync, self.serializer)
+        else:
+            self._local.dirty.add(table)
+
+    def get(self, table: str, key: str) -> Optional[Dict]:
+        return self._load(table).get(key)
+
+    def put_many(self, table: str, records: Dict[str, Dict]):
+        with self._lock:
+            data = self._load(table)
+            data.update(records)
+            self._store(table, data)
+
+    def update(self, table: str, key: str, fields: Dict) -> bool:
+        with self._lock:
+            data = self._load(table)
+            if key not in data:
+                return False
+            data[key] = {**data[key], **fields}
+            self._store(table, data)
+            return True
+
+    def delete_many(self, table: str, keys: Iterable[str]) -> int:
+        with self._lock:
+            data = self._load(table)
+            deleted = sum(data.pop(key, None) is not None for key in keys)
+            if deleted:
+                self._store(table, data)
+            return deleted
+
+    def values(self, table: str) -> List[Dict]:
+        return list(self._load(table).values())
+
+    def items(self, table: str) -> Iterable[Tuple[str, Dict]]:
+        return list(self._load(table).items())
+
+    def stats(self) -> Dict:
+        # Пересчитываем только если какой-то из файлов изменился
+        signatures = []
+        for file_path in self.files.values():
+            try:
+                signatures.append(_file_signature(file_path))
+            except FileNotFoundError:
+                signatures.append(None)
+        signatures = tuple(signatures)
+        if self._stats_cache[0] != signatures:
+            self._stats_cache = (signatures, super().stats())
+        return self._stats_cache[1]
+
+    @contextmanager
+    def transaction(self):
+        with self._lock:
+            if getattr(self._local, 'tx', None) is not None:
+                yield
+                return
+
+            self._local.tx = {}
+            self._local.dirty = set()
+            try:
+                yield
+                for table in self._local.dirty:
+                    _save_json_file(self.files[table], self._local.tx[table], self.fsync, self.serializer)
+            finally:
+                self._local.tx = None
+                self._local.dirty = set()
@@ -0,0 +1,19 @@
+# handlers/aio/__init__.py - обработчики для асинхронного режима (AsyncTeleBot)
+#
+# Повторяют обработчики из handlers/, но все обращения к Bot API выполняются
+# через await, а хранилище и YooKassa - в пуле потоков (utils.async_runtime).
+
+from .start import setup_start_handlers
+from .product_info import setup_product_handlers
+from .subscription_flow import setup_subscription_handlers, setup_callback_handlers
+from .payment_processing import setup_payment_handlers
+from .admin import setup_admin_handlers
+
+def setup_handlers(bot):
+    """Настройка всех обработчиков асинхронного бота"""
+    setup_start_handlers(bot)
+    setup_product_handlers(bot)
+    setup_subscription_handlers(bot)
+    setup_callback_handlers(bot)
+    setup_payment_handlers(bot)
+    setup_admin_handlers(bot)
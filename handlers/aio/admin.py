@@ -0,0 +1,49 @@
+# handlers/aio/admin.py - административные обработчики (асинхронный режим)
+
+from services.user_service import get_user_statistics
+from services.broadcast_service import get_broadcast_engine, is_valid_audience
+from services.messages import get_stats_text, get_callback_stats_text, get_outbox_stats_text
+from services.messages import (BROADCAST_USAGE_TEXT, BROADCAST_BUSY_TEXT, BROADCAST_NOT_FOUND_TEXT,
+                               BROADCAST_STOPPING_TEXT, get_broadcast_progress_text)
+from utils.async_runtime import run_blocking
+from utils.callback_router import get_callback_router
+from utils.decorators import admin_required
+
+def setup_admin_handlers(bot):
+    """Настройка административных обработчиков"""
+
+    @bot.message_handler(commands=['stats'])
+    @admin_required
+    async def stats_command(message):
+        """Статистика по счетчикам хранилища"""
+        stats = await run_blocking(get_user_statistics)
+        text = get_stats_text(stats) + get_callback_stats_text(get_callback_router(bot).stats())
+        if getattr(bot, 'outbox', None) is not None:
+            text += get_outbox_stats_text(bot.outbox.stats())
+        await bot.send_message(message.chat.id, text, parse_mode='Markdown')
+
+    @bot.message_handler(commands=['broadcast'])
+    @admin_required
+    async def broadcast_command(message):
+        """Рассылка: поток рассылки отправляет сообщения через event loop бота"""
+        engine = get_broadcast_engine(bot)
+        args = message.text.split(maxsplit=2)
+        command = args[1].lower() if len(args) > 1 else ''
+
+        if command == 'status':
+            status = engine.status()
+            await bot.send_message(message.chat.id,
+                                   get_broadcast_progress_text(status) if status else BROADCAST_NOT_FOUND_TEXT,
+                                   parse_mode='Markdown' if status else None)
+        elif command == 'stop':
+            await bot.send_message(message.chat.id, BROADCAST_STOPPING_TEXT if engine.stop() else BROADCAST_NOT_FOUND_TEXT)
+        elif command == 'resume':
+            if engine.is_running():
+                await bot.send_message(message.chat.id, BROADCAST_BUSY_TEXT)
+            elif not engine.resume():
+                await bot.send_message(message.chat.id, BROADCAST_NOT_FOUND_TEXT)
+        elif len(args) == 3 and is_valid_audience(command):
+            if not engine.start(args[2], command, message.chat.id):
+                await bot.send_message(message.chat.id, BROADCAST_BUSY_TEXT)
+        else:
+            await bot.send_message(message.chat.id, BROADCAST_USAGE_TEXT)
@@ -0,0 +1,6 @@
+# handlers/aio/payment_processing.py - обработчики платежей (асинхронный режим)
+
+def setup_payment_handlers(bot):
+    """Настройка обработчиков для платежей"""
+    # Обработчики платежей настраиваются через webhook в webhook.py
+    pass
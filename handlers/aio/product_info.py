@@ -0,0 +1,36 @@
+# handlers/aio/product_info.py - информация о продукте и ценах (асинхронный режим)
+
+from keyboards.inline_keyboards import get_product_keyboard, get_pricing_keyboard, get_main_menu_keyboard
+from services.messages import PRODUCT_INFO_TEXT, PRICING_TEXT, WELCOME_TEXT
+from utils.async_runtime import edit_message_later
+
+def setup_product_handlers(bot):
+    """Настройка обработчиков для продукта и цен"""
+
+    @bot.message_handler(commands=['product'])
+    async def product_command(message):
+        await bot.send_message(message.chat.id, PRODUCT_INFO_TEXT,
+                               reply_markup=get_product_keyboard(), parse_mode='Markdown')
+
+    @bot.message_handler(commands=['pricing'])
+    async def pricing_command(message):
+        await bot.send_message(message.chat.id, PRICING_TEXT,
+                               reply_markup=get_pricing_keyboard(), parse_mode='Markdown')
+
+async def product_info(bot, call):
+    """Показать информацию о продукте"""
+    await bot.answer_callback_query(call.id)
+    edit_message_later(bot, call.message.chat.id, call.message.message_id, PRODUCT_INFO_TEXT,
+                       parse_mode='Markdown', reply_markup=get_product_keyboard())
+
+async def pricing_info(bot, call):
+    """Показать цены и тарифы"""
+    await bot.answer_callback_query(call.id)
+    edit_message_later(bot, call.message.chat.id, call.message.message_id, PRICING_TEXT,
+                       parse_mode='Markdown', reply_markup=get_pricing_keyboard())
+
+async def back_to_main(bot, call):
+    """Возврат в главное меню"""
+    await bot.answer_callback_query(call.id)
+    edit_message_later(bot, call.message.chat.id, call.message.message_id, WELCOME_TEXT,
+                       reply_markup=get_main_menu_keyboard())
@@ -0,0 +1,89 @@
+# handlers/aio/start.py - команды start, status и удаление подписки (асинхронный режим)
+
+from keyboards.inline_keyboards import get_main_menu_keyboard, get_status_keyboard, get_delete_confirmation_keyboard
+from services.subscription_service import get_user_subscription, get_subscription_status_text, cancel_subscription
+from services.user_service import get_or_create_user
+from services.messages import WELCOME_TEXT, SUBSCRIPTION_DELETED_TEXT, SUBSCRIPTION_DELETE_ERROR_TEXT, get_delete_warning_text
+from utils.async_bot import cleanup_chat
+from utils.callback_router import get_callback_router
+from utils.async_runtime import run_blocking
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+async def _save_user(from_user):
+    """Сохранение/обновление данных пользователя в пуле потоков"""
+    return await run_blocking(
+        get_or_create_user,
+        user_id=from_user.id,
+        username=from_user.username,
+        first_name=from_user.first_name,
+        last_name=from_user.last_name,
+        language_code=from_user.language_code
+    )
+
+def setup_start_handlers(bot):
+    """Настройка обработчиков для команд start и основных"""
+    router = get_callback_router(bot)
+
+    @bot.message_handler(commands=['start'])
+    async def start(message):
+        user = await _save_user(message.from_user)
+        logger.info(f"User {user.user_id} started bot")
+
+        # Сначала приветствие, затем в фоне удаляем прежние сообщения бота в этом чате
+        welcome = await bot.send_message(message.chat.id, WELCOME_TEXT, reply_markup=get_main_menu_keyboard())
+        cleanup_chat(bot, message.chat.id, keep=[welcome.message_id])
+
+    @bot.message_handler(commands=['status'])
+    async def status_command(message):
+        await _save_user(message.from_user)
+
+        subscription = await run_blocking(get_user_subscription, message.from_user.id)
+        status_text = get_subscription_status_text(subscription)
+
+        await bot.send_message(message.chat.id, status_text,
+                               reply_markup=get_status_keyboard(), parse_mode='Markdown')
+
+    @router.route('delete_subscription')
+    async def delete_subscription_callback(call):
+        """Обработчик кнопки удаления подписки"""
+        subscription = await run_blocking(get_user_subscription, call.from_user.id)
+
+        if not subscription or subscription.status != 'active':
+            await bot.answer_callback_query(call.id, "У вас нет активной подписки для удаления")
+            return
+
+        warning_text = get_delete_warning_text(subscription.plan_name, subscription.price)
+        await bot.edit_message_text(chat_id=call.message.chat.id,
+                                    message_id=call.message.message_id,
+                                    text=warning_text,
+                                    reply_markup=get_delete_confirmation_keyboard(),
+                                    parse_mode='Markdown')
+        await bot.answer_callback_query(call.id)
+
+    @router.route('confirm_delete')
+    async def confirm_delete_callback(call):
+        """Обработчик подтверждения удаления подписки"""
+        success = await run_blocking(cancel_subscription, call.from_user.id)
+
+        result_text = SUBSCRIPTION_DELETED_TEXT if success else SUBSCRIPTION_DELETE_ERROR_TEXT
+        await bot.edit_message_text(chat_id=call.message.chat.id,
+                                    message_id=call.message.message_id,
+                                    text=result_text,
+                                    reply_markup=get_main_menu_keyboard(),
+                                    parse_mode='Markdown')
+        await bot.answer_callback_query(call.id)
+
+    @router.route('cancel_delete')
+    async def cancel_delete_callback(call):
+        """Обработчик отмены удаления подписки"""
+        subscription = await run_blocking(get_user_subscription, call.from_user.id)
+        status_text = get_subscription_status_text(subscription)
+
+        await bot.edit_message_text(chat_id=call.message.chat.id,
+                                    message_id=call.message.message_id,
+                                    text=status_text,
+                                    reply_markup=get_status_keyboard(),
+                                    parse_mode='Markdown')
+        await bot.answer_callback_query(call.id, "Удаление отменено")
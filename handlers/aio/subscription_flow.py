@@ -0,0 +1,120 @@
+# handlers/aio/subscription_flow.py - подписки, платежи и callback запросы (асинхронный режим)
+
+import asyncio
+
+from config import PLANS
+from keyboards.inline_keyboards import get_subscription_keyboard, get_main_menu_keyboard, get_payment_keyboard
+from services.payment_service import submit_payment, process_payment_success_async
+from services.subscription_service import get_user_subscription, get_subscription_status_text, activate_subscription
+from services.messages import SUBSCRIPTION_PLANS_TEXT, WELCOME_TEXT, PAYMENT_UNAVAILABLE_TEXT, get_payment_text
+from services.payment_gateway import PaymentGatewayUnavailable
+from handlers.aio.product_info import product_info, pricing_info, back_to_main
+from utils.async_bot import cleanup_chat
+from utils.async_runtime import run_blocking, edit_message_later
+from utils.callback_router import get_callback_router
+from utils.render_cache import is_message_current
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+async def create_payment(bot, call, plan: str):
+    """Создание платежа: запрос к YooKassa и запись в БД выполняются в пуле платежных потоков"""
+    if plan not in PLANS:
+        await bot.answer_callback_query(call.id, "Неверный план подписки")
+        return None
+
+    plan_info = PLANS[plan]
+    try:
+        payment_id, payment_url = await asyncio.wrap_future(submit_payment(
+            call.from_user.id, call.message.chat.id, call.message.message_id, plan, call.message.chat.username))
+    except PaymentGatewayUnavailable as e:
+        logger.error(f"Payment creation failed, YooKassa unavailable: {e}")
+        await bot.answer_callback_query(call.id, PAYMENT_UNAVAILABLE_TEXT, show_alert=True)
+        return None
+    except Exception as e:
+        logger.error(f"Payment creation error: {e}")
+        await bot.answer_callback_query(call.id, f"Ошибка создания платежа: {str(e)}")
+        return None
+
+    payment_text = get_payment_text(plan_info['name'], plan_info['price'], plan_info['description'])
+    await bot.answer_callback_query(call.id)
+    edit_message_later(bot, call.message.chat.id, call.message.message_id, payment_text,
+                       parse_mode='Markdown', reply_markup=get_payment_keyboard(payment_url))
+    return payment_id
+
+def setup_subscription_handlers(bot):
+    """Настройка обработчиков для подписок"""
+
+    @bot.message_handler(commands=['subscribe'])
+    async def subscribe_command(message):
+        await bot.send_message(message.chat.id, SUBSCRIPTION_PLANS_TEXT,
+                               reply_markup=get_subscription_keyboard())
+
+    @bot.message_handler(commands=['testpay'])
+    async def test_payment_command(message):
+        """Тестовая команда для имитации оплаты"""
+        try:
+            args = message.text.split()
+            if len(args) < 2:
+                await bot.reply_to(message, "Использование: /testpay <basic|premium|vip>\nПример: /testpay basic")
+                return
+
+            plan = args[1].lower()
+            if plan not in ['basic', 'premium', 'vip']:
+                await bot.reply_to(message, "Неверный план. Используйте: basic, premium или vip")
+                return
+
+            await run_blocking(activate_subscription, message.from_user.id, plan)
+            await process_payment_success_async(bot, f"test_payment_{message.from_user.id}")
+
+            await bot.reply_to(message, f"✅ Тестовый платеж обработан!\nПодписка {plan.upper()} активирована.")
+
+        except Exception as e:
+            await bot.reply_to(message, f"Ошибка тестирования платежа: {str(e)}")
+
+def setup_callback_handlers(bot):
+    """Настройка обработчиков callback запросов"""
+    router = get_callback_router(bot)
+
+    @router.route('product')
+    async def product_callback(call):
+        await product_info(bot, call)
+
+    @router.route('pricing')
+    async def pricing_callback(call):
+        await pricing_info(bot, call)
+
+    @router.route('status')
+    async def status_callback(call):
+        subscription = await run_blocking(get_user_subscription, call.from_user.id)
+        status_text = get_subscription_status_text(subscription)
+
+        markup = get_main_menu_keyboard()
+        chat_id, message_id = call.message.chat.id, call.message.message_id
+
+        if is_message_current(chat_id, message_id, status_text, 'Markdown', markup):
+            await bot.answer_callback_query(call.id, "Статус уже отображается")
+            return
+
+        await bot.answer_callback_query(call.id)
+        edit_message_later(bot, chat_id, message_id, status_text,
+                           reply_markup=markup, parse_mode='Markdown')
+
+    @router.route('main_menu')
+    async def main_menu_callback(call):
+        # Возврат в главное меню: приветствие отправляем сразу, старые сообщения бота удаляются в фоне
+        await bot.answer_callback_query(call.id)
+        welcome = await bot.send_message(call.message.chat.id, WELCOME_TEXT, reply_markup=get_main_menu_keyboard())
+        cleanup_chat(bot, call.message.chat.id, keep=[welcome.message_id])
+
+    @router.route('back')
+    async def back_callback(call):
+        await back_to_main(bot, call)
+
+    @router.route('subscribe', str)
+    async def subscribe_callback(call, plan):
+        await create_payment(bot, call, plan)
+
+    @router.route('pay', str)
+    async def pay_callback(call, plan):
+        await process_payment_success_async(bot, plan)
@@ -4,14 +4,16 @@ from keyboards.inline_keyboards import get_main_menu_keyboard, get_status_keyboa
 from keyboards.reply_keyboards import get_reply_keyboard
 from services.subscription_service import get_user_subscription, get_subscription_status_text, cancel_subscription
 from services.user_service import get_or_create_user
-from services.messages import WELCOME_TEXT
+from services.messages import WELCOME_TEXT, SUBSCRIPTION_DELETED_TEXT, SUBSCRIPTION_DELETE_ERROR_TEXT, get_delete_warning_text
+from utils.callback_router import get_callback_router
+from utils.chat_cleanup import cleanup_chat_after
 from utils.logger import get_logger
-import time
 
 logger = get_logger(__name__)
 
 def setup_start_handlers(bot):
     """Настройка обработчиков для команд start и основных"""
+    router = get_callback_router(bot)
 
     @bot.message_handler(commands=['start'])
     def start(message):
@@ -25,19 +27,10 @@ def setup_start_handlers(bot):
         )
         logger.info(f"User {user.user_id} started bot")
 
-        # Очищаем историю сообщений при старте
-        try:
-            # Удаляем все сообщения в чате (кроме системных)
-            for message_id in range(message.message_id - 10, message.message_id):
-                try:
-                    bot.delete_message(message.chat.id, message_id)
-                except:
-                    pass
-        except Exception as e:
-            logger.warning(f"Error clearing chat: {e}")
-
+        # Сначала приветствие, после его отправки в фоне удаляем прежние сообщения бота в этом чате
         markup = get_main_menu_keyboard()
-        bot.send_message(message.chat.id, WELCOME_TEXT, reply_markup=markup)
+        welcome = bot.send_message_nowait(message.chat.id, WELCOME_TEXT, reply_markup=markup)
+        cleanup_chat_after(bot, message.chat.id, welcome)
 
     @bot.message_handler(commands=['status'])
     def status_command(message):
@@ -54,10 +47,10 @@ def setup_start_handlers(bot):
         status_text = get_subscription_status_text(subscription)
 
         markup = get_status_keyboard()  # Используем клавиатуру статуса с кнопкой удаления
-        bot.send_message(message.chat.id, status_text,
-                        reply_markup=markup, parse_mode='Markdown')
+        bot.send_message_nowait(message.chat.id, status_text,
+                                reply_markup=markup, parse_mode='Markdown')
 
-    @bot.callback_query_handler(func=lambda call: call.data == "delete_subscription")
+    @router.route('delete_subscription')
     def delete_subscription_callback(call):
         """Обработчик кнопки удаления подписки"""
         subscription = get_user_subscription(call.from_user.id)
@@ -67,67 +60,41 @@ def setup_start_handlers(bot):
             return
 
         # Показываем сообщение с подтверждением
-        warning_text = f"""
-⚠️ **Внимание! Удаление подписки**
-
-Вы собираетесь удалить подписку:
-**{subscription.plan_name}** ({subscription.price}₽/месяц)
-
-После удаления:
-• Подписка станет недоступной
-• Доступ к сервису прекратится
-• Средства не возвращаются
-
-Это действие нельзя отменить!
-"""
+        warning_text = get_delete_warning_text(subscription.plan_name, subscription.price)
 
         markup = get_delete_confirmation_keyboard()
-        bot.edit_message_text(chat_id=call.message.chat.id,
-                            message_id=call.message.message_id,
-                            text=warning_text,
-                            reply_markup=markup,
-                            parse_mode='Markdown')
+        bot.edit_message_text_nowait(chat_id=call.message.chat.id,
+                                     message_id=call.message.message_id,
+                                     text=warning_text,
+                                     reply_markup=markup,
+                                     parse_mode='Markdown')
         bot.answer_callback_query(call.id)
 
-    @bot.callback_query_handler(func=lambda call: call.data == "confirm_delete")
+    @router.route('confirm_delete')
     def confirm_delete_callback(call):
         """Обработчик подтверждения удаления подписки"""
         success = cancel_subscription(call.from_user.id)
 
-        if success:
-            result_text = """
-✅ **Подписка удалена**
-
-Ваша подписка была успешно отменена.
-Доступ к сервису прекращен.
-"""
-            markup = get_main_menu_keyboard()
-        else:
-            result_text = """
-❌ **Ошибка удаления**
-
-Не удалось удалить подписку.
-Возможно, у вас нет активной подписки.
-"""
-            markup = get_main_menu_keyboard()
-
-        bot.edit_message_text(chat_id=call.message.chat.id,
-                            message_id=call.message.message_id,
-                            text=result_text,
-                            reply_markup=markup,
-                            parse_mode='Markdown')
+        result_text = SUBSCRIPTION_DELETED_TEXT if success else SUBSCRIPTION_DELETE_ERROR_TEXT
+        markup = get_main_menu_keyboard()
+
+        bot.edit_message_text_nowait(chat_id=call.message.chat.id,
+                                     message_id=call.message.message_id,
+                                     text=result_text,
+                                     reply_markup=markup,
+                                     parse_mode='Markdown')
         bot.answer_callback_query(call.id)
 
-    @bot.callback_query_handler(func=lambda call: call.data == "cancel_delete")
+    @router.route('cancel_delete')
     def cancel_delete_callback(call):
         """Обработчик отмены удаления подписки"""
         subscription = get_user_subscription(call.from_user.id)
         status_text = get_subscription_status_text(subscription)
 
         markup = get_status_keyboard()
-        bot.edit_message_text(chat_id=call.message.chat.id,
-                            message_id=call.message.message_id,
-                            text=status_text,
-                            reply_markup=markup,
-                            parse_mode='Markdown')
+        bot.edit_message_text_nowait(chat_id=call.message.chat.id,
+                                     message_id=call.message.message_id,
+                                     text=status_text,
+                                     reply_markup=markup,
+                                     parse_mode='Markdown')
         bot.answer_callback_query(call.id, "Удаление отменено")
@@ -4,7 +4,10 @@ from keyboards.inline_keyboards import get_subscription_keyboard, get_main_menu_
 from services.payment_service import create_payment, process_payment_success
 from services.subscription_service import get_user_subscription, get_subscription_status_text
 from services.messages import SUBSCRIPTION_PLANS_TEXT
-import time
+from utils.callback_router import get_callback_router
+from utils.chat_cleanup import cleanup_chat_after
+from utils.delayed_actions import edit_message_later
+from utils.render_cache import is_message_current
 
 def setup_subscription_handlers(bot):
     """Настройка обработчиков для подписок"""
@@ -12,8 +15,8 @@ def setup_subscription_handlers(bot):
     @bot.message_handler(commands=['subscribe'])
     def subscribe_command(message):
         markup = get_subscription_keyboard()
-        bot.send_message(message.chat.id, SUBSCRIPTION_PLANS_TEXT,
-                        reply_markup=markup)
+        bot.send_message_nowait(message.chat.id, SUBSCRIPTION_PLANS_TEXT,
+                                reply_markup=markup)
 
     @bot.message_handler(commands=['testpay'])
     def test_payment_command(message):
@@ -22,12 +25,12 @@ def setup_subscription_handlers(bot):
         try:
             args = message.text.split()
             if len(args) < 2:
-                bot.reply_to(message, "Использование: /testpay <basic|premium|vip>\nПример: /testpay basic")
+                bot.reply_to_nowait(message, "Использование: /testpay <basic|premium|vip>\nПример: /testpay basic")
                 return
 
             plan = args[1].lower()
             if plan not in ['basic', 'premium', 'vip']:
-                bot.reply_to(message, "Неверный план. Используйте: basic, premium или vip")
+                bot.reply_to_nowait(message, "Неверный план. Используйте: basic, premium или vip")
                 return
 
             # Имитируем успешный платеж
@@ -36,75 +39,59 @@ def setup_subscription_handlers(bot):
             activate_subscription(message.from_user.id, plan)
             process_payment_success(bot, f"test_payment_{message.from_user.id}")
 
-            bot.reply_to(message, f"✅ Тестовый платеж обработан!\nПодписка {plan.upper()} активирована.")
+            bot.reply_to_nowait(message, f"✅ Тестовый платеж обработан!\nПодписка {plan.upper()} активирована.")
 
         except Exception as e:
-            bot.reply_to(message, f"Ошибка тестирования платежа: {str(e)}")
+            bot.reply_to_nowait(message, f"Ошибка тестирования платежа: {str(e)}")
 
 def setup_callback_handlers(bot):
     """Настройка обработчиков callback запросов"""
-
-    @bot.callback_query_handler(func=lambda call: True)
-    def callback_handler(call):
-        if call.data == "product":
-            from handlers.product_info import product_info
-            product_info(bot, call)
-        elif call.data == "pricing":
-            from handlers.product_info import pricing_info
-            pricing_info(bot, call)
-        elif call.data == "status":
-            subscription = get_user_subscription(call.from_user.id)
-            status_text = get_subscription_status_text(subscription)
-
-            markup = get_main_menu_keyboard()
-            time.sleep(1)
-
-            # Проверяем, нужно ли редактировать сообщение
-            try:
-                # Пытаемся получить информацию о текущем сообщении
-                current_message = bot.get_message(call.message.chat.id, call.message.message_id)
-                current_text = current_message.text
-                current_markup = current_message.reply_markup
-
-                # Если текст и разметка одинаковые, просто отвечаем на callback
-                if current_text == status_text and str(current_markup) == str(markup):
-                    bot.answer_callback_query(call.id, "Статус уже отображается")
-                    return
-
-                # Иначе редактируем сообщение
-                bot.edit_message_text(chat_id=call.message.chat.id,
-                                    message_id=call.message.message_id,
-                                    text=status_text,
-                                    reply_markup=markup,
-                                    parse_mode='Markdown')
-            except Exception as e:
-                # Если не можем получить сообщение, просто редактируем
-                bot.edit_message_text(chat_id=call.message.chat.id,
-                                    message_id=call.message.message_id,
-                                    text=status_text,
-                                    reply_markup=markup,
-                                    parse_mode='Markdown')
-        elif call.data == "main_menu":
-            # Очистка сообщений и возврат в главное меню
-            try:
-                # Удаляем все сообщения в чате (кроме системных)
-                for message_id in range(call.message.message_id - 10, call.message.message_id + 1):
-                    try:
-                        bot.delete_message(call.message.chat.id, message_id)
-                    except:
-                        pass
-            except Exception as e:
-                print(f"Error clearing chat: {e}")
-
-            from services.messages import WELCOME_TEXT
-            markup = get_main_menu_keyboard()
-            bot.send_message(call.message.chat.id, WELCOME_TEXT, reply_markup=markup)
-        elif call.data == "back":
-            from handlers.product_info import back_to_main
-            back_to_main(bot, call)
-        elif call.data.startswith("subscribe_"):
-            plan = call.data.split("_")[1]
-            create_payment(bot, call, plan)
-        elif call.data.startswith("pay_"):
-            plan = call.data.split("_")[1]
-            process_payment_success(bot, plan)
+    from handlers.product_info import product_info, pricing_info, back_to_main
+
+    router = get_callback_router(bot)
+
+    @router.route('product')
+    def product_callback(call):
+        product_info(bot, call)
+
+    @router.route('pricing')
+    def pricing_callback(call):
+        pricing_info(bot, call)
+
+    @router.route('status')
+    def status_callback(call):
+        subscription = get_user_subscription(call.from_user.id)
+        status_text = get_subscription_status_text(subscription)
+
+        markup = get_main_menu_keyboard()
+        chat_id, message_id = call.message.chat.id, call.message.message_id
+
+        # Сравнение с кэшем отображенных сообщений - без запросов к API
+        if is_message_current(chat_id, message_id, status_text, 'Markdown', markup):
+            bot.answer_callback_query(call.id, "Статус уже отображается")
+            return
+
+        bot.answer_callback_query(call.id)
+        edit_message_later(bot, chat_id, message_id, status_text,
+                           reply_markup=markup, parse_mode='Markdown')
+
+    @router.route('main_menu')
+    def main_menu_callback(call):
+        # Возврат в главное меню: приветствие отправляем сразу, старые сообщения бота удаляются в фоне
+        from services.messages import WELCOME_TEXT
+        markup = get_main_menu_keyboard()
+        bot.answer_callback_query(call.id)
+        welcome = bot.send_message_nowait(call.message.chat.id, WELCOME_TEXT, reply_markup=markup)
+        cleanup_chat_after(bot, call.message.chat.id, welcome)
+
+    @router.route('back')
+    def back_callback(call):
+        back_to_main(bot, call)
+
+    @router.route('subscribe', str)
+    def subscribe_callback(call, plan):
+        create_payment(bot, call, plan)
+
+    @router.route('pay', str)
+    def pay_callback(call, plan):
+        process_payment_success(bot, plan)
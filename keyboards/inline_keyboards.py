@@ -1,9 +1,40 @@
 # keyboards/inline_keyboards.py - Inline клавиатуры бота
 
+import json
+import threading
+from typing import Dict, Callable, Tuple
 from telebot import types
+from config import PLANS
+from utils.callback_router import encode_callback
 
-def get_main_menu_keyboard():
-    """Главная клавиатура с основными кнопками"""
+class PrebuiltMarkup(types.JsonSerializable):
+    """Клавиатура, сериализованная заранее: telebot отправляет готовую JSON строку"""
+    __slots__ = ('_json',)
+
+    def __init__(self, markup_json: str):
+        self._json = markup_json
+
+    def to_json(self) -> str:
+        return self._json
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, PrebuiltMarkup) and other._json == self._json
+
+    def __hash__(self) -> int:
+        return hash(self._json)
+
+# ===== ПОСТРОЕНИЕ КЛАВИАТУР =====
+
+def _plan_buttons():
+    """Кнопки оформления подписки по тарифам из PLANS"""
+    return [
+        types.InlineKeyboardButton(
+            f"{plan_info.get('emoji', '🔹')} Оформить {plan_info.get('short_name', plan_info['name'])} ({plan_info['price']}₽)",
+            callback_data=encode_callback("subscribe", plan))
+        for plan, plan_info in PLANS.items()
+    ]
+
+def _build_main_menu():
     markup = types.InlineKeyboardMarkup(row_width=1)
     product_btn = types.InlineKeyboardButton("📦 Подробная информация о продукте", callback_data="product")
     pricing_btn = types.InlineKeyboardButton("💰 Посмотреть цены и тарифы", callback_data="pricing")
@@ -12,63 +43,114 @@ def get_main_menu_keyboard():
     markup.add(product_btn, pricing_btn, status_btn, menu_btn)
     return markup
 
-def get_product_keyboard():
-    """Клавиатура для раздела продукта"""
+def _build_plans():
     markup = types.InlineKeyboardMarkup(row_width=1)
-    basic_btn = types.InlineKeyboardButton("🟢 Оформить Базовый (999₽)", callback_data="subscribe_basic")
-    premium_btn = types.InlineKeyboardButton("🟡 Оформить Премиум (1999₽)", callback_data="subscribe_premium")
-    vip_btn = types.InlineKeyboardButton("🟠 Оформить VIP (3999₽)", callback_data="subscribe_vip")
     back_btn = types.InlineKeyboardButton("⬅️ Назад в главное меню", callback_data="back")
-    markup.add(basic_btn, premium_btn, vip_btn, back_btn)
+    markup.add(*_plan_buttons(), back_btn)
     return markup
 
-def get_pricing_keyboard():
-    """Клавиатура для раздела цен с кнопками покупки"""
+def _build_success():
+    markup = types.InlineKeyboardMarkup()
+    back_btn = types.InlineKeyboardButton("🏠 В главное меню", callback_data="back")
+    markup.add(back_btn)
+    return markup
+
+def _build_status():
     markup = types.InlineKeyboardMarkup(row_width=1)
-    basic_btn = types.InlineKeyboardButton("🟢 Оформить Базовый (999₽)", callback_data="subscribe_basic")
-    premium_btn = types.InlineKeyboardButton("🟡 Оформить Премиум (1999₽)", callback_data="subscribe_premium")
-    vip_btn = types.InlineKeyboardButton("🟠 Оформить VIP (3999₽)", callback_data="subscribe_vip")
-    back_btn = types.InlineKeyboardButton("⬅️ Назад в главное меню", callback_data="back")
-    markup.add(basic_btn, premium_btn, vip_btn, back_btn)
+    delete_btn = types.InlineKeyboardButton("🗑️ Удалить подписку", callback_data="delete_subscription")
+    back_btn = types.InlineKeyboardButton("🏠 В главное меню", callback_data="back")
+    markup.add(delete_btn, back_btn)
     return markup
 
-def get_subscription_keyboard():
-    """Клавиатура выбора тарифов"""
+def _build_delete_confirmation():
     markup = types.InlineKeyboardMarkup(row_width=1)
-    basic_btn = types.InlineKeyboardButton("🟢 Оформить Базовый (999₽)", callback_data="subscribe_basic")
-    premium_btn = types.InlineKeyboardButton("🟡 Оформить Премиум (1999₽)", callback_data="subscribe_premium")
-    vip_btn = types.InlineKeyboardButton("🟠 Оформить VIP (3999₽)", callback_data="subscribe_vip")
-    back_btn = types.InlineKeyboardButton("⬅️ Назад в главное меню", callback_data="back")
-    markup.add(basic_btn, premium_btn, vip_btn, back_btn)
+    confirm_btn = types.InlineKeyboardButton("✅ Подтверждаю удаление", callback_data="confirm_delete")
+    cancel_btn = types.InlineKeyboardButton("❌ Отмена", callback_data="cancel_delete")
+    markup.add(confirm_btn, cancel_btn)
     return markup
 
-def get_payment_keyboard(payment_url):
-    """Клавиатура для оплаты"""
+# Заглушка URL в шаблоне клавиатуры оплаты
+_URL_PLACEHOLDER = 'https://payment.url/placeholder'
+
+def _build_payment_template() -> Tuple[str, str]:
     markup = types.InlineKeyboardMarkup()
-    pay_btn = types.InlineKeyboardButton("💳 Оплатить", url=payment_url)
+    pay_btn = types.InlineKeyboardButton("💳 Оплатить", url=_URL_PLACEHOLDER)
     back_btn = types.InlineKeyboardButton("⬅️ Назад к тарифам", callback_data="back")
     markup.add(pay_btn, back_btn)
-    return markup
+    prefix, suffix = markup.to_json().split(json.dumps(_URL_PLACEHOLDER))
+    return prefix, suffix
+
+_BUILDERS: Dict[str, Callable] = {
+    'main_menu': _build_main_menu,
+    'plans': _build_plans,
+    'success': _build_success,
+    'status': _build_status,
+    'delete_confirmation': _build_delete_confirmation
+}
+
+# ===== КЭШ =====
+
+_cache: Dict[str, PrebuiltMarkup] = {}
+_payment_template: Tuple[str, str] = ('', '')
+_plans_signature = None
+_lock = threading.Lock()
+
+def _signature():
+    return tuple((plan, plan_info['price'], plan_info['name'], plan_info.get('short_name'), plan_info.get('emoji'))
+                 for plan, plan_info in PLANS.items())
+
+def build_keyboards():
+    """Построить и сериализовать все статические клавиатуры (при старте и после изменения PLANS)"""
+    global _cache, _payment_template, _plans_signature
+    with _lock:
+        _cache = {name: PrebuiltMarkup(builder().to_json()) for name, builder in _BUILDERS.items()}
+        _payment_template = _build_payment_template()
+        _plans_signature = _signature()
+
+def invalidate_keyboards():
+    """Сбросить кэш клавиатур - они будут построены заново при следующем обращении"""
+    global _plans_signature
+    _plans_signature = None
+
+def _get(name: str) -> PrebuiltMarkup:
+    # Проверка по отпечатку PLANS: изменение цены или названия перестраивает кнопки
+    if _plans_signature is None or _plans_signature != _signature():
+        build_keyboards()
+    return _cache[name]
+
+# ===== КЛАВИАТУРЫ =====
+
+def get_main_menu_keyboard():
+    """Главная клавиатура с основными кнопками"""
+    return _get('main_menu')
+
+def get_product_keyboard():
+    """Клавиатура для раздела продукта"""
+    return _get('plans')
+
+def get_pricing_keyboard():
+    """Клавиатура для раздела цен с кнопками покупки"""
+    return _get('plans')
+
+def get_subscription_keyboard():
+    """Клавиатура выбора тарифов"""
+    return _get('plans')
+
+def get_payment_keyboard(payment_url):
+    """Клавиатура для оплаты (URL подставляется в готовый JSON шаблон)"""
+    prefix, suffix = _payment_template
+    return PrebuiltMarkup(prefix + json.dumps(payment_url) + suffix)
 
 def get_success_keyboard():
     """Клавиатура после успешной оплаты"""
-    markup = types.InlineKeyboardMarkup()
-    back_btn = types.InlineKeyboardButton("🏠 В главное меню", callback_data="back")
-    markup.add(back_btn)
-    return markup
+    return _get('success')
 
 def get_status_keyboard():
     """Клавиатура для статуса подписки"""
-    markup = types.InlineKeyboardMarkup(row_width=1)
-    delete_btn = types.InlineKeyboardButton("🗑️ Удалить подписку", callback_data="delete_subscription")
-    back_btn = types.InlineKeyboardButton("🏠 В главное меню", callback_data="back")
-    markup.add(delete_btn, back_btn)
-    return markup
+    return _get('status')
 
 def get_delete_confirmation_keyboard():
     """Клавиатура подтверждения удаления подписки"""
-    markup = types.InlineKeyboardMarkup(row_width=1)
-    confirm_btn = types.InlineKeyboardButton("✅ Подтверждаю удаление", callback_data="confirm_delete")
-    cancel_btn = types.InlineKeyboardButton("❌ Отмена", callback_data="cancel_delete")
-    markup.add(confirm_btn, cancel_btn)
-    return markup
+    return _get('delete_confirmation')
+
+build_keyboards()
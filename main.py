@@ -1,11 +1,60 @@
 # main.py - главный файл бота
 
 import sys
-import telebot
-from config import API_TOKEN, DEBUG, ENVIRONMENT, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH
+import asyncio
+import threading
+from config import API_TOKEN, DEBUG, ENVIRONMENT, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH, BOT_RUNTIME, UPDATE_WORKERS
+from config import SEND_RATE_GLOBAL, SEND_RATE_CHAT, SEND_CHAT_BURST, SEND_WORKERS, SEND_MAX_RETRIES
 from handlers import setup_handlers
+from utils.bot import SalesBot
+from utils.outbox import Outbox, AsyncOutbox
 from utils.logger import setup_logging, get_logger
-from db.database import init_database, check_expired_subscriptions
+from db.database import init_database
+from services.expiry_scheduler import start_expiry_scheduler
+from services.subscription_service import notify_expired_subscriptions, notify_expired_subscriptions_async
+from services.broadcast_service import resume_broadcast
+
+async def run_async_bot(logger):
+    """Асинхронный режим: AsyncTeleBot с общей aiohttp сессией.
+
+    Обработчики из handlers.aio не занимают потоки на время запросов к Bot API,
+    хранилище и YooKassa вызываются через пул потоков utils.async_runtime.
+    """
+    from utils.async_bot import AsyncSalesBot
+    from handlers.aio import setup_handlers as setup_async_handlers
+    from utils.async_runtime import configure_http_session, close_http_session
+
+    configure_http_session()
+    outbox = AsyncOutbox(SEND_RATE_GLOBAL, SEND_RATE_CHAT, SEND_CHAT_BURST, max_retries=SEND_MAX_RETRIES)
+    bot = AsyncSalesBot(API_TOKEN, outbox=outbox)
+    logger.info("✅ Асинхронный бот инициализирован")
+
+    setup_async_handlers(bot)
+    logger.info("✅ Обработчики настроены")
+
+    # Рассылка и планировщик работают в своих потоках - вызовы бота передают в этот event loop
+    loop = asyncio.get_running_loop()
+    if resume_broadcast(bot, loop):
+        logger.info("✅ Незавершенная рассылка продолжена")
+
+    start_expiry_scheduler(lambda user_ids: asyncio.run_coroutine_threadsafe(
+        notify_expired_subscriptions_async(bot, user_ids), loop))
+    logger.info("✅ Планировщик истечения подписок запущен")
+
+    if ENVIRONMENT == 'production':
+        # Уведомления YooKassa принимает Flask приложение в отдельном потоке
+        from webhook import app, start_webhook_workers
+        start_webhook_workers()
+        threading.Thread(target=app.run, name='yookassa-webhook', daemon=True,
+                         kwargs={'host': '0.0.0.0', 'port': WEBHOOK_PORT, 'use_reloader': False}).start()
+        logger.info(f"✅ Webhook сервер YooKassa запущен на порту {WEBHOOK_PORT}")
+
+    logger.info("🎯 Бот запущен и готов к работе (async)!")
+    try:
+        await bot.delete_webhook()
+        await bot.infinity_polling(timeout=30)
+    finally:
+        await close_http_session()
 
 def main():
     """Главная функция приложения"""
@@ -28,14 +77,30 @@ def main():
         logger.info(f"🌍 Среда: {ENVIRONMENT}")
         logger.info(f"🐛 Режим отладки: {DEBUG}")
 
+        if BOT_RUNTIME == 'async':
+            asyncio.run(run_async_bot(logger))
+            return
+
         # Создаем бота
-        bot = telebot.TeleBot(API_TOKEN)
+        # Обновления одного чата обрабатываются по порядку, разных чатов - параллельно;
+        # исходящие сообщения идут через очередь с лимитами Bot API
+        outbox = Outbox(SEND_RATE_GLOBAL, SEND_RATE_CHAT, SEND_CHAT_BURST,
+                        workers=SEND_WORKERS, max_retries=SEND_MAX_RETRIES)
+        bot = SalesBot(API_TOKEN, chat_workers=UPDATE_WORKERS, outbox=outbox)
         logger.info("✅ Бот инициализирован")
 
         # Настраиваем обработчики
         setup_handlers(bot)
         logger.info("✅ Обработчики настроены")
 
+        # Рассылка, прерванная перезапуском, продолжается с места остановки
+        if resume_broadcast(bot):
+            logger.info("✅ Незавершенная рассылка продолжена")
+
+        # Запускаем планировщик истечения подписок
+        start_expiry_scheduler(lambda user_ids: notify_expired_subscriptions(bot, user_ids))
+        logger.info("✅ Планировщик истечения подписок запущен")
+
         if ENVIRONMENT == 'production':
             # Production mode - используем webhook
             logger.info("🎯 Запуск в режиме webhook для production")
@@ -46,7 +111,8 @@ def main():
             logger.info(f"✅ Webhook установлен: {webhook_url}")
 
             # Запускаем Flask приложение для обработки webhook
-            from webhook import app
+            from webhook import app, start_webhook_workers
+            start_webhook_workers()
             app.run(host='0.0.0.0', port=WEBHOOK_PORT, debug=DEBUG)
 
         else:
@@ -0,0 +1,347 @@
+# services/broadcast_service.py - массовая рассылка с возобновлением после перезапуска
+
+import asyncio
+import inspect
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Optional, Iterator, Dict, Set, Tuple
+from config import PLANS, SEND_RATE_GLOBAL, BROADCAST_FILE, BROADCAST_CONCURRENCY, BROADCAST_REPORT_INTERVAL
+from db.database import iter_users, iter_subscriptions, get_statistics
+from utils.outbox import TokenBucket, send_priority, PRIORITY_BULK, PRIORITY_DEFAULT
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Получатели: все, с активной подпиской, без нее, с истекшей, по тарифу (ключ из PLANS)
+AUDIENCES = ('all', 'active', 'inactive', 'expired')
+
+STATUS_SENT = 's'
+STATUS_BLOCKED = 'b'  # пользователь заблокировал бота
+STATUS_FAILED = 'f'
+END_MARK = 'end'
+
+def is_valid_audience(audience: str) -> bool:
+    return audience in AUDIENCES or audience in PLANS
+
+def iter_recipients(audience: str) -> Iterator[int]:
+    """Потоковый проход по ID получателей рассылки"""
+    if audience == 'all':
+        for user in iter_users():
+            yield user.user_id
+    elif audience == 'inactive':
+        # В памяти только ID подписчиков, пользователи читаются порциями
+        active = {sub.user_id for sub in iter_subscriptions(status='active')}
+        for user in iter_users():
+            if user.user_id not in active:
+                yield user.user_id
+    elif audience in PLANS:
+        for sub in iter_subscriptions(status='active'):
+            if sub.plan == audience:
+                yield sub.user_id
+    else:
+        for sub in iter_subscriptions(status=audience):
+            yield sub.user_id
+
+def count_recipients(audience: str) -> int:
+    """Количество получателей (для all/active/inactive - по счетчикам хранилища)"""
+    if audience in ('all', 'active', 'inactive'):
+        stats = get_statistics()
+        if audience == 'all':
+            return stats['total_users']
+        if audience == 'active':
+            return stats['active_subscriptions']
+        return max(0, stats['total_users'] - stats['active_subscriptions'])
+    return sum(1 for _ in iter_recipients(audience))
+
+class BroadcastJournal:
+    """Журнал рассылки: первая строка - параметры (JSON), далее "user_id статус" на получателя.
+
+    Строки дописываются пачками по checkpoint_every, поэтому после сбоя повторно
+    получат сообщение не больше checkpoint_every пользователей. Завершенная
+    рассылка помечается строкой "end".
+    """
+
+    def __init__(self, path: str, checkpoint_every: int = 100):
+        self.path = path
+        self.checkpoint_every = checkpoint_every
+        self._buffer = []
+        self._file = None
+
+    def create(self, header: Dict):
+        self._close()
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(header, ensure_ascii=False) + '\n')
+
+    def load(self) -> Optional[Tuple[Dict, Set[int], Dict[str, int]]]:
+        """Незавершенная рассылка: (параметры, обработанные ID, счетчики) или None"""
+        if not os.path.exists(self.path):
+            return None
+        done: Set[int] = set()
+        counters = {STATUS_SENT: 0, STATUS_BLOCKED: 0, STATUS_FAILED: 0}
+        with open(self.path, 'r', encoding='utf-8') as f:
+            try:
+                header = json.loads(f.readline())
+            except ValueError:
+                logger.error(f"Broadcast journal {self.path} is corrupted")
+                return None
+            for line in f:
+                parts = line.split()
+                if parts == [END_MARK]:
+                    return None
+                # Оборванная последняя строка после сбоя пропускается
+                if len(parts) != 2 or parts[1] not in counters or not parts[0].lstrip('-').isdigit():
+                    continue
+                user_id = int(parts[0])
+                if user_id not in done:
+                    done.add(user_id)
+                    counters[parts[1]] += 1
+        return header, done, counters
+
+    def record(self, user_id: int, status: str):
+        self._buffer.append(f"{user_id} {status}\n")
+        if len(self._buffer) >= self.checkpoint_every:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+        if self._file is None:
+            self._file = open(self.path, 'a', encoding='utf-8')
+        self._file.write(''.join(self._buffer))
+        self._file.flush()
+        self._buffer.clear()
+
+    def finish(self):
+        self._buffer.append(END_MARK + '\n')
+        self.flush()
+        self._close()
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+class BroadcastEngine:
+    """Рассылка в фоновом потоке.
+
+    Получатели читаются из хранилища порциями, сообщения отправляются с
+    приоритетом PRIORITY_BULK через очередь бота (utils.outbox) - с максимальной
+    допустимой скоростью, но после ответов пользователям и подтверждений оплаты.
+    Прогресс пишется в журнал, после перезапуска рассылка продолжается с места
+    остановки. Администратору периодически приходит отчет: скорость, ETA, ошибки.
+
+    Для AsyncTeleBot нужен loop - event loop бота: поток рассылки передает в него вызовы.
+    """
+
+    def __init__(self, bot, path: str, concurrency: int = 30, report_interval: float = 15.0,
+                 checkpoint_every: int = 100, loop: Optional[asyncio.AbstractEventLoop] = None):
+        if inspect.iscoroutinefunction(bot.send_message) and loop is None:
+            raise ValueError("event loop is required for an async bot")
+        self.bot = bot
+        self.concurrency = concurrency
+        self.report_interval = report_interval
+        self._journal = BroadcastJournal(path, checkpoint_every)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._loop = loop if inspect.iscoroutinefunction(bot.send_message) else None
+        self._status: Optional[Dict] = None
+
+    # ===== УПРАВЛЕНИЕ =====
+
+    def start(self, text: str, audience: str, admin_chat_id: int) -> bool:
+        """Запуск новой рассылки. False - уже идет другая."""
+        with self._lock:
+            if self.is_running():
+                return False
+            header = {
+                'text': text,
+                'audience': audience,
+                'admin_chat_id': admin_chat_id,
+                'started_at': datetime.now().isoformat()
+            }
+            self._journal.create(header)
+            self._launch(header, set(), {STATUS_SENT: 0, STATUS_BLOCKED: 0, STATUS_FAILED: 0})
+        logger.info(f"Broadcast started: audience={audience}")
+        return True
+
+    def resume(self) -> bool:
+        """Продолжить незавершенную рассылку из журнала. False - продолжать нечего."""
+        with self._lock:
+            if self.is_running():
+                return False
+            state = self._journal.load()
+            if state is None:
+                return False
+            header, done, counters = state
+            self._launch(header, done, counters)
+        logger.info(f"Broadcast resumed: {len(done)} recipients already processed")
+        return True
+
+    def stop(self) -> bool:
+        """Приостановить рассылку (продолжается через resume или после перезапуска)"""
+        if not self.is_running():
+            return False
+        self._stop.set()
+        return True
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def status(self) -> Optional[Dict]:
+        """Прогресс текущей или последней рассылки"""
+        with self._lock:
+            if self._status is None:
+                return None
+            status = dict(self._status)
+        elapsed = (status['finished_at'] or time.monotonic()) - status['started_at']
+        sent_now = status['processed'] - status['resumed_from']
+        rate = sent_now / elapsed if elapsed > 0 else 0.0
+        remaining = max(0, status['total'] - status['processed'])
+        status['rate'] = round(rate, 1)
+        status['eta_seconds'] = round(remaining / rate) if rate > 0 and status['running'] else None
+        return status
+
+    # ===== ВЫПОЛНЕНИЕ =====
+
+    def _launch(self, header: Dict, done: Set[int], counters: Dict[str, int]):
+        processed = len(done)
+        self._status = {
+            'audience': header['audience'],
+            'total': processed,  # уточняется в потоке рассылки
+            'processed': processed,
+            'resumed_from': processed,
+            'sent': counters[STATUS_SENT],
+            'blocked': counters[STATUS_BLOCKED],
+            'failed': counters[STATUS_FAILED],
+            'running': True,
+            'stopped': False,
+            'started_at': time.monotonic(),
+            'finished_at': None
+        }
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(header, done), name='broadcast', daemon=True)
+        self._thread.start()
+
+    def _call(self, method: str, *args, priority: int = PRIORITY_BULK, **kwargs):
+        """Вызов метода бота с приоритетом рассылки (для AsyncTeleBot - в его event loop)"""
+        func = getattr(self.bot, method)
+        if self._loop is None:
+            with send_priority(priority):
+                return func(*args, **kwargs)
+
+        async def call():
+            with send_priority(priority):
+                return await func(*args, **kwargs)
+        return asyncio.run_coroutine_threadsafe(call(), self._loop).result()
+
+    def _send(self, user_id: int, text: str) -> str:
+        try:
+            self._call('send_message', user_id, text)
+            return STATUS_SENT
+        except Exception as e:
+            if getattr(e, 'error_code', None) == 403:
+                return STATUS_BLOCKED
+            logger.debug(f"Broadcast to {user_id} failed: {e}")
+            return STATUS_FAILED
+
+    def _on_result(self, user_id: int, status: str):
+        with self._lock:
+            self._journal.record(user_id, status)
+            self._status['processed'] += 1
+            key = {STATUS_SENT: 'sent', STATUS_BLOCKED: 'blocked', STATUS_FAILED: 'failed'}[status]
+            self._status[key] += 1
+            if self._status['processed'] > self._status['total']:
+                self._status['total'] = self._status['processed']
+
+    def _run(self, header: Dict, done: Set[int]):
+        admin_chat_id = header['admin_chat_id']
+        total = count_recipients(header['audience'])
+        with self._lock:
+            self._status['total'] = max(total, self._status['processed'])
+        report = self._report(admin_chat_id, None)
+        last_report = time.monotonic()
+
+        # Без очереди отправки бот не ограничивает частоту - ограничиваем сами
+        bucket = None if getattr(self.bot, 'outbox', None) is not None else \
+            TokenBucket(SEND_RATE_GLOBAL, 1, time.monotonic())
+        in_flight = threading.Semaphore(self.concurrency)
+
+        def send(user_id: int):
+            try:
+                self._on_result(user_id, self._send(user_id, header['text']))
+            finally:
+                in_flight.release()
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='broadcast') as executor:
+                for user_id in iter_recipients(header['audience']):
+                    if self._stop.is_set():
+                        break
+                    if user_id in done:
+                        continue
+                    if bucket is not None:
+                        wait = bucket.wait_time(time.monotonic())
+                        while wait > 0:
+                            time.sleep(wait)
+                            wait = bucket.wait_time(time.monotonic())
+                        bucket.consume()
+                    in_flight.acquire()
+                    executor.submit(send, user_id)
+
+                    if time.monotonic() - last_report >= self.report_interval:
+                        report = self._report(admin_chat_id, report)
+                        last_report = time.monotonic()
+        except Exception as e:
+            logger.error(f"Broadcast interrupted: {e}")
+            self._stop.set()
+
+        with self._lock:
+            if self._stop.is_set():
+                self._journal.flush()
+                self._status['stopped'] = True
+            else:
+                self._journal.finish()
+            self._status['running'] = False
+            self._status['finished_at'] = time.monotonic()
+            status = dict(self._status)
+        logger.info(f"Broadcast {'stopped' if status['stopped'] else 'finished'}: "
+                    f"sent={status['sent']}, blocked={status['blocked']}, failed={status['failed']}")
+        self._report(admin_chat_id, report)
+
+    def _report(self, admin_chat_id: int, message_id: Optional[int]) -> Optional[int]:
+        """Отправить или обновить сообщение с прогрессом, вернуть его ID"""
+        from services.messages import get_broadcast_progress_text
+        text = get_broadcast_progress_text(self.status())
+        try:
+            if message_id is None:
+                message = self._call('send_message', admin_chat_id, text, parse_mode='Markdown',
+                                     priority=PRIORITY_DEFAULT)
+                return message.message_id
+            self._call('edit_message_text', text, chat_id=admin_chat_id, message_id=message_id,
+                       parse_mode='Markdown', priority=PRIORITY_DEFAULT)
+        except Exception as e:
+            logger.warning(f"Failed to report broadcast progress: {e}")
+        return message_id
+
+def get_broadcast_engine(bot, loop: Optional[asyncio.AbstractEventLoop] = None) -> BroadcastEngine:
+    """Движок рассылки бота (создается при первом обращении).
+
+    Для AsyncTeleBot первое обращение должно передать loop или выполняться в event loop бота.
+    """
+    engine = getattr(bot, 'broadcast_engine', None)
+    if engine is None:
+        if loop is None and inspect.iscoroutinefunction(bot.send_message):
+            loop = asyncio.get_running_loop()
+        engine = BroadcastEngine(bot, BROADCAST_FILE, BROADCAST_CONCURRENCY, BROADCAST_REPORT_INTERVAL,
+                                 loop=loop)
+        bot.broadcast_engine = engine
+    return engine
+
+def resume_broadcast(bot, loop: Optional[asyncio.AbstractEventLoop] = None) -> bool:
+    """Продолжить рассылку, прерванную перезапуском (вызывается при старте бота)"""
+    return get_broadcast_engine(bot, loop).resume()
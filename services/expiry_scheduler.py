@@ -0,0 +1,176 @@
+# services/expiry_scheduler.py - планировщик истечения подписок
+
+import heapq
+import threading
+import time
+from typing import Optional, Callable, Dict, List, Tuple
+from db.database import get_active_subscriptions, expire_subscriptions
+from db.models import Subscription
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+class ExpiryScheduler:
+    """Планировщик истечения подписок на min-heap по дате окончания.
+
+    Поток спит до ближайшей даты окончания, истекшие подписки помечаются
+    одной пакетной записью, а ID пользователей передаются в callback.
+    Подписки, активированные в другом процессе (webhook), подхватываются
+    периодической пересинхронизацией с хранилищем.
+
+    До start() расписание не ведется: в процессах без планировщика (webhook)
+    schedule/unschedule ничего не делают, иначе куча росла бы без разбора.
+    """
+
+    def __init__(self, resync_interval: float = 3600.0):
+        self.resync_interval = resync_interval
+        self._heap: List[Tuple[int, int]] = []
+        self._scheduled: Dict[int, int] = {}  # user_id -> актуальная дата окончания
+        # Изменения, сделанные пока resync читает хранилище (None - подписку убрали)
+        self._pending: Optional[Dict[int, Optional[int]]] = None
+        self._resync_lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = False
+        self._started = False
+        self._on_expired: Optional[Callable[[List[int]], None]] = None
+        self._last_resync = 0.0
+
+    def schedule(self, user_id: int, end_ts: int):
+        """Добавить или перенести подписку пользователя (end_ts - дата окончания в epoch)"""
+        with self._cond:
+            if not self._started:
+                return
+            if self._pending is not None:
+                self._pending[user_id] = end_ts
+            if self._scheduled.get(user_id) == end_ts:
+                return
+            self._scheduled[user_id] = end_ts
+            heapq.heappush(self._heap, (end_ts, user_id))
+            # Будим поток, только если новая дата раньше той, до которой он спит
+            if self._heap[0] == (end_ts, user_id):
+                self._cond.notify()
+
+    def unschedule(self, user_id: int):
+        """Убрать подписку из расписания (запись в куче удаляется лениво)"""
+        with self._cond:
+            if not self._started:
+                return
+            if self._pending is not None:
+                self._pending[user_id] = None
+            self._scheduled.pop(user_id, None)
+
+    def resync(self):
+        """Перестроить расписание по активным подпискам из хранилища.
+
+        Хранилище читается без блокировки; schedule/unschedule, вызванные во
+        время чтения, применяются поверх прочитанного снимка.
+        """
+        with self._resync_lock:
+            with self._cond:
+                self._pending = {}
+            try:
+                subscriptions = get_active_subscriptions()
+            except BaseException:
+                with self._cond:
+                    self._pending = None
+                raise
+            self._swap(subscriptions)
+        logger.info(f"Expiry scheduler: {len(subscriptions)} active subscriptions scheduled")
+
+    def _swap(self, subscriptions: List[Subscription]):
+        """Замена расписания снимком хранилища с изменениями, сделанными во время чтения"""
+        with self._cond:
+            scheduled = {sub.user_id: sub.end_ts for sub in subscriptions}
+            for user_id, end_ts in self._pending.items():
+                if end_ts is None:
+                    scheduled.pop(user_id, None)
+                else:
+                    scheduled[user_id] = end_ts
+            self._pending = None
+            self._scheduled = scheduled
+            self._heap = [(end_ts, user_id) for user_id, end_ts in self._scheduled.items()]
+            heapq.heapify(self._heap)
+            self._last_resync = time.time()
+            self._cond.notify()
+
+    def start(self, on_expired: Optional[Callable[[List[int]], None]] = None):
+        """Запуск фонового потока"""
+        self._on_expired = on_expired
+        with self._cond:
+            self._started = True
+            self._stop = False
+        self.resync()
+        self._thread = threading.Thread(target=self._run, name='expiry-scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stop = True
+            self._started = False
+            self._cond.notify()
+
+    def _pop_due(self) -> List[int]:
+        """Забрать из кучи все подписки, срок которых наступил (под блокировкой)"""
+        now = time.time()
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            end_ts, user_id = heapq.heappop(self._heap)
+            # Пропускаем устаревшие записи (подписку продлили или отменили)
+            if self._scheduled.get(user_id) == end_ts:
+                del self._scheduled[user_id]
+                due.append(user_id)
+        return due
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stop:
+                    due = self._pop_due()
+                    if due:
+                        break
+                    if time.time() - self._last_resync >= self.resync_interval:
+                        break
+                    next_ts = self._heap[0][0] if self._heap else float('inf')
+                    timeout = min(next_ts - time.time(), self.resync_interval)
+                    self._cond.wait(max(timeout, 0))
+                if self._stop:
+                    return
+
+            try:
+                if due:
+                    self._expire(due)
+                else:
+                    self.resync()
+            except Exception as e:
+                logger.error(f"Expiry scheduler error: {e}")
+
+    def _expire(self, user_ids: List[int]):
+        expired, extended = expire_subscriptions(user_ids)
+        # Подписку могли продлить в другом процессе - ставим заново
+        for subscription in extended:
+            self.schedule(subscription.user_id, subscription.end_ts)
+
+        if expired:
+            logger.info(f"Expired {len(expired)} subscriptions")
+            if self._on_expired:
+                self._on_expired(expired)
+
+# Глобальный экземпляр планировщика
+expiry_scheduler = ExpiryScheduler()
+
+# Вспомогательные функции
+def schedule_subscription(subscription: Subscription):
+    """Поставить активную подписку в расписание истечения"""
+    if subscription.status == 'active':
+        expiry_scheduler.schedule(subscription.user_id, subscription.end_ts)
+    else:
+        expiry_scheduler.unschedule(subscription.user_id)
+
+def unschedule_subscription(user_id: int):
+    """Убрать подписку из расписания истечения"""
+    expiry_scheduler.unschedule(user_id)
+
+def start_expiry_scheduler(on_expired: Optional[Callable[[List[int]], None]] = None):
+    """Запустить планировщик истечения подписок"""
+    expiry_scheduler.start(on_expired)
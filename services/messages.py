@@ -1,5 +1,7 @@
 # messages.py - текстовые сообщения бота
 
+from functools import lru_cache
+
 WELCOME_TEXT = """
 🌟 Добро пожаловать в наш магазин премиум-продуктов!
 
@@ -98,6 +100,46 @@ SUBSCRIPTION_PLANS_TEXT = """
 Выберите подходящий тариф:
 """
 
+SUBSCRIPTION_EXPIRED_TEXT = """
+⏰ **Срок вашей подписки истек**
+
+Доступ к сервису приостановлен.
+Чтобы продолжить пользоваться продуктом, оформите подписку заново:
+"""
+
+SUBSCRIPTION_DELETED_TEXT = """
+✅ **Подписка удалена**
+
+Ваша подписка была успешно отменена.
+Доступ к сервису прекращен.
+"""
+
+SUBSCRIPTION_DELETE_ERROR_TEXT = """
+❌ **Ошибка удаления**
+
+Не удалось удалить подписку.
+Возможно, у вас нет активной подписки.
+"""
+
+@lru_cache(maxsize=64)
+def get_delete_warning_text(plan_name, price):
+    """Текст подтверждения удаления подписки (по одному на тариф, собирается один раз)"""
+    return f"""
+⚠️ **Внимание! Удаление подписки**
+
+Вы собираетесь удалить подписку:
+**{plan_name}** ({price}₽/месяц)
+
+После удаления:
+• Подписка станет недоступной
+• Доступ к сервису прекратится
+• Средства не возвращаются
+
+Это действие нельзя отменить!
+"""
+
+# Тексты оплаты зависят только от тарифа - собираются один раз на тариф
+@lru_cache(maxsize=64)
 def get_payment_text(plan_name, price, description):
     return f"""
 💳 **Оплата подписки**
@@ -109,6 +151,7 @@ def get_payment_text(plan_name, price, description):
 Нажмите кнопку ниже для оплаты:
 """
 
+@lru_cache(maxsize=64)
 def get_success_text(plan):
     return f"""
 ✅ **Оплата успешно обработана!**
@@ -121,6 +164,8 @@ def get_success_text(plan):
 Если у вас возникнут вопросы, обращайтесь в поддержку.
 """
 
+PAYMENT_UNAVAILABLE_TEXT = "⏳ Платежный сервис временно недоступен. Попробуйте еще раз через пару минут."
+
 def get_payment_error_text(error_message):
     """Текст сообщения об ошибке платежа"""
     return f"""
@@ -136,3 +181,98 @@ def get_payment_error_text(error_message):
 
 Если проблема persists, обращайтесь в нашу поддержку.
 """
+
+def get_stats_text(stats):
+    """Текст статистики для администратора"""
+    payments_by_status = stats.get('payments_by_status', {})
+    revenue_by_plan = stats.get('revenue_by_plan', {})
+
+    statuses = "\n".join(f"• {status}: {count}" for status, count in sorted(payments_by_status.items())) or "• нет платежей"
+    revenue = "\n".join(f"• {plan}: {amount:g}₽" for plan, amount in sorted(revenue_by_plan.items())) or "• нет выручки"
+
+    return f"""
+📊 **Статистика**
+
+**Пользователей:** {stats['total_users']}
+**Активных подписок:** {stats['active_subscriptions']}
+**Всего платежей:** {stats['total_payments']}
+
+**Платежи по статусам:**
+{statuses}
+
+**Выручка по тарифам:**
+{revenue}
+**Итого:** {sum(revenue_by_plan.values()):g}₽
+"""
+
+def get_callback_stats_text(route_stats):
+    """Текст статистики кнопок (вызовы и задержка обработчиков по маршрутам)"""
+    used = {action: stats for action, stats in route_stats.items() if stats['calls']}
+    if not used:
+        return "\n**Кнопки:** нажатий еще не было\n"
+    lines = "\n".join(
+        f"• `{action}`: {stats['calls']} (ошибок {stats['errors']}, "
+        f"ср. {stats['avg_ms']:.1f} мс, макс. {stats['max_ms']:.1f} мс)"
+        for action, stats in sorted(used.items(), key=lambda item: -item[1]['calls']))
+    return f"\n**Кнопки:**\n{lines}\n"
+
+def get_workers_stats_text(shards):
+    """Текст состояния обработчиков обновлений (шарды по chat_id)"""
+    depth = sum(shard['depth'] for shard in shards)
+    max_lag = max((shard['max_lag_ms'] for shard in shards), default=0)
+    busiest = max(shards, key=lambda shard: shard['depth'], default=None)
+    text = f"\n**Обработка обновлений:** очередь {depth}, макс. задержка {max_lag:.0f} мс"
+    if busiest and busiest['depth']:
+        text += f"\n• самый загруженный шард {busiest['shard']}: очередь {busiest['depth']}, задержка {busiest['last_lag_ms']:.0f} мс"
+    return text + "\n"
+
+def get_outbox_stats_text(stats):
+    """Текст состояния очереди исходящих сообщений"""
+    text = (f"\n**Очередь отправки:** в очереди {stats['queued']}, отправлено {stats['sent']}, "
+            f"повторов после 429: {stats['retried']}, ошибок {stats['failed']}")
+    for priority, wait in stats['wait_by_priority'].items():
+        text += f"\n• приоритет {priority}: ожидание {wait['avg_ms']:.0f} мс (макс. {wait['max_ms']:.0f} мс)"
+    return text + "\n"
+
+BROADCAST_USAGE_TEXT = """
+Использование:
+/broadcast <получатели> <текст> - запустить рассылку
+/broadcast status - прогресс рассылки
+/broadcast stop - приостановить
+/broadcast resume - продолжить
+
+Получатели: all (все), active (с подпиской), inactive (без подписки), expired (подписка истекла), basic/premium/vip (тариф)
+"""
+
+BROADCAST_BUSY_TEXT = "Рассылка уже идет. Прогресс: /broadcast status"
+BROADCAST_NOT_FOUND_TEXT = "Нет незавершенной рассылки"
+BROADCAST_STOPPING_TEXT = "⏸ Рассылка приостанавливается. Продолжить: /broadcast resume"
+
+def _format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours} ч {minutes} мин" if hours else f"{minutes} мин {seconds} с"
+
+def get_broadcast_progress_text(status):
+    """Текст прогресса рассылки: отправлено, ошибки, скорость, оставшееся время"""
+    if status['running']:
+        title = "📣 **Рассылка идет**"
+    elif status['stopped']:
+        title = "⏸ **Рассылка приостановлена**"
+    else:
+        title = "✅ **Рассылка завершена**"
+
+    percent = status['processed'] * 100 // status['total'] if status['total'] else 100
+    text = f"""
+{title}
+
+**Получатели:** {status['audience']}
+**Обработано:** {status['processed']} из {status['total']} ({percent}%)
+**Доставлено:** {status['sent']}
+**Заблокировали бота:** {status['blocked']}
+**Ошибки:** {status['failed']}
+**Скорость:** {status['rate']:g} сообщ./с
+"""
+    if status['eta_seconds'] is not None:
+        text += f"**Осталось:** ~{_format_duration(status['eta_seconds'])}\n"
+    return text
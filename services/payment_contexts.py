@@ -0,0 +1,128 @@
+# services/payment_contexts.py - контекст неоплаченных платежей в общем хранилище
+
+import threading
+import time
+from typing import Optional, Dict
+from db.database import get_storage
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+class PaymentContextStore:
+    """Чат, сообщение и тариф неоплаченного платежа по payment_id.
+
+    Записи лежат в таблице payment_contexts общего хранилища, поэтому webhook
+    сервер видит платежи, созданные ботом, и правит исходное сообщение.
+    Запись живет ttl секунд с последнего обновления; при превышении max_size
+    удаляются записи, которые дольше всех не обновлялись. Истекшие записи
+    вычищаются не чаще раза в purge_interval секунд.
+
+    Размер таблицы отслеживается счетчиком этого процесса (записи добавляют и
+    бот, и webhook сервер), счетчик сверяется с хранилищем при каждой очистке.
+    Истекшие и самые старые записи выбираются по возрастанию expires_at -
+    началом индекса, без прохода по всей таблице.
+    """
+
+    TABLE = 'payment_contexts'
+
+    def __init__(self, ttl: float = 86400.0, max_size: int = 10000, purge_interval: float = 60.0):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.purge_interval = purge_interval
+        self._next_purge = 0.0
+        self._size: Optional[int] = None  # None - еще не считали
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'expired': 0, 'evicted': 0}
+
+    def _count(self, name: str, value: int = 1):
+        with self._lock:
+            self._stats[name] += value
+
+    def put(self, payment_id: str, user_id: int, plan: str, chat_id: int, message_id: Optional[int],
+            yookassa_id: Optional[str] = None):
+        """Сохранение контекста нового платежа"""
+        now = time.time()
+        storage = get_storage()
+        storage.put(self.TABLE, payment_id, {
+            'payment_id': payment_id,
+            'user_id': user_id,
+            'plan': plan,
+            'chat_id': chat_id,
+            'message_id': message_id,
+            'yookassa_id': yookassa_id,
+            'expires_at': now + self.ttl
+        })
+        with self._lock:
+            self._size = storage.count(self.TABLE) if self._size is None else self._size + 1
+            excess = self._size - self.max_size
+        if now >= self._next_purge:
+            self.purge(now)
+        elif excess > 0:
+            self._evict(excess)
+
+    def get(self, payment_id: str) -> Optional[Dict]:
+        """Контекст платежа или None (нет записи или срок истек)"""
+        context = get_storage().get(self.TABLE, payment_id)
+        if context is not None and context['expires_at'] <= time.time():
+            if get_storage().delete(self.TABLE, payment_id):
+                self._count('expired')
+                self._resize(-1)
+            context = None
+        self._count('hits' if context is not None else 'misses')
+        return context
+
+    def touch(self, payment_id: str, chat_id: int, message_id: Optional[int]) -> bool:
+        """Ссылка показана в другом сообщении: запоминаем его и продлеваем срок"""
+        return get_storage().update(self.TABLE, payment_id, {
+            'chat_id': chat_id,
+            'message_id': message_id,
+            'expires_at': time.time() + self.ttl
+        })
+
+    def discard(self, payment_id: str):
+        """Удаление контекста (платеж оплачен или отклонен)"""
+        if get_storage().delete(self.TABLE, payment_id):
+            self._resize(-1)
+
+    def _resize(self, delta: int):
+        with self._lock:
+            if self._size is not None:
+                self._size = max(0, self._size + delta)
+
+    def _evict(self, excess: int) -> int:
+        """Удаление excess записей, которые дольше всех не обновлялись"""
+        storage = get_storage()
+        victims = [context['payment_id'] for context in storage.ordered(self.TABLE, 'expires_at', limit=excess)]
+        if not victims:
+            return 0
+        storage.delete_many(self.TABLE, victims)
+        self._count('evicted', len(victims))
+        self._resize(-len(victims))
+        return len(victims)
+
+    def purge(self, now: Optional[float] = None) -> int:
+        """Удаление истекших записей и самых старых сверх max_size. Возвращает количество удаленных."""
+        now = time.time() if now is None else now
+        self._next_purge = now + self.purge_interval
+        storage = get_storage()
+
+        expired = [context['payment_id'] for context in storage.ordered(self.TABLE, 'expires_at', below=now)]
+        if expired:
+            storage.delete_many(self.TABLE, expired)
+            self._count('expired', len(expired))
+
+        # Сверяем счетчик с хранилищем: записи добавляют и удаляют и другие процессы
+        size = storage.count(self.TABLE)
+        with self._lock:
+            self._size = size
+        evicted = self._evict(size - self.max_size) if size > self.max_size else 0
+
+        if expired or evicted:
+            logger.info(f"Payment contexts purged: {len(expired)} expired, {evicted} evicted")
+        return len(expired) + evicted
+
+    def stats(self) -> Dict:
+        """Счетчики этого процесса и текущее количество записей в хранилище"""
+        with self._lock:
+            stats = dict(self._stats)
+        return {**stats, 'entries': get_storage().count(self.TABLE), 'max_size': self.max_size}
@@ -0,0 +1,184 @@
+# services/payment_gateway.py - клиент YooKassa: пул соединений, таймауты, circuit breaker
+
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional, Callable, Dict
+import requests
+from requests.adapters import HTTPAdapter
+from yookassa.client import ApiClient
+from yookassa.domain.response import PaymentResponse
+from config import (YOOKASSA_SHOP_ID, YOOKASSA_SECRET_KEY, YOOKASSA_API_URL, YOOKASSA_CONNECT_TIMEOUT,
+                    YOOKASSA_READ_TIMEOUT, YOOKASSA_POOL_SIZE, YOOKASSA_ATTEMPTS, YOOKASSA_BREAKER_THRESHOLD,
+                    YOOKASSA_BREAKER_RESET, PAYMENT_WORKERS)
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+class PaymentGatewayError(Exception):
+    """Ошибка запроса к YooKassa (ответ 4xx - повтор не поможет)"""
+
+class PaymentGatewayUnavailable(PaymentGatewayError):
+    """YooKassa недоступна: таймаут, ошибка соединения, 5xx или открытый circuit breaker"""
+
+# ===== CIRCUIT BREAKER =====
+
+class CircuitBreaker:
+    """Circuit breaker: после failure_threshold сбоев подряд запросы сразу отклоняются.
+
+    Через reset_timeout секунд пропускается один пробный запрос (half-open):
+    успех закрывает цепь, сбой снова открывает ее на reset_timeout.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Можно ли выполнить запрос сейчас"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self._state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info("YooKassa circuit closed")
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.warning(f"YooKassa circuit opened after {self._failures} failures")
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+# ===== КЛИЕНТ =====
+
+class YooKassaGateway:
+    """Запросы к YooKassa API через общую сессию requests.
+
+    В отличие от SDK (новая сессия и соединение на каждый запрос, без
+    таймаутов) соединения переиспользуются (keep-alive пул), у каждого запроса
+    есть таймауты на соединение и чтение, а при недоступности YooKassa
+    circuit breaker сразу возвращает ошибку, не занимая потоки. Создание
+    платежа идет с ключом идемпотентности, поэтому повтор после таймаута не
+    создает второй платеж. Запросы можно выполнять в собственном пуле потоков
+    (submit), чтобы не блокировать обработку обновлений.
+    """
+
+    def __init__(self, shop_id: str, secret_key: str, api_url: str = 'https://api.yookassa.ru/v3',
+                 connect_timeout: float = 3.0, read_timeout: float = 10.0, pool_size: int = 10,
+                 workers: int = 8, attempts: int = 2, breaker: Optional[CircuitBreaker] = None):
+        self.api_url = api_url.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.attempts = max(1, attempts)
+        self.breaker = breaker or CircuitBreaker()
+        self._auth = ApiClient.basic_auth(shop_id, secret_key)
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self._session.mount('https://', adapter)
+        self._session.mount('http://', adapter)  # локальный тестовый сервер
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='payments')
+
+    def submit(self, func: Callable, *args, **kwargs) -> Future:
+        """Выполнить func в пуле платежных потоков"""
+        return self._executor.submit(func, *args, **kwargs)
+
+    def _request(self, method: str, path: str, body: Optional[Dict] = None,
+                 idempotence_key: Optional[str] = None) -> Dict:
+        if not self.breaker.allow():
+            raise PaymentGatewayUnavailable("YooKassa circuit is open")
+
+        headers = {'Authorization': self._auth, 'Content-Type': 'application/json'}
+        if idempotence_key:
+            headers['Idempotence-Key'] = idempotence_key
+
+        last_error: Optional[Exception] = None
+        # Повтор имеет смысл только с ключом идемпотентности (или для чтения)
+        attempts = self.attempts if idempotence_key or method == 'GET' else 1
+        recorded = False
+        try:
+            for _ in range(attempts):
+                try:
+                    response = self._session.request(method, self.api_url + path, json=body,
+                                                     headers=headers, timeout=self.timeout)
+                except requests.RequestException as e:
+                    last_error = e
+                    continue
+                if response.status_code >= 500:
+                    last_error = PaymentGatewayUnavailable(f"YooKassa {response.status_code}: {response.text[:200]}")
+                    continue
+                # Ответ получен - сервис доступен, даже если запрос отклонен
+                self.breaker.record_success()
+                recorded = True
+                if response.status_code != 200:
+                    raise PaymentGatewayError(f"YooKassa {response.status_code}: {response.text[:200]}")
+                return response.json()
+
+            self.breaker.record_failure()
+            recorded = True
+        finally:
+            if not recorded:
+                # Неожиданное исключение - тоже сбой: иначе пробный запрос half-open не завершится
+                # и circuit breaker будет отклонять все запросы
+                self.breaker.record_failure()
+
+        logger.error(f"YooKassa {method} {path} failed: {last_error}")
+        raise PaymentGatewayUnavailable(str(last_error))
+
+    def create_payment(self, params: Dict, idempotence_key: str) -> PaymentResponse:
+        """Создание платежа (ключ идемпотентности - наш payment_id)"""
+        return PaymentResponse(self._request('POST', '/payments', params, idempotence_key))
+
+    def get_payment(self, yookassa_id: str) -> PaymentResponse:
+        """Платеж по ID YooKassa"""
+        return PaymentResponse(self._request('GET', f'/payments/{yookassa_id}'))
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self._session.close()
+
+_gateway: Optional[YooKassaGateway] = None
+_gateway_lock = threading.Lock()
+
+def get_payment_gateway() -> YooKassaGateway:
+    """Глобальный клиент YooKassa (создается при первом обращении по настройкам из config)"""
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = YooKassaGateway(
+                    YOOKASSA_SHOP_ID, YOOKASSA_SECRET_KEY, YOOKASSA_API_URL,
+                    connect_timeout=YOOKASSA_CONNECT_TIMEOUT, read_timeout=YOOKASSA_READ_TIMEOUT,
+                    pool_size=YOOKASSA_POOL_SIZE, workers=PAYMENT_WORKERS, attempts=YOOKASSA_ATTEMPTS,
+                    breaker=CircuitBreaker(YOOKASSA_BREAKER_THRESHOLD, YOOKASSA_BREAKER_RESET))
+    return _gateway
@@ -1,206 +1,322 @@
 # services/payment_service.py - бизнес-логика для обработки платежей
 
+import time
 import uuid
-from datetime import datetime
-from typing import Optional, Tuple
-import yookassa
-from yookassa import Payment
-from config import YOOKASSA_SHOP_ID, YOOKASSA_SECRET_KEY, PLANS
+from concurrent.futures import Future
+from typing import Optional, Tuple, Dict
+from config import PLANS, PENDING_PAYMENT_TTL, PAYMENT_CONTEXT_TTL, PAYMENT_CONTEXT_MAX
 from keyboards.inline_keyboards import get_payment_keyboard, get_success_keyboard, get_main_menu_keyboard
-from services.messages import get_payment_text, get_success_text, get_payment_error_text
+from services.messages import get_payment_text, get_success_text, get_payment_error_text, PAYMENT_UNAVAILABLE_TEXT
+from services.payment_contexts import PaymentContextStore
+from services.payment_gateway import get_payment_gateway, PaymentGatewayUnavailable
+from services.pending_payments import PendingPaymentCache
 from services.subscription_service import activate_subscription
-from db.database import save_payment, get_payment, update_payment_status
+from db.database import save_payment, get_payment, update_payment_status, get_payment_by_yookassa_id, transaction
 from db.models import Payment as PaymentModel
+from utils.async_runtime import run_blocking
+from utils.delayed_actions import edit_message_later
+from utils.outbox import send_priority, PRIORITY_PAYMENT
 from utils.logger import get_logger
 
-# Настройка YooKassa
-yookassa.Configuration.configure(YOOKASSA_SHOP_ID, YOOKASSA_SECRET_KEY)
+# Чат и сообщение неоплаченных платежей - в хранилище, общем с webhook сервером
+payment_contexts = PaymentContextStore(ttl=PAYMENT_CONTEXT_TTL, max_size=PAYMENT_CONTEXT_MAX)
 
-# Хранение активных платежей (в реальном приложении использовать БД)
-active_payments = {}
+# Неоплаченные ссылки по (user_id, plan) - повторное нажатие не создает новый платеж
+pending_payments = PendingPaymentCache(ttl=PENDING_PAYMENT_TTL)
 
 logger = get_logger(__name__)
 
-def create_payment(bot, call, plan: str) -> Optional[str]:
-    """Создание платежа через YooKassa. Возвращает payment_id или None при ошибке."""
+def start_payment(user_id: int, chat_id: int, message_id: int, plan: str,
+                  chat_username: Optional[str] = None) -> Tuple[str, str]:
+    """Создание платежа в YooKassa и запись в БД (блокирующие вызовы, без обращений к боту).
+
+    Возвращает (payment_id, confirmation_url).
+    """
+    plan_info = PLANS[plan]
+    payment_id = str(uuid.uuid4())
+
+    # Создаем платеж через YooKassa (повтор с тем же ключом не создаст второй платеж)
+    yookassa_payment = get_payment_gateway().create_payment({
+        "amount": {
+            "value": str(plan_info['price']),
+            "currency": "RUB"
+        },
+        "confirmation": {
+            "type": "redirect",
+            "return_url": "https://t.me/" + str(chat_username) if chat_username else "https://telegram.org"
+        },
+        "capture": True,
+        "description": f"Оплата подписки: {plan_info['name']}",
+        "metadata": {
+            "payment_id": payment_id,
+            "user_id": user_id,
+            "plan": plan,
+            "chat_id": chat_id,
+            "message_id": message_id
+        }
+    }, idempotence_key=payment_id)
+
+    # Сохраняем информацию о платеже в БД
+    payment = PaymentModel(
+        payment_id=payment_id,
+        user_id=user_id,
+        plan=plan,
+        amount=plan_info['price'],
+        status='pending',
+        yookassa_id=yookassa_payment.id
+    )
+    save_payment(payment)
+
+    # Запоминаем сообщение со ссылкой, чтобы после оплаты отредактировать его
+    payment_contexts.put(payment_id, user_id, plan, chat_id, message_id, yookassa_payment.id)
+
+    logger.info(f"Payment {payment_id} created for user {user_id}, plan {plan}")
+    return payment_id, yookassa_payment.confirmation.confirmation_url
+
+def _is_pending(payment_id: str) -> bool:
+    payment = get_payment(payment_id)
+    return payment is not None and payment.status == 'pending'
+
+def get_or_start_payment(user_id: int, chat_id: int, message_id: int, plan: str,
+                         chat_username: Optional[str] = None) -> Tuple[str, str]:
+    """Ссылка на оплату тарифа: неоплаченный платеж пользователя по этому тарифу или новый.
+
+    Одновременные нажатия объединяются - в YooKassa уходит один запрос.
+    """
+    (payment_id, payment_url), created = pending_payments.get_or_create(
+        user_id, plan,
+        lambda: start_payment(user_id, chat_id, message_id, plan, chat_username),
+        is_valid=_is_pending)
+
+    if not created:
+        logger.info(f"Reusing pending payment {payment_id} for user {user_id}, plan {plan}")
+        # Ссылка показана в новом сообщении - после оплаты правим его
+        payment_contexts.touch(payment_id, chat_id, message_id)
+    return payment_id, payment_url
+
+def submit_payment(user_id: int, chat_id: int, message_id: int, plan: str,
+                   chat_username: Optional[str] = None) -> Future:
+    """get_or_start_payment в пуле платежных потоков. Future с (payment_id, confirmation_url)."""
+    return get_payment_gateway().submit(get_or_start_payment, user_id, chat_id, message_id, plan, chat_username)
+
+def create_payment(bot, call, plan: str) -> Optional[Future]:
+    """Создание платежа через YooKassa в пуле платежных потоков - обработчик не ждет ответа.
+
+    Возвращает Future с payment_id (None при ошибке) или None для неверного плана.
+    """
 
     if plan not in PLANS:
         bot.answer_callback_query(call.id, "Неверный план подписки")
         return None
 
+    return get_payment_gateway().submit(_create_payment, bot, call, plan)
+
+def _create_payment(bot, call, plan: str) -> Optional[str]:
     plan_info = PLANS[plan]
-    payment_id = str(uuid.uuid4())
 
     try:
-        # Создаем платеж через YooKassa
-        yookassa_payment = Payment.create({
-            "amount": {
-                "value": str(plan_info['price']),
-                "currency": "RUB"
-            },
-            "confirmation": {
-                "type": "redirect",
-                "return_url": "https://t.me/" + str(call.message.chat.username) if call.message.chat.username else "https://telegram.org"
-            },
-            "capture": True,
-            "description": f"Оплата подписки: {plan_info['name']}",
-            "metadata": {
-                "payment_id": payment_id,
-                "user_id": call.from_user.id,
-                "plan": plan,
-                "chat_id": call.message.chat.id,
-                "message_id": call.message.message_id
-            }
-        })
-
-        # Сохраняем информацию о платеже в БД
-        payment = PaymentModel(
-            payment_id=payment_id,
-            user_id=call.from_user.id,
-            plan=plan,
-            amount=plan_info['price'],
-            status='pending',
-            yookassa_id=yookassa_payment.id
-        )
-        save_payment(payment)
-
-        # Сохраняем информацию о активном платеже для быстрого доступа
-        active_payments[payment_id] = {
-            "user_id": call.from_user.id,
-            "plan": plan,
-            "chat_id": call.message.chat.id,
-            "message_id": call.message.message_id,
-            "yookassa_id": yookassa_payment.id
-        }
+        payment_id, payment_url = get_or_start_payment(call.from_user.id, call.message.chat.id,
+                                                       call.message.message_id, plan, call.message.chat.username)
 
-        payment_url = yookassa_payment.confirmation.confirmation_url
         payment_text = get_payment_text(plan_info['name'], plan_info['price'], plan_info['description'])
-
         markup = get_payment_keyboard(payment_url)
 
-        import time
-        time.sleep(1)  # Задержка 1 секунда
-        bot.edit_message_text(chat_id=call.message.chat.id,
-                            message_id=call.message.message_id,
-                            text=payment_text,
-                            parse_mode='Markdown',
-                            reply_markup=markup)
-
-        logger.info(f"Payment {payment_id} created for user {call.from_user.id}, plan {plan}")
+        bot.answer_callback_query(call.id)
+        edit_message_later(bot, call.message.chat.id, call.message.message_id, payment_text,
+                           parse_mode='Markdown', reply_markup=markup)
         return payment_id
 
+    except PaymentGatewayUnavailable as e:
+        logger.error(f"Payment creation failed, YooKassa unavailable: {e}")
+        bot.answer_callback_query(call.id, PAYMENT_UNAVAILABLE_TEXT, show_alert=True)
+        return None
     except Exception as e:
         logger.error(f"Payment creation error: {e}")
         bot.answer_callback_query(call.id, f"Ошибка создания платежа: {str(e)}")
         return None
 
-def process_payment_success(bot, payment_id: str) -> bool:
-    """Обработка успешного платежа. Возвращает True при успехе."""
+def confirm_payment(payment_id: str) -> Optional[Dict]:
+    """Подтверждение платежа и активация подписки (без обращений к боту).
 
-    # Сначала проверяем активные платежи
-    payment_info = active_payments.get(payment_id)
+    Возвращает данные для уведомления (user_id, plan, chat_id, message_id)
+    или None, если платеж не найден или не может быть подтвержден.
+    """
 
-    # Если не нашли в активных, ищем в базе данных
-    if not payment_info:
-        payment = get_payment(payment_id)
-        if payment and payment.status == 'pending':
-            # Создаем информацию о платеже для обработки
-            payment_info = {
-                'user_id': payment.user_id,
-                'plan': payment.plan,
-                'chat_id': payment.user_id,  # Используем user_id как chat_id для простоты
-                'message_id': None  # Не можем определить message_id из БД
-            }
-        else:
-            logger.warning(f"Payment {payment_id} not found in active payments or database")
-            return False
+    # Сначала проверяем контекст неоплаченных платежей
+    payment_info = payment_contexts.get(payment_id)
 
-    # Обновляем статус платежа в БД
-    confirmed_at = datetime.now().isoformat()
-    if not update_payment_status(payment_id, 'succeeded', confirmed_at):
-        logger.error(f"Failed to update payment {payment_id} status")
+    # Статус платежа и подписку меняем одной транзакцией: либо оба изменения, либо ни одного
+    try:
+        with transaction():
+            payment = get_payment(payment_id)
+            if not payment:
+                logger.warning(f"Payment {payment_id} not found in payment contexts or database")
+                return None
+
+            if not payment_info:
+                # Создаем информацию о платеже для обработки
+                payment_info = {
+                    'user_id': payment.user_id,
+                    'plan': payment.plan,
+                    'chat_id': payment.user_id,  # Используем user_id как chat_id для простоты
+                    'message_id': None  # Не можем определить message_id из БД
+                }
+
+            if payment.status == 'pending':
+                # Обновляем статус платежа в БД и активируем подписку
+                confirmed_at = int(time.time())
+                update_payment_status(payment_id, 'succeeded', confirmed_at)
+                activate_subscription(payment_info['user_id'], payment_info['plan'], payment_id)
+                pending_payments.invalidate(payment_info['user_id'], payment_info['plan'], payment_id)
+                logger.info(f"Subscription activated for user {payment_info['user_id']}, plan {payment_info['plan']}")
+            elif payment.status != 'succeeded':
+                logger.warning(f"Payment {payment_id} has status {payment.status}, cannot confirm")
+                return None
+            # Уже подтвержденный платеж (например, через webhook) - только уведомляем
+    except Exception as e:
+        logger.error(f"Error confirming payment {payment_id}: {e}")
+        return None
+
+    return payment_info
+
+def process_payment_success(bot, payment_id: str) -> bool:
+    """Обработка успешного платежа. Возвращает True при успехе."""
+
+    payment_info = confirm_payment(payment_id)
+    if payment_info is None:
         return False
 
     plan = payment_info['plan']
     success_text = get_success_text(plan)
     markup = get_success_keyboard()
 
+    # Подтверждение оплаты уходит раньше правок меню и рассылок. Бот обработчиков (SalesBot)
+    # не ждет очередь отправки - поток ChatOrderedExecutor не занят, ошибка пишется в лог
+    nowait = hasattr(bot, 'send_message_nowait')
     try:
-        if payment_info.get('message_id'):
-            # Если есть message_id, редактируем сообщение
-            bot.edit_message_text(chat_id=payment_info['chat_id'],
-                                message_id=payment_info['message_id'],
-                                text=success_text,
-                                parse_mode='Markdown',
-                                reply_markup=markup)
-        else:
-            # Если нет message_id, отправляем новое сообщение
-            bot.send_message(chat_id=payment_info['chat_id'],
-                           text=success_text,
-                           parse_mode='Markdown',
-                           reply_markup=markup)
+        with send_priority(PRIORITY_PAYMENT):
+            if payment_info.get('message_id'):
+                # Если есть message_id, редактируем сообщение
+                edit = bot.edit_message_text_nowait if nowait else bot.edit_message_text
+                edit(chat_id=payment_info['chat_id'],
+                     message_id=payment_info['message_id'],
+                     text=success_text,
+                     parse_mode='Markdown',
+                     reply_markup=markup)
+            else:
+                # Если нет message_id, отправляем новое сообщение
+                send = bot.send_message_nowait if nowait else bot.send_message
+                send(chat_id=payment_info['chat_id'],
+                     text=success_text,
+                     parse_mode='Markdown',
+                     reply_markup=markup)
     except Exception as e:
         logger.error(f"Error sending payment success message: {e}")
 
-    # Активируем подписку
+    # Сообщение уже отредактировано - контекст больше не нужен
+    payment_contexts.discard(payment_id)
+
+    return True
+
+async def process_payment_success_async(bot, payment_id: str) -> bool:
+    """Обработка успешного платежа для AsyncTeleBot: подтверждение выполняется в пуле потоков"""
+
+    payment_info = await run_blocking(confirm_payment, payment_id)
+    if payment_info is None:
+        return False
+
+    success_text = get_success_text(payment_info['plan'])
+    markup = get_success_keyboard()
+
     try:
-        activate_subscription(payment_info['user_id'], plan, payment_id)
-        logger.info(f"Subscription activated for user {payment_info['user_id']}, plan {plan}")
+        with send_priority(PRIORITY_PAYMENT):
+            if payment_info.get('message_id'):
+                await bot.edit_message_text(chat_id=payment_info['chat_id'],
+                                            message_id=payment_info['message_id'],
+                                            text=success_text,
+                                            parse_mode='Markdown',
+                                            reply_markup=markup)
+            else:
+                await bot.send_message(chat_id=payment_info['chat_id'],
+                                       text=success_text,
+                                       parse_mode='Markdown',
+                                       reply_markup=markup)
     except Exception as e:
-        logger.error(f"Error activating subscription: {e}")
+        logger.error(f"Error sending payment success message: {e}")
 
-    # Удаляем из активных платежей, если он там был
-    if payment_id in active_payments:
-        del active_payments[payment_id]
+    payment_contexts.discard(payment_id)
 
     return True
 
 def process_payment_error(bot, payment_id: str, error_message: str = None) -> bool:
     """Обработка ошибки платежа. Возвращает True при успехе."""
 
-    payment_info = active_payments.get(payment_id)
+    payment_info = payment_contexts.get(payment_id)
     if not payment_info:
-        logger.warning(f"Payment {payment_id} not found in active payments")
+        logger.warning(f"Payment {payment_id} not found in payment contexts")
         return False
 
     # Обновляем статус платежа в БД
     if not update_payment_status(payment_id, 'failed'):
         logger.error(f"Failed to update payment {payment_id} status")
         return False
+    pending_payments.invalidate(payment_info['user_id'], payment_info['plan'], payment_id)
 
     error_text = get_payment_error_text(error_message or "Неизвестная ошибка")
     markup = get_main_menu_keyboard()
 
     try:
-        bot.edit_message_text(chat_id=payment_info['chat_id'],
-                            message_id=payment_info['message_id'],
-                            text=error_text,
-                            parse_mode='Markdown',
-                            reply_markup=markup)
+        with send_priority(PRIORITY_PAYMENT):
+            bot.edit_message_text(chat_id=payment_info['chat_id'],
+                                message_id=payment_info['message_id'],
+                                text=error_text,
+                                parse_mode='Markdown',
+                                reply_markup=markup)
     except Exception as e:
         logger.error(f"Error updating payment error message: {e}")
 
-    # Удаляем из активных платежей
-    del active_payments[payment_id]
+    payment_contexts.discard(payment_id)
 
     return True
 
 def check_payment_status(payment_id: str) -> Optional[str]:
-    """Проверка статуса платежа в YooKassa"""
+    """Проверка статуса платежа в YooKassa по нашему payment_id"""
+
+    # YooKassa знает платеж по своему ID, а не по нашему payment_id
+    payment_record = get_payment(payment_id)
+    if not payment_record or not payment_record.yookassa_id:
+        logger.warning(f"Payment {payment_id} has no YooKassa ID")
+        return None
 
     try:
-        payment = Payment.find_one(payment_id)
+        payment = get_payment_gateway().get_payment(payment_record.yookassa_id)
         return payment.status
     except Exception as e:
         logger.error(f"Error checking payment status: {e}")
         return None
 
+def resolve_webhook_payment_id(payment_data: dict) -> Optional[str]:
+    """Определение нашего payment_id по webhook уведомлению.
+
+    Сначала берем metadata.payment_id, а если его нет - ищем платеж
+    по индексу YooKassa ID (object.id).
+    """
+    object_data = payment_data.get('object', {})
+    metadata = object_data.get('metadata') or payment_data.get('metadata', {})
+    payment_id = metadata.get('payment_id')
+    if payment_id:
+        return payment_id
+
+    payment = get_payment_by_yookassa_id(object_data.get('id'))
+    if payment:
+        return payment.payment_id
+    return None
+
 def process_webhook_payment_succeeded(payment_data: dict) -> bool:
     """Обработка webhook уведомления об успешном платеже"""
 
     try:
-        metadata = payment_data.get('metadata', {})
-        payment_id = metadata.get('payment_id')
+        payment_id = resolve_webhook_payment_id(payment_data)
 
         if not payment_id:
             logger.error("No payment_id in webhook metadata")
@@ -212,26 +328,28 @@ def process_webhook_payment_succeeded(payment_data: dict) -> bool:
             logger.warning(f"Unexpected event: {event}, expected payment.succeeded")
             return False
 
-        # Получаем информацию о платеже из нашей БД
-        payment = get_payment(payment_id)
-        if not payment:
-            logger.error(f"Payment {payment_id} not found in database")
-            return False
-
-        # Если платеж еще не обработан
-        if payment.status == 'pending':
-            # Обновляем статус платежа
-            confirmed_at = datetime.now().isoformat()
-            update_payment_status(payment_id, 'succeeded', confirmed_at)
-
-            # Активируем подписку
-            activate_subscription(payment.user_id, payment.plan, payment_id)
-
-            logger.info(f"Payment {payment_id} processed successfully via webhook")
-            return True
-        else:
-            logger.info(f"Payment {payment_id} already processed")
-            return True
+        # Проверка статуса, обновление платежа и активация подписки - одна транзакция
+        with transaction():
+            # Получаем информацию о платеже из нашей БД
+            payment = get_payment(payment_id)
+            if not payment:
+                logger.error(f"Payment {payment_id} not found in database")
+                return False
+
+            # Если платеж еще не обработан
+            if payment.status == 'pending':
+                # Обновляем статус платежа
+                confirmed_at = int(time.time())
+                update_payment_status(payment_id, 'succeeded', confirmed_at)
+
+                # Активируем подписку
+                activate_subscription(payment.user_id, payment.plan, payment_id)
+
+                logger.info(f"Payment {payment_id} processed successfully via webhook")
+                return True
+            else:
+                logger.info(f"Payment {payment_id} already processed")
+                return True
 
     except Exception as e:
         logger.error(f"Error processing webhook payment succeeded: {e}")
@@ -241,8 +359,7 @@ def process_webhook_payment_failed(payment_data: dict) -> bool:
     """Обработка webhook уведомления о неудачном платеже"""
 
     try:
-        metadata = payment_data.get('metadata', {})
-        payment_id = metadata.get('payment_id')
+        payment_id = resolve_webhook_payment_id(payment_data)
 
         if not payment_id:
             logger.error("No payment_id in webhook metadata")
@@ -250,6 +367,7 @@ def process_webhook_payment_failed(payment_data: dict) -> bool:
 
         # Обновляем статус платежа
         update_payment_status(payment_id, 'failed')
+        payment_contexts.discard(payment_id)
 
         logger.info(f"Payment {payment_id} marked as failed via webhook")
         return True
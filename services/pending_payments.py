@@ -0,0 +1,92 @@
+# services/pending_payments.py - повторное использование неоплаченных платежей
+
+import threading
+import time
+from concurrent.futures import Future
+from typing import Optional, Callable, Dict, Tuple
+
+PaymentLink = Tuple[str, str]  # (payment_id, confirmation_url)
+
+class PendingPaymentCache:
+    """Неоплаченные платежи по (user_id, plan) со сроком жизни ttl.
+
+    Повторное нажатие на тот же тариф возвращает уже созданную ссылку на
+    оплату вместо нового платежа. Одновременные запросы с одним ключом
+    объединяются: платеж создает первый, остальные ждут его результат.
+    """
+
+    def __init__(self, ttl: float = 600.0, max_size: int = 10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._links: Dict[Tuple[int, str], Tuple[float, PaymentLink]] = {}
+        self._in_flight: Dict[Tuple[int, str], Future] = {}
+        self._lock = threading.Lock()
+        self._stats = {'created': 0, 'reused': 0, 'coalesced': 0}
+
+    def get_or_create(self, user_id: int, plan: str, create: Callable[[], PaymentLink],
+                      is_valid: Optional[Callable[[str], bool]] = None) -> Tuple[PaymentLink, bool]:
+        """Ссылка на оплату: из кэша, из уже идущего создания или create().
+
+        is_valid(payment_id) проверяет, что платеж из кэша еще ждет оплаты.
+        Возвращает (ссылку, True если платеж создан этим вызовом).
+        """
+        key = (user_id, plan)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._links.get(key)
+            if entry is not None and entry[0] <= now:
+                del self._links[key]
+                entry = None
+            future = self._in_flight.get(key)
+            owner = future is None and entry is None
+            if owner:
+                future = self._in_flight[key] = Future()
+
+        if entry is not None:
+            link = entry[1]
+            if is_valid is None or is_valid(link[0]):
+                with self._lock:
+                    self._stats['reused'] += 1
+                return link, False
+            self.invalidate(user_id, plan, link[0])
+            return self.get_or_create(user_id, plan, create, is_valid)
+
+        if not owner:
+            with self._lock:
+                self._stats['coalesced'] += 1
+            return future.result(), False
+
+        try:
+            link = create()
+        except BaseException as e:
+            with self._lock:
+                del self._in_flight[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            del self._in_flight[key]
+            self._links[key] = (time.monotonic() + self.ttl, link)
+            self._stats['created'] += 1
+            if len(self._links) > self.max_size:
+                self._evict(time.monotonic())
+        future.set_result(link)
+        return link, True
+
+    def _evict(self, now: float):
+        # Сначала истекшие записи, при переполнении - самые старые
+        expired = [key for key, (expires_at, _) in self._links.items() if expires_at <= now]
+        for key in expired:
+            del self._links[key]
+        while len(self._links) > self.max_size:
+            del self._links[next(iter(self._links))]
+
+    def invalidate(self, user_id: int, plan: str, payment_id: Optional[str] = None):
+        """Убрать ссылку (после оплаты или ошибки). С payment_id - только если это тот же платеж."""
+        with self._lock:
+            entry = self._links.get((user_id, plan))
+            if entry is not None and (payment_id is None or entry[1][0] == payment_id):
+                del self._links[(user_id, plan)]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {**self._stats, 'entries': len(self._links)}
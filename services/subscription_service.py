@@ -1,10 +1,18 @@
 # services/subscription_service.py - бизнес-логика для управления подписками
 
-from datetime import datetime, timedelta
-from typing import Optional
-from config import PLANS
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, List, Dict, Tuple
+from config import PLANS, STATUS_CACHE_SIZE
 from db.database import get_user_subscription as db_get_user_subscription, save_subscription, check_expired_subscriptions as db_check_expired_subscriptions
 from db.models import Subscription
+from services.expiry_scheduler import schedule_subscription, unschedule_subscription
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+SECONDS_PER_DAY = 24 * 60 * 60
 
 def activate_subscription(user_id: int, plan: str, payment_id: Optional[str] = None) -> Subscription:
     """Активация подписки для пользователя"""
@@ -16,13 +24,12 @@ def activate_subscription(user_id: int, plan: str, payment_id: Optional[str] = N
 
     if existing_subscription and existing_subscription.status == 'active':
         # Продлеваем существующую подписку
-        end_date = datetime.fromisoformat(existing_subscription.end_date)
-        end_date = end_date + timedelta(days=30)  # +30 дней
-        start_date = existing_subscription.start_date
+        end_date = existing_subscription.end_ts + 30 * SECONDS_PER_DAY  # +30 дней
+        start_date = existing_subscription.start_ts
     else:
         # Создаем новую подписку
-        start_date = datetime.now().isoformat()
-        end_date = datetime.now() + timedelta(days=30)
+        start_date = int(time.time())
+        end_date = start_date + 30 * SECONDS_PER_DAY
 
     subscription = Subscription(
         user_id=user_id,
@@ -30,13 +37,15 @@ def activate_subscription(user_id: int, plan: str, payment_id: Optional[str] = N
         plan_name=plan_info['name'],
         price=plan_info['price'],
         start_date=start_date,
-        end_date=end_date.isoformat(),
+        end_date=end_date,
         status='active',
         auto_renewal=True,
         payment_id=payment_id
     )
 
     save_subscription(subscription)
+    status_text_cache.invalidate(user_id)
+    schedule_subscription(subscription)
     return subscription
 
 def get_user_subscription(user_id: int) -> Optional[Subscription]:
@@ -50,23 +59,25 @@ def cancel_subscription(user_id: int) -> bool:
         subscription.status = 'canceled'
         subscription.auto_renewal = False
         save_subscription(subscription)
+        status_text_cache.invalidate(user_id)
+        unschedule_subscription(user_id)
         return True
     return False
 
-def get_subscription_status_text(subscription: Optional[Subscription]) -> str:
-    """Формирование текста статуса подписки"""
+# ===== ТЕКСТ СТАТУСА =====
 
-    if not subscription:
-        return "❌ У вас нет активной подписки"
+STATUS_EMOJI = {
+    'active': '✅',
+    'expired': '⏰',
+    'canceled': '🚫'
+}
 
-    status_emoji = {
-        'active': '✅',
-        'expired': '⏰',
-        'canceled': '🚫'
-    }
+NO_SUBSCRIPTION_TEXT = "❌ У вас нет активной подписки"
 
+def render_subscription_status_text(subscription: Subscription, now: int) -> Tuple[str, float]:
+    """Текст статуса подписки и момент, до которого он актуален (меняется "Осталось дней")"""
     status_text = f"""
-{status_emoji.get(subscription.status, '❓')} **Статус подписки**
+{STATUS_EMOJI.get(subscription.status, '❓')} **Статус подписки**
 
 **Тариф:** {subscription.plan_name}
 **Стоимость:** {subscription.price}₽/месяц
@@ -77,13 +88,94 @@ def get_subscription_status_text(subscription: Optional[Subscription]) -> str:
 **Автопродление:** {'Включено' if subscription.auto_renewal else 'Отключено'}
 """
 
-    if subscription.status == 'active':
-        end_date = datetime.fromisoformat(subscription.end_date)
-        days_left = (end_date - datetime.now()).days
-        status_text += f"\n**Осталось дней:** {days_left}"
+    if subscription.status != 'active':
+        return status_text, float('inf')
+
+    days_left = (subscription.end_ts - now) // SECONDS_PER_DAY
+    status_text += f"\n**Осталось дней:** {days_left}"
+    # Значение уменьшится, когда до окончания останется меньше days_left полных дней
+    return status_text, subscription.end_ts - days_left * SECONDS_PER_DAY + 1
+
+class StatusTextCache:
+    """Готовые тексты статуса по user_id.
+
+    Запись хранит версию подписки (значения всех полей, to_tuple) и время, до
+    которого текст актуален. Повторный /status для той же подписки - поиск в
+    словаре и сравнение кортежа; любое сохраненное изменение подписки дает
+    другую версию и текст строится заново.
+    """
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self._entries: 'OrderedDict[int, Tuple[tuple, float, str]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0}
+
+    def get(self, subscription: Subscription, now: float) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(subscription.user_id)
+            if entry is not None and now < entry[1] and entry[0] == subscription.to_tuple():
+                self._entries.move_to_end(subscription.user_id)
+                self._stats['hits'] += 1
+                return entry[2]
+            self._stats['misses'] += 1
+            return None
+
+    def put(self, subscription: Subscription, valid_until: float, text: str):
+        with self._lock:
+            self._entries[subscription.user_id] = (subscription.to_tuple(), valid_until, text)
+            self._entries.move_to_end(subscription.user_id)
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {**self._stats, 'entries': len(self._entries)}
+
+# Глобальный экземпляр кэша
+status_text_cache = StatusTextCache(max_size=STATUS_CACHE_SIZE)
 
+def get_subscription_status_text(subscription: Optional[Subscription]) -> str:
+    """Формирование текста статуса подписки (из кэша, если подписка не менялась)"""
+
+    if not subscription:
+        return NO_SUBSCRIPTION_TEXT
+
+    now = int(time.time())
+    status_text = status_text_cache.get(subscription, now)
+    if status_text is None:
+        status_text, valid_until = render_subscription_status_text(subscription, now)
+        status_text_cache.put(subscription, valid_until, status_text)
     return status_text
 
+def notify_expired_subscriptions(bot, user_ids: List[int]):
+    """Уведомление пользователей об истечении подписки"""
+    from keyboards.inline_keyboards import get_subscription_keyboard
+    from services.messages import SUBSCRIPTION_EXPIRED_TEXT
+
+    for user_id in user_ids:
+        try:
+            bot.send_message(user_id, SUBSCRIPTION_EXPIRED_TEXT,
+                           reply_markup=get_subscription_keyboard(), parse_mode='Markdown')
+        except Exception as e:
+            logger.warning(f"Cannot notify user {user_id} about expired subscription: {e}")
+
+async def notify_expired_subscriptions_async(bot, user_ids: List[int]):
+    """Уведомление пользователей об истечении подписки (для AsyncTeleBot)"""
+    from keyboards.inline_keyboards import get_subscription_keyboard
+    from services.messages import SUBSCRIPTION_EXPIRED_TEXT
+
+    for user_id in user_ids:
+        try:
+            await bot.send_message(user_id, SUBSCRIPTION_EXPIRED_TEXT,
+                                   reply_markup=get_subscription_keyboard(), parse_mode='Markdown')
+        except Exception as e:
+            logger.warning(f"Cannot notify user {user_id} about expired subscription: {e}")
+
 def check_expired_subscriptions() -> int:
     """Проверка и обновление истекших подписок. Возвращает количество обновленных подписок."""
     return db_check_expired_subscriptions()
@@ -2,6 +2,7 @@
 
 from db.database import get_or_create_user as db_get_or_create_user, get_statistics as db_get_statistics, get_user_subscription as db_get_user_subscription, save_user
 from db.models import User
+from config import ADMIN_IDS
 
 def get_or_create_user(user_id: int, username=None, first_name=None, last_name=None, language_code=None):
     """Получить или создать пользователя"""
@@ -27,9 +28,8 @@ def update_user_info(user_id: int, **kwargs):
 
 def is_admin(user_id: int):
     """Проверить, является ли пользователь администратором"""
-    # Список администраторов можно хранить в конфиге или БД
-    admins = []  # Пока что пустой список
-    return user_id in admins
+    # Список администраторов задается переменной окружения ADMIN_IDS
+    return user_id in ADMIN_IDS
 
 def get_user_statistics():
     """Получить статистику по пользователям"""
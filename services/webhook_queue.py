@@ -0,0 +1,266 @@
+# services/webhook_queue.py - очередь webhook уведомлений на диске и потоки ее обработки
+
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional, Callable, Dict, List, NamedTuple
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+class WebhookJob(NamedTuple):
+    job_id: int
+    event: str
+    payload: Dict
+    attempts: int  # с учетом текущей
+
+class WebhookQueue:
+    """Очередь уведомлений в SQLite (WAL, synchronous=FULL).
+
+    Уведомление считается принятым, как только запись зафиксирована на диске.
+    Взятое в работу задание получает срок аренды lease: если процесс упал, не
+    подтвердив его, задание снова становится доступным (at-least-once).
+    После неудачи следующая попытка откладывается экспоненциально, после
+    max_attempts попыток задание переносится в dead и больше не выполняется.
+
+    Индекс дедупликации помнит ключи принятых уведомлений dedup_ttl секунд:
+    повторное уведомление с тем же ключом не создает задание. Проверка и
+    добавление задания идут одной транзакцией, поэтому из одновременных
+    дубликатов в очередь попадает только один. Ключ задания, перенесенного в
+    dead, удаляется из индекса: повторная доставка уведомления снова ставит его в очередь.
+    """
+
+    def __init__(self, path: str, lease: float = 60.0, max_attempts: int = 8,
+                 retry_base: float = 2.0, retry_max: float = 300.0, dedup_ttl: float = 172800.0,
+                 dedup_purge_interval: float = 60.0, timeout: float = 10.0):
+        self.path = path
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.dedup_ttl = dedup_ttl
+        self.dedup_purge_interval = dedup_purge_interval
+        self.timeout = timeout
+        self._local = threading.local()
+        self._next_dedup_purge = 0.0
+        self._duplicates = 0
+        self._lock = threading.Lock()
+
+        with self._transaction() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS jobs ("
+                         "id INTEGER PRIMARY KEY AUTOINCREMENT, event TEXT NOT NULL, payload TEXT NOT NULL, "
+                         "status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, "
+                         "available_at REAL NOT NULL, created_at REAL NOT NULL, last_error TEXT, dedup_key TEXT)")
+            # Очереди, созданные до появления колонки dedup_key
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if 'dedup_key' not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN dedup_key TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_available ON jobs(status, available_at)")
+            conn.execute("CREATE TABLE IF NOT EXISTS seen_events ("
+                         "key TEXT PRIMARY KEY, received_at REAL NOT NULL, hits INTEGER NOT NULL DEFAULT 0)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_seen_events_received_at ON seen_events(received_at)")
+
+    def _connection(self) -> sqlite3.Connection:
+        """Соединение текущего потока"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=FULL')
+            conn.execute(f"PRAGMA busy_timeout={int(self.timeout * 1000)}")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def put(self, event: str, payload: Dict, dedup_key: Optional[str] = None) -> Optional[int]:
+        """Сохранение уведомления. Возвращает ID задания или None, если dedup_key уже был принят."""
+        now = time.time()
+        with self._transaction() as conn:
+            if dedup_key is not None:
+                if now >= self._next_dedup_purge:
+                    self._next_dedup_purge = now + self.dedup_purge_interval
+                    conn.execute("DELETE FROM seen_events WHERE received_at < ?", (now - self.dedup_ttl,))
+                cursor = conn.execute("UPDATE seen_events SET hits = hits + 1 WHERE key = ?", (dedup_key,))
+                if cursor.rowcount:
+                    with self._lock:
+                        self._duplicates += 1
+                    return None
+                conn.execute("INSERT INTO seen_events (key, received_at) VALUES (?, ?)", (dedup_key, now))
+            cursor = conn.execute(
+                "INSERT INTO jobs (event, payload, status, available_at, created_at, dedup_key) "
+                "VALUES (?, ?, 'queued', ?, ?, ?)",
+                (event, json.dumps(payload, ensure_ascii=False), now, now, dedup_key))
+            return cursor.lastrowid
+
+    def claim(self) -> Optional[WebhookJob]:
+        """Взять в работу первое доступное задание (очередное, отложенное или с истекшей арендой)"""
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT id, event, payload, attempts FROM jobs WHERE status IN ('queued', 'processing') "
+                "AND available_at <= ? ORDER BY available_at, id LIMIT 1", (now,)).fetchone()
+            if row is None:
+                return None
+            job_id, event, payload, attempts = row
+            conn.execute("UPDATE jobs SET status = 'processing', attempts = ?, available_at = ? WHERE id = ?",
+                         (attempts + 1, now + self.lease, job_id))
+        return WebhookJob(job_id, event, json.loads(payload), attempts + 1)
+
+    def ack(self, job: WebhookJob):
+        """Задание выполнено - удаляем его"""
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM jobs WHERE id = ?", (job.job_id,))
+
+    def retry_delay(self, attempts: int) -> float:
+        return min(self.retry_max, self.retry_base * 2 ** (attempts - 1))
+
+    def fail(self, job: WebhookJob, error: str) -> bool:
+        """Неудачная попытка: откладываем задание или переносим в dead. Возвращает True, если будет повтор."""
+        retry = job.attempts < self.max_attempts
+        with self._transaction() as conn:
+            if retry:
+                conn.execute("UPDATE jobs SET status = 'queued', available_at = ?, last_error = ? WHERE id = ?",
+                             (time.time() + self.retry_delay(job.attempts), error[:500], job.job_id))
+            else:
+                conn.execute("UPDATE jobs SET status = 'dead', last_error = ? WHERE id = ?",
+                             (error[:500], job.job_id))
+                # Уведомление не применено - его повторная доставка не должна считаться дубликатом
+                conn.execute("DELETE FROM seen_events WHERE key = (SELECT dedup_key FROM jobs WHERE id = ?)",
+                             (job.job_id,))
+        return retry
+
+    def next_available_at(self) -> Optional[float]:
+        """Время, когда станет доступно ближайшее задание (None - очередь пуста)"""
+        row = self._connection().execute(
+            "SELECT MIN(available_at) FROM jobs WHERE status IN ('queued', 'processing')").fetchone()
+        return row[0]
+
+    def stats(self) -> Dict:
+        """Глубина очереди по статусам и возраст самого старого невыполненного задания"""
+        now = time.time()
+        result = {'queued': 0, 'processing': 0, 'dead': 0}
+        conn = self._connection()
+        for status, count in conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"):
+            result[status] = count
+        oldest = conn.execute(
+            "SELECT MIN(created_at) FROM jobs WHERE status IN ('queued', 'processing')").fetchone()[0]
+        result['oldest_age_s'] = round(now - oldest, 3) if oldest is not None else 0
+
+        entries, hits = conn.execute("SELECT COUNT(*), COALESCE(SUM(hits), 0) FROM seen_events").fetchone()
+        with self._lock:
+            duplicates = self._duplicates
+        # duplicates - отсеяно этим процессом, hits - всеми процессами за время хранения ключей
+        result['dedup'] = {'entries': entries, 'hits': hits, 'duplicates': duplicates}
+        return result
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+class WebhookWorkers:
+    """Потоки, выполняющие задания очереди.
+
+    handler(event, payload) возвращает True при успехе; False или исключение -
+    неудачная попытка. Задания, добавленные в этом процессе, будят потоки
+    сразу, задания других процессов подхватываются не позже poll_interval.
+    """
+
+    def __init__(self, queue: WebhookQueue, handler: Callable[[str, Dict], bool],
+                 workers: int = 4, poll_interval: float = 1.0):
+        self.queue = queue
+        self.handler = handler
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._stop = False
+        self._stats = {'processed': 0, 'retried': 0, 'failed': 0}
+
+    def start(self):
+        """Запуск потоков (повторный вызов ничего не делает)"""
+        with self._wakeup:
+            if self._threads:
+                return
+            self._stop = False
+            self._threads = [threading.Thread(target=self._run, name=f'webhook-worker-{i}', daemon=True)
+                             for i in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        with self._wakeup:
+            self._stop = True
+            self._wakeup.notify_all()
+
+    def submit(self, event: str, payload: Dict, dedup_key: Optional[str] = None) -> Optional[int]:
+        """Сохранить уведомление в очередь и разбудить поток. None - дубликат уже принятого."""
+        job_id = self.queue.put(event, payload, dedup_key)
+        if job_id is not None:
+            with self._wakeup:
+                self._wakeup.notify()
+        return job_id
+
+    def _wait(self):
+        next_at = self.queue.next_available_at()
+        timeout = self.poll_interval if next_at is None else min(self.poll_interval, next_at - time.time())
+        with self._wakeup:
+            if not self._stop and timeout > 0:
+                self._wakeup.wait(timeout)
+
+    def _run(self):
+        while not self._stop:
+            try:
+                job = self.queue.claim()
+                if job is None:
+                    self._wait()
+                else:
+                    self._execute(job)
+            except Exception as e:
+                # Поток не должен завершаться: неподтвержденное задание снова станет доступным после аренды
+                logger.error(f"Webhook queue error: {e}")
+                time.sleep(self.poll_interval)
+
+    def _execute(self, job: WebhookJob):
+        try:
+            ok = self.handler(job.event, job.payload)
+            error = None if ok else 'handler returned False'
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+
+        if error is None:
+            self.queue.ack(job)
+            self._count('processed')
+            return
+
+        if self.queue.fail(job, error):
+            self._count('retried')
+            logger.warning(f"Webhook job {job.job_id} ({job.event}) attempt {job.attempts} failed: {error}, "
+                           f"retry in {self.queue.retry_delay(job.attempts):.0f}s")
+        else:
+            self._count('failed')
+            logger.error(f"Webhook job {job.job_id} ({job.event}) failed {job.attempts} times, moved to dead: {error}")
+
+    def _count(self, name: str):
+        with self._wakeup:
+            self._stats[name] += 1
+
+    def stats(self) -> Dict:
+        """Глубина очереди и счетчики этого процесса"""
+        with self._wakeup:
+            counters = dict(self._stats)
+        workers = sum(thread.is_alive() for thread in self._threads)
+        return {**self.queue.stats(), **counters, 'workers': workers}
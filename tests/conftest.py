@@ -0,0 +1,15 @@
+# tests/conftest.py - общие фикстуры тестов
+
+import os
+import sys
+
+import pytest
+
+# Тесты запускаются из корня репозитория: модули бота импортируются как в main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture
+def table_files(tmp_path):
+    """Файлы снимков таблиц во временном каталоге"""
+    return {table: str(tmp_path / f"{table}.json")
+            for table in ('users', 'subscriptions', 'payments', 'payment_contexts')}
@@ -0,0 +1,80 @@
+# tests/test_expiry_scheduler.py - расписание истечения подписок
+
+import threading
+import time
+import types
+
+import pytest
+
+from services import expiry_scheduler
+from services.expiry_scheduler import ExpiryScheduler
+
+def subscription(user_id, end_ts):
+    return types.SimpleNamespace(user_id=user_id, end_ts=end_ts)
+
+@pytest.fixture
+def storage_subscriptions(monkeypatch):
+    """Активные подписки в хранилище (список можно менять в тесте)"""
+    subscriptions = []
+    monkeypatch.setattr(expiry_scheduler, 'get_active_subscriptions', lambda: list(subscriptions))
+    return subscriptions
+
+def test_schedule_is_ignored_until_started(storage_subscriptions):
+    # Процесс без планировщика (webhook) не копит расписание
+    scheduler = ExpiryScheduler()
+    scheduler.schedule(1, 100)
+    scheduler.unschedule(2)
+    assert scheduler._scheduled == {} and scheduler._heap == []
+
+    storage_subscriptions.append(subscription(1, time.time() + 3600))
+    scheduler.start()
+    try:
+        scheduler.schedule(2, time.time() + 7200)
+        assert set(scheduler._scheduled) == {1, 2}
+    finally:
+        scheduler.stop()
+    scheduler.schedule(3, 100)
+    assert 3 not in scheduler._scheduled
+
+def test_changes_made_during_resync_are_kept(monkeypatch):
+    scheduler = ExpiryScheduler()
+    scheduler._started = True
+    reading = threading.Event()
+
+    def slow_read():
+        reading.set()
+        time.sleep(0.1)
+        return [subscription(1, 100), subscription(2, 200)]
+
+    monkeypatch.setattr(expiry_scheduler, 'get_active_subscriptions', slow_read)
+    thread = threading.Thread(target=scheduler.resync)
+    thread.start()
+    reading.wait()
+    scheduler.schedule(3, 300)  # активирована во время чтения
+    scheduler.unschedule(2)     # отменена во время чтения
+    scheduler.schedule(1, 150)  # продлена во время чтения
+    thread.join()
+
+    assert scheduler._scheduled == {1: 150, 3: 300}
+    assert sorted(scheduler._heap) == [(150, 1), (300, 3)]
+    assert scheduler._pending is None
+
+def test_due_subscriptions_are_expired_in_one_batch(monkeypatch, storage_subscriptions):
+    expired = threading.Event()
+    batches = []
+
+    def expire(user_ids):
+        batches.append(sorted(user_ids))
+        return user_ids, []
+
+    monkeypatch.setattr(expiry_scheduler, 'expire_subscriptions', expire)
+    now = time.time()
+    storage_subscriptions.extend([subscription(1, now - 1), subscription(2, now - 2), subscription(3, now + 3600)])
+    scheduler = ExpiryScheduler()
+    scheduler.start(lambda user_ids: expired.set())
+    try:
+        assert expired.wait(5)
+        assert batches == [[1, 2]]
+        assert list(scheduler._scheduled) == [3]
+    finally:
+        scheduler.stop()
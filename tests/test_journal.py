@@ -0,0 +1,157 @@
+# tests/test_journal.py - журнальное хранилище: проигрывание, свертка, откат, несколько процессов
+
+import os
+
+import pytest
+
+from db import journal
+from db.journal import JournalStorage
+
+@pytest.fixture
+def open_storage(tmp_path, table_files):
+    """Открытие хранилища на общем журнале (каждый экземпляр - как отдельный процесс)"""
+    opened = []
+
+    def factory(**kwargs):
+        storage = JournalStorage(table_files, str(tmp_path / 'db.journal'), fsync=False,
+                                 compact_interval=3600, **kwargs)
+        opened.append(storage)
+        return storage
+
+    yield factory
+    for storage in opened:
+        storage.close()
+
+def payment(payment_id, status='pending', user_id=1):
+    return {'payment_id': payment_id, 'user_id': user_id, 'plan': 'basic', 'amount': 100,
+            'status': status, 'created_at': 0, 'confirmed_at': None, 'yookassa_id': None}
+
+# ===== ПРОИГРЫВАНИЕ =====
+
+def test_replay_restores_puts_updates_and_deletes(open_storage):
+    storage = open_storage()
+    storage.put_many('payments', {'p1': payment('p1'), 'p2': payment('p2'), 'p3': payment('p3')})
+    storage.update('payments', 'p2', {'status': 'succeeded'})
+    storage.delete('payments', 'p3')
+    storage.close()
+
+    restored = open_storage()
+    assert restored.get('payments', 'p2')['status'] == 'succeeded'
+    assert restored.get('payments', 'p3') is None
+    assert restored.count('payments') == 2
+    # Вторичные индексы строятся при проигрывании
+    assert [p['payment_id'] for p in restored.find('payments', status='pending')] == ['p1']
+
+def test_replay_skips_incomplete_last_line(tmp_path, open_storage):
+    storage = open_storage()
+    storage.put('users', '1', {'user_id': 1})
+    storage.close()
+    with open(tmp_path / 'db.journal', 'ab') as f:
+        f.write(b'["users", "2", {"user_')
+
+    restored = open_storage()
+    assert restored.get('users', '1') == {'user_id': 1}
+    assert restored.get('users', '2') is None
+    assert (tmp_path / 'db.journal').read_bytes().endswith(b'\n')
+
+def test_ordered_index_survives_replay(open_storage):
+    storage = open_storage()
+    for payment_id, expires_at in (('a', 30), ('b', 10), ('c', 20)):
+        storage.put('payment_contexts', payment_id, {'payment_id': payment_id, 'expires_at': expires_at})
+    storage.update('payment_contexts', 'a', {'expires_at': 5})
+    storage.close()
+
+    restored = open_storage()
+    assert [c['payment_id'] for c in restored.ordered('payment_contexts', 'expires_at')] == ['a', 'b', 'c']
+    assert [c['payment_id'] for c in restored.ordered('payment_contexts', 'expires_at', below=20)] == ['a', 'b']
+    assert [c['payment_id'] for c in restored.ordered('payment_contexts', 'expires_at', limit=1)] == ['a']
+
+# ===== НЕСКОЛЬКО ПРОЦЕССОВ =====
+
+def test_catch_up_sees_writes_of_other_instance(open_storage):
+    bot, webhook = open_storage(), open_storage()
+    bot.put('payments', 'p1', payment('p1'))
+    assert webhook.get('payments', 'p1')['status'] == 'pending'
+
+    webhook.update('payments', 'p1', {'status': 'succeeded'})
+    assert bot.get('payments', 'p1')['status'] == 'succeeded'
+    assert bot.find('payments', status='pending') == []
+    assert bot.stats() == webhook.stats()
+
+def test_writer_truncates_line_left_by_dead_writer(tmp_path, open_storage):
+    bot, webhook = open_storage(), open_storage()
+    bot.put('users', '1', {'user_id': 1})
+    with open(tmp_path / 'db.journal', 'ab') as f:
+        f.write(b'["users", "2", {"user_')  # процесс упал посреди записи
+
+    webhook.put('users', '3', {'user_id': 3})
+    assert webhook._offset == os.path.getsize(tmp_path / 'db.journal')
+    assert bot.get('users', '3') == {'user_id': 3}
+    assert sorted(key for key, _ in open_storage().items('users')) == ['1', '3']
+
+# ===== ТРАНЗАКЦИИ =====
+
+def test_rollback_restores_memory_and_writes_nothing(tmp_path, open_storage):
+    storage = open_storage()
+    storage.put('payments', 'p1', payment('p1'))
+    size = os.path.getsize(tmp_path / 'db.journal')
+
+    with pytest.raises(RuntimeError):
+        with storage.transaction():
+            storage.update('payments', 'p1', {'status': 'succeeded'})
+            storage.put('payments', 'p2', payment('p2'))
+            storage.delete('payments', 'p1')
+            # Внутри транзакции видны ее собственные изменения
+            assert storage.get('payments', 'p1') is None
+            raise RuntimeError('abort')
+
+    assert storage.get('payments', 'p1')['status'] == 'pending'
+    assert storage.get('payments', 'p2') is None
+    assert storage.find('payments', status='pending') == [storage.get('payments', 'p1')]
+    assert os.path.getsize(tmp_path / 'db.journal') == size
+
+def test_commit_is_one_append_visible_to_other_instance(open_storage):
+    bot, webhook = open_storage(), open_storage()
+    with bot.transaction():
+        bot.put('payments', 'p1', payment('p1'))
+        with bot.transaction():  # вложенная присоединяется к внешней
+            bot.update('payments', 'p1', {'status': 'succeeded'})
+        assert webhook.get('payments', 'p1') is None
+    assert webhook.get('payments', 'p1')['status'] == 'succeeded'
+
+# ===== СВЕРТКА =====
+
+def test_compaction_keeps_entries_appended_while_snapshots_are_written(monkeypatch, open_storage):
+    compactor, writer = open_storage(), open_storage()
+    compactor.put_many('users', {str(i): {'user_id': i} for i in range(10)})
+
+    save = journal._save_json_file
+    appended = []
+
+    def save_and_append(file_path, data, *args, **kwargs):
+        # Пока пишутся снимки, другой процесс продолжает дописывать журнал
+        if not appended:
+            writer.put('users', '100', {'user_id': 100})
+            writer.delete('users', '0')
+            appended.append(True)
+        save(file_path, data, *args, **kwargs)
+
+    monkeypatch.setattr(journal, '_save_json_file', save_and_append)
+    assert compactor.compact()
+    monkeypatch.setattr(journal, '_save_json_file', save)
+
+    # Второй экземпляр перечитывает снимки после смены журнала
+    assert writer.get('users', '100') == {'user_id': 100}
+    writer.put('users', '101', {'user_id': 101})
+    assert compactor.get('users', '101') == {'user_id': 101}
+
+    restored = open_storage()
+    assert sorted(int(key) for key, _ in restored.items('users')) == [*range(1, 10), 100, 101]
+
+def test_compaction_without_new_entries_is_skipped(open_storage):
+    storage = open_storage()
+    assert not storage.compact()
+    storage.put('users', '1', {'user_id': 1})
+    assert storage.compact()
+    assert storage._offset == 0
+    assert open_storage().get('users', '1') == {'user_id': 1}
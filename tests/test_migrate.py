@@ -0,0 +1,52 @@
+# tests/test_migrate.py - перенос JSON файлов в SQLite
+
+import json
+import sqlite3
+from datetime import datetime
+
+from db.migrate import migrate_to_sqlite
+from db.models import to_epoch
+
+def write_table(path, records):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(records, f)
+
+def test_legacy_iso_dates_are_migrated_as_epoch(tmp_path, table_files, monkeypatch):
+    monkeypatch.setattr('db.migrate.USERS_FILE', table_files['users'])
+    monkeypatch.setattr('db.migrate.SUBSCRIPTIONS_FILE', table_files['subscriptions'])
+    monkeypatch.setattr('db.migrate.PAYMENTS_FILE', table_files['payments'])
+    monkeypatch.setattr('db.migrate.PAYMENT_CONTEXTS_FILE', table_files['payment_contexts'])
+
+    write_table(table_files['users'], {
+        '1': {'user_id': 1, 'username': 'old', 'created_at': '2024-01-01T10:00:00'}
+    })
+    # Старая запись (ISO) и новая (epoch) в одной таблице
+    late_epoch = to_epoch(datetime(2024, 6, 1))
+    write_table(table_files['subscriptions'], {
+        '1': {'user_id': 1, 'plan': 'basic', 'start_date': '2024-01-01T10:00:00',
+              'end_date': '2024-12-01T10:00:00', 'status': 'active', 'auto_renewal': False},
+        '2': {'user_id': 2, 'plan': 'basic', 'start_date': late_epoch - 86400,
+              'end_date': late_epoch, 'status': 'active', 'auto_renewal': False}
+    })
+    write_table(table_files['payments'], {
+        'p1': {'payment_id': 'p1', 'user_id': 1, 'plan': 'basic', 'amount': 100, 'status': 'succeeded',
+               'created_at': '2024-01-01T10:00:00', 'confirmed_at': '2024-01-01T10:05:00'},
+        'p2': {'payment_id': 'p2', 'user_id': 2, 'plan': 'basic', 'amount': 100, 'status': 'pending',
+               'created_at': '2024-01-02T10:00:00', 'confirmed_at': None}
+    })
+
+    db_path = str(tmp_path / 'bot.db')
+    counts = migrate_to_sqlite(db_path, str(tmp_path / 'missing.journal'))
+    assert counts == {'users': 1, 'subscriptions': 2, 'payments': 2, 'payment_contexts': 0}
+
+    conn = sqlite3.connect(db_path)
+    types = conn.execute("SELECT DISTINCT typeof(start_date), typeof(end_date) FROM subscriptions").fetchall()
+    assert types == [('integer', 'integer')]
+    assert conn.execute("SELECT typeof(created_at) FROM users").fetchone() == ('integer',)
+    assert conn.execute("SELECT confirmed_at FROM payments ORDER BY payment_id").fetchall() == [
+        (to_epoch('2024-01-01T10:05:00'),), (None,)]
+    # Сортировка и диапазоны по end_date учитывают перенесенные записи
+    assert conn.execute("SELECT user_id FROM subscriptions ORDER BY end_date").fetchall() == [(2,), (1,)]
+    assert conn.execute("SELECT user_id FROM subscriptions WHERE end_date < ?",
+                        (to_epoch(datetime(2024, 7, 1)),)).fetchall() == [(2,)]
+    conn.close()
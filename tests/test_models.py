@@ -0,0 +1,31 @@
+# tests/test_models.py - даты моделей: epoch и записи старого формата
+
+from datetime import datetime
+
+import pytest
+
+from db.models import Subscription, to_epoch
+
+@pytest.mark.parametrize('value, expected', [
+    (None, None),
+    (1700000000, 1700000000),
+    (1700000000.9, 1700000000),
+    ('1700000000', 1700000000),        # TEXT колонка SQLite
+    ('1700000000.5', 1700000000),      # REAL колонка, дробное epoch из orjson / msgpack
+    (datetime(2024, 1, 1, 12, 0), int(datetime(2024, 1, 1, 12, 0).timestamp())),
+    ('2024-01-01T12:00:00', int(datetime(2024, 1, 1, 12, 0).timestamp())),
+])
+def test_to_epoch(value, expected):
+    assert to_epoch(value) == expected
+
+@pytest.mark.parametrize('value', ['', 'soon', 'inf'])
+def test_to_epoch_rejects_garbage(value):
+    with pytest.raises(ValueError):
+        to_epoch(value)
+
+def test_legacy_record_loads_with_iso_dates():
+    subscription = Subscription(**{
+        'user_id': 1, 'plan': 'basic', 'plan_name': 'Базовый', 'price': 100,
+        'start_date': '2024-01-01T12:00:00', 'end_date': '1706788800.0', 'status': 'active'})
+    assert subscription.start_ts == int(datetime(2024, 1, 1, 12, 0).timestamp())
+    assert subscription.end_ts == 1706788800
@@ -0,0 +1,157 @@
+# tests/test_outbox.py - очередь отправки: порядок в чате, приоритеты, повтор после 429
+
+import threading
+import time
+
+import pytest
+from telebot import apihelper
+
+from utils.bot import SalesBot
+from utils.outbox import (Outbox, SendScheduler, send_priority, PRIORITY_PAYMENT, PRIORITY_DEFAULT,
+                          PRIORITY_BULK)
+
+def rate_limited(retry_after: float):
+    return apihelper.ApiTelegramException('sendMessage', None, {
+        'error_code': 429, 'description': 'Too Many Requests', 'parameters': {'retry_after': retry_after}})
+
+def push(scheduler, chat_id, name, priority=PRIORITY_DEFAULT):
+    return scheduler.push(chat_id, name, (), {}, priority, None)
+
+def take(scheduler, now):
+    job, _ = scheduler.next_job(now)
+    return job.func if job is not None else None
+
+# ===== ПЛАНИРОВАНИЕ =====
+
+def test_chat_messages_go_one_at_a_time_in_order():
+    scheduler = SendScheduler(global_rate=100, chat_rate=100, chat_burst=10)
+    for name in ('a1', 'a2', 'a3'):
+        push(scheduler, 'A', name)
+    push(scheduler, 'B', 'b1')
+
+    now = time.monotonic()
+    first = scheduler.next_job(now)[0]
+    assert first.func == 'a1'
+    # Пока запрос чата A выполняется, следующий его запрос ждет, другие чаты - нет
+    assert take(scheduler, now) == 'b1'
+    assert take(scheduler, now) is None
+    scheduler.finish(first)
+    assert take(scheduler, now) == 'a2'
+
+def test_chat_rate_delays_only_its_own_chat():
+    scheduler = SendScheduler(global_rate=100, chat_rate=2, chat_burst=1)
+    push(scheduler, 'A', 'a1')
+    push(scheduler, 'A', 'a2')
+    push(scheduler, 'B', 'b1')
+
+    now = time.monotonic()
+    job = scheduler.next_job(now)[0]
+    scheduler.finish(job)
+    assert take(scheduler, now) == 'b1'
+    job, wait = scheduler.next_job(now)
+    assert job is None and wait == pytest.approx(0.5)
+    assert take(scheduler, now + 0.5) == 'a2'
+
+def test_higher_priority_goes_first_fifo_within_priority():
+    scheduler = SendScheduler(global_rate=100, chat_rate=100, chat_burst=10)
+    push(scheduler, 1, 'bulk', PRIORITY_BULK)
+    push(scheduler, 2, 'menu1')
+    push(scheduler, 3, 'payment', PRIORITY_PAYMENT)
+    push(scheduler, 4, 'menu2')
+
+    now = time.monotonic()
+    assert [take(scheduler, now) for _ in range(4)] == ['payment', 'menu1', 'menu2', 'bulk']
+
+def test_retry_pauses_chat_and_requeues_job():
+    scheduler = SendScheduler(global_rate=100, chat_rate=100, chat_burst=10)
+    push(scheduler, 'A', 'a1')
+    push(scheduler, 'A', 'a2')
+    push(scheduler, 'B', 'b1')
+
+    now = time.monotonic()
+    job = scheduler.next_job(now)[0]
+    scheduler.retry(job, 3.0, now)
+    # Чат на паузе retry_after, другой чат не ждет
+    assert take(scheduler, now) == 'b1'
+    assert take(scheduler, now + 2.9) is None
+
+    retried = scheduler.next_job(now + 3.0)[0]
+    assert (retried.func, retried.attempts) == ('a1', 1)
+    scheduler.finish(retried)
+    assert take(scheduler, now + 3.0) == 'a2'
+    assert scheduler.stats()['retried'] == 1
+
+# ===== ОЧЕРЕДЬ С ПОТОКАМИ =====
+
+def test_outbox_retries_after_429_and_keeps_chat_order():
+    outbox = Outbox(global_rate=100, chat_rate=100, chat_burst=10, workers=4)
+    sent = []
+    limited = []
+
+    def send(text):
+        if text == 'first' and not limited:
+            limited.append(text)
+            raise rate_limited(0.05)
+        sent.append(text)
+        return text
+
+    started = time.monotonic()
+    futures = [outbox.submit(42, send, text) for text in ('first', 'second')]
+    assert [future.result(timeout=5) for future in futures] == ['first', 'second']
+    assert sent == ['first', 'second']
+    assert time.monotonic() - started >= 0.05
+    assert outbox.stats()['retried'] == 1
+
+def test_outbox_gives_up_after_max_retries():
+    outbox = Outbox(global_rate=100, chat_rate=100, chat_burst=10, max_retries=2)
+    attempts = []
+
+    def send():
+        attempts.append(1)
+        raise rate_limited(0.01)
+
+    with pytest.raises(apihelper.ApiTelegramException):
+        outbox.call(42, send)
+    assert len(attempts) == 3
+
+def test_submit_takes_priority_from_context():
+    outbox = Outbox(global_rate=100, chat_rate=100, chat_burst=10, workers=1)
+    order = []
+    gate = threading.Event()
+    blocker = outbox.submit(1, gate.wait)
+    with send_priority(PRIORITY_BULK):
+        bulk = outbox.submit(2, order.append, 'bulk')
+    with send_priority(PRIORITY_PAYMENT):
+        payment = outbox.submit(3, order.append, 'payment')
+    gate.set()
+    for future in (blocker, bulk, payment):
+        future.result(timeout=5)
+    assert order == ['payment', 'bulk']
+
+# ===== ОБРАБОТЧИКИ =====
+
+@pytest.fixture
+def fake_api(monkeypatch):
+    """Bot API без сети: каждый запрос возвращает новое сообщение"""
+    requests = []
+
+    def make_request(token, method_url, method='get', params=None, files=None):
+        requests.append((method_url, params))
+        return {'message_id': len(requests), 'date': 0, 'text': params.get('text'),
+                'chat': {'id': int(params['chat_id']), 'type': 'private'}}
+
+    monkeypatch.setattr(apihelper, '_make_request', make_request)
+    return requests
+
+def test_nowait_sends_do_not_block_handler(fake_api):
+    bot = SalesBot('1:x', threaded=False,
+                   outbox=Outbox(global_rate=100, chat_rate=2, chat_burst=1, workers=2))
+    message = type('Message', (), {'message_id': 7, 'chat': type('Chat', (), {'id': 42})()})()
+
+    started = time.monotonic()
+    futures = [bot.send_message_nowait(42, 'one'), bot.reply_to_nowait(message, 'two')]
+    # Чат ждет своей очереди (2 сообщения в секунду), обработчик - нет
+    assert time.monotonic() - started < 0.1
+    assert [future.result(timeout=5).message_id for future in futures] == [1, 2]
+    assert [params['text'] for _, params in fake_api] == ['one', 'two']
+    assert 'reply_parameters' in fake_api[1][1]
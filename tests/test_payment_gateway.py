@@ -0,0 +1,178 @@
+# tests/test_payment_gateway.py - клиент YooKassa: circuit breaker, ключ идемпотентности, повторы
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import pytest
+
+from services import payment_gateway, payment_service
+from services.payment_gateway import (CircuitBreaker, YooKassaGateway, PaymentGatewayError,
+                                      PaymentGatewayUnavailable)
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(payment_gateway, 'time', SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+@pytest.fixture
+def yookassa():
+    """Локальный сервер вместо YooKassa: отвечает по очереди из responses, запоминает запросы"""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeYooKassa)
+    server.responses = []
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+class FakeYooKassa(BaseHTTPRequestHandler):
+    def _respond(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length)) if length else None
+        self.server.requests.append((self.command, self.path, dict(self.headers), body))
+        status, payload = self.server.responses.pop(0) if self.server.responses else (
+            200, {'id': 'yk-1', 'status': 'pending'})
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST = _respond
+
+    def log_message(self, *args):
+        pass
+
+def make_gateway(server, breaker=None, attempts=2):
+    host, port = server.server_address
+    return YooKassaGateway('shop', 'secret', f'http://{host}:{port}/v3', attempts=attempts,
+                           workers=1, breaker=breaker or CircuitBreaker(3, 30))
+
+# ===== CIRCUIT BREAKER =====
+
+def test_breaker_opens_after_threshold_and_probes_once(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    breaker.record_failure()
+    assert breaker.allow() and breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+    clock.now += 30
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # Пропускается только один пробный запрос
+    assert breaker.allow()
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow() and breaker.allow()
+
+def test_failed_probe_reopens_breaker(clock):
+    breaker = CircuitBreaker(failure_threshold=5, reset_timeout=30)
+    for _ in range(5):
+        breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now += 29
+    assert not breaker.allow()
+    clock.now += 1
+    assert breaker.allow()
+
+def test_success_resets_failure_count():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+# ===== ЗАПРОСЫ =====
+
+def test_create_payment_sends_idempotence_key_on_every_attempt(yookassa):
+    yookassa.responses = [(502, {'type': 'error'}), (200, {'id': 'yk-1', 'status': 'pending'})]
+    gateway = make_gateway(yookassa)
+    payment = gateway.create_payment({'amount': {'value': '100.00', 'currency': 'RUB'}}, 'our-payment-1')
+
+    assert payment.id == 'yk-1'
+    assert [(method, path) for method, path, _, _ in yookassa.requests] == [('POST', '/v3/payments')] * 2
+    assert [headers['Idempotence-Key'] for _, _, headers, _ in yookassa.requests] == ['our-payment-1'] * 2
+    assert yookassa.requests[0][3] == {'amount': {'value': '100.00', 'currency': 'RUB'}}
+    assert gateway.breaker.state == CircuitBreaker.CLOSED
+
+def test_get_payment_has_no_idempotence_key(yookassa):
+    gateway = make_gateway(yookassa)
+    assert gateway.get_payment('yk-1').status == 'pending'
+    method, path, headers, _ = yookassa.requests[0]
+    assert (method, path) == ('GET', '/v3/payments/yk-1')
+    assert 'Idempotence-Key' not in headers
+    assert headers['Authorization'].startswith('Basic ')
+
+def test_rejected_request_is_not_retried_and_keeps_breaker_closed(yookassa):
+    yookassa.responses = [(400, {'type': 'error', 'description': 'invalid amount'})]
+    gateway = make_gateway(yookassa, breaker=CircuitBreaker(1, 30))
+    with pytest.raises(PaymentGatewayError) as error:
+        gateway.create_payment({}, 'our-payment-1')
+    assert not isinstance(error.value, PaymentGatewayUnavailable)
+    assert len(yookassa.requests) == 1
+    assert gateway.breaker.state == CircuitBreaker.CLOSED
+
+def test_open_breaker_rejects_without_request_then_probe_closes_it(yookassa, clock):
+    yookassa.responses = [(500, {})] * 4
+    gateway = make_gateway(yookassa, breaker=CircuitBreaker(2, 30))
+    for _ in range(2):
+        with pytest.raises(PaymentGatewayUnavailable):
+            gateway.get_payment('yk-1')
+    assert gateway.breaker.state == CircuitBreaker.OPEN
+
+    with pytest.raises(PaymentGatewayUnavailable, match='circuit is open'):
+        gateway.get_payment('yk-1')
+    assert len(yookassa.requests) == 4
+
+    clock.now += 30
+    assert gateway.get_payment('yk-1').status == 'pending'
+    assert gateway.breaker.state == CircuitBreaker.CLOSED
+
+def test_unexpected_error_during_probe_does_not_stick_half_open(yookassa, clock):
+    gateway = make_gateway(yookassa, breaker=CircuitBreaker(1, 30))
+    yookassa.responses = [(500, {})] * 2
+    with pytest.raises(PaymentGatewayUnavailable):
+        gateway.get_payment('yk-1')
+
+    clock.now += 30
+    request = gateway._session.request
+    gateway._session.request = lambda *args, **kwargs: 1 / 0
+    with pytest.raises(ZeroDivisionError):
+        gateway.get_payment('yk-1')
+    assert gateway.breaker.state == CircuitBreaker.OPEN
+
+    gateway._session.request = request
+    clock.now += 30
+    assert gateway.get_payment('yk-1').status == 'pending'
+
+# ===== СТАТУС ПЛАТЕЖА =====
+
+def test_check_payment_status_queries_by_yookassa_id(yookassa, monkeypatch):
+    gateway = make_gateway(yookassa)
+    records = {'our-1': type('Payment', (), {'yookassa_id': 'yk-1'})(),
+               'our-2': type('Payment', (), {'yookassa_id': None})()}
+    monkeypatch.setattr(payment_service, 'get_payment_gateway', lambda: gateway)
+    monkeypatch.setattr(payment_service, 'get_payment', records.get)
+
+    assert payment_service.check_payment_status('our-1') == 'pending'
+    assert payment_service.check_payment_status('our-2') is None
+    assert payment_service.check_payment_status('missing') is None
+    assert [path for _, path, _, _ in yookassa.requests] == ['/v3/payments/yk-1']
@@ -0,0 +1,122 @@
+# tests/test_pending_payments.py - повторное использование неоплаченных платежей
+
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from services import pending_payments
+from services.pending_payments import PendingPaymentCache
+
+def tap_in_parallel(cache, create, taps=10):
+    """Одновременные нажатия на тариф: результаты и ошибки по потокам"""
+    results, errors = [], []
+
+    def tap():
+        try:
+            results.append(cache.get_or_create(1, 'basic', create))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=tap) for _ in range(taps)]
+    for thread in threads:
+        thread.start()
+    return threads, results, errors
+
+def wait_for_waiters(cache, count):
+    for _ in range(500):
+        if cache.stats()['coalesced'] == count:
+            return
+        time.sleep(0.01)
+    raise AssertionError('waiters did not join the in-flight request')
+
+def test_parallel_taps_create_one_payment():
+    cache = PendingPaymentCache()
+    release = threading.Event()
+    calls = []
+
+    def create():
+        calls.append(1)
+        release.wait(5)
+        return 'p1', 'https://pay/p1'
+
+    threads, results, errors = tap_in_parallel(cache, create)
+    wait_for_waiters(cache, 9)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert errors == [] and len(calls) == 1
+    assert {link for link, _ in results} == {('p1', 'https://pay/p1')}
+    assert sorted(created for _, created in results) == [False] * 9 + [True]
+    assert cache.stats() == {'created': 1, 'reused': 0, 'coalesced': 9, 'entries': 1}
+
+    # Следующее нажатие берет ссылку из кэша
+    assert cache.get_or_create(1, 'basic', create) == (('p1', 'https://pay/p1'), False)
+    assert cache.stats()['reused'] == 1
+
+def test_owner_error_reaches_waiters_and_is_not_cached():
+    cache = PendingPaymentCache()
+    release = threading.Event()
+
+    def create():
+        release.wait(5)
+        raise RuntimeError('YooKassa is down')
+
+    threads, results, errors = tap_in_parallel(cache, create)
+    wait_for_waiters(cache, 9)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert results == []
+    assert len(errors) == 10 and all(str(error) == 'YooKassa is down' for error in errors)
+    # Ошибка не запоминается: следующее нажатие создает платеж заново
+    assert cache.get_or_create(1, 'basic', lambda: ('p2', 'https://pay/p2')) == (('p2', 'https://pay/p2'), True)
+
+def test_link_that_is_no_longer_pending_is_replaced():
+    cache = PendingPaymentCache()
+    cache.get_or_create(1, 'basic', lambda: ('p1', 'https://pay/p1'))
+    checked = []
+
+    def is_valid(payment_id):
+        checked.append(payment_id)
+        return payment_id != 'p1'  # p1 уже оплачен или отменен
+
+    link, created = cache.get_or_create(1, 'basic', lambda: ('p2', 'https://pay/p2'), is_valid)
+    assert (link, created) == (('p2', 'https://pay/p2'), True)
+    assert checked == ['p1']
+    assert cache.get_or_create(1, 'basic', lambda: ('p3', ''), is_valid) == (('p2', 'https://pay/p2'), False)
+
+def test_is_valid_error_propagates_without_creating_payment():
+    cache = PendingPaymentCache()
+    cache.get_or_create(1, 'basic', lambda: ('p1', 'https://pay/p1'))
+
+    def broken(payment_id):
+        raise OSError('storage unavailable')
+
+    def create():
+        raise AssertionError('must not create a second payment')
+
+    with pytest.raises(OSError):
+        cache.get_or_create(1, 'basic', create, broken)
+    assert cache.get_or_create(1, 'basic', create) == (('p1', 'https://pay/p1'), False)
+
+def test_link_expires_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(pending_payments, 'time', SimpleNamespace(monotonic=lambda: now[0]))
+    cache = PendingPaymentCache(ttl=600)
+    cache.get_or_create(1, 'basic', lambda: ('p1', 'https://pay/p1'))
+    now[0] += 599
+    assert cache.get_or_create(1, 'basic', lambda: ('p2', ''))[0][0] == 'p1'
+    now[0] += 1
+    assert cache.get_or_create(1, 'basic', lambda: ('p2', ''))[0][0] == 'p2'
+
+def test_invalidate_only_matching_payment():
+    cache = PendingPaymentCache()
+    cache.get_or_create(1, 'basic', lambda: ('p1', 'https://pay/p1'))
+    cache.invalidate(1, 'basic', 'p0')
+    assert cache.stats()['entries'] == 1
+    cache.invalidate(1, 'basic', 'p1')
+    assert cache.stats()['entries'] == 0
@@ -0,0 +1,224 @@
+# tests/test_webhook_queue.py - очередь webhook уведомлений: аренда, повторы, dead
+
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from services import webhook_queue
+from services.webhook_queue import WebhookQueue, WebhookWorkers
+
+class Clock:
+    """Управляемое время для модуля очереди"""
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(webhook_queue, 'time', SimpleNamespace(time=clock.time, sleep=time.sleep))
+    return clock
+
+@pytest.fixture
+def queue(tmp_path, clock):
+    queue = WebhookQueue(str(tmp_path / 'queue.db'), lease=60, max_attempts=3, retry_base=2, retry_max=5)
+    yield queue
+    queue.close()
+
+def statuses(queue):
+    return {status: count for status, count in queue.stats().items() if status in ('queued', 'processing', 'dead')}
+
+# ===== АРЕНДА =====
+
+def test_claimed_job_is_hidden_until_lease_expires(queue, clock):
+    job_id = queue.put('payment.succeeded', {'object': {'id': 'yk-1'}})
+    job = queue.claim()
+    assert (job.job_id, job.attempts, job.payload) == (job_id, 1, {'object': {'id': 'yk-1'}})
+    assert queue.claim() is None
+    assert statuses(queue) == {'queued': 0, 'processing': 1, 'dead': 0}
+
+    # Процесс упал, не подтвердив задание: после аренды его забирает другой поток
+    clock.now += 61
+    reclaimed = queue.claim()
+    assert (reclaimed.job_id, reclaimed.attempts) == (job_id, 2)
+
+def test_ack_removes_job(queue):
+    queue.put('payment.succeeded', {})
+    queue.ack(queue.claim())
+    assert queue.claim() is None
+    assert statuses(queue) == {'queued': 0, 'processing': 0, 'dead': 0}
+    assert queue.next_available_at() is None
+
+def test_jobs_are_claimed_in_arrival_order(queue, clock):
+    first = queue.put('payment.succeeded', {'n': 1})
+    clock.now += 1
+    second = queue.put('payment.canceled', {'n': 2})
+    assert [queue.claim().job_id, queue.claim().job_id] == [first, second]
+
+# ===== ПОВТОРЫ =====
+
+def test_failed_job_is_retried_with_exponential_backoff(queue, clock):
+    assert [queue.retry_delay(attempts) for attempts in (1, 2, 3, 4)] == [2, 4, 5, 5]
+
+    job_id = queue.put('payment.succeeded', {})
+    assert queue.fail(queue.claim(), 'boom')
+    assert queue.next_available_at() == clock.now + 2
+    assert queue.claim() is None
+
+    clock.now += 2
+    job = queue.claim()
+    assert (job.job_id, job.attempts) == (job_id, 2)
+    assert queue.fail(job, 'boom')
+    clock.now += 3
+    assert queue.claim() is None
+    clock.now += 1
+    assert queue.claim().attempts == 3
+
+def test_job_moves_to_dead_after_max_attempts(queue, clock):
+    queue.put('payment.succeeded', {})
+    for attempt in range(1, 3):
+        job = queue.claim()
+        assert job.attempts == attempt
+        assert queue.fail(job, 'boom')
+        clock.now += queue.retry_delay(attempt)
+
+    job = queue.claim()
+    assert job.attempts == 3
+    assert not queue.fail(job, 'x' * 1000)
+    clock.now += 3600
+    assert queue.claim() is None
+    assert statuses(queue) == {'queued': 0, 'processing': 0, 'dead': 1}
+    error = queue._connection().execute("SELECT last_error FROM jobs").fetchone()[0]
+    assert error == 'x' * 500
+
+# ===== ПОТОКИ =====
+
+def test_workers_retry_until_handler_succeeds(tmp_path):
+    queue = WebhookQueue(str(tmp_path / 'queue.db'), retry_base=0.01, retry_max=0.01)
+    calls = []
+    done = threading.Event()
+
+    def handler(event, payload):
+        calls.append(event)
+        if len(calls) < 3:
+            raise RuntimeError('storage is busy')
+        done.set()
+        return True
+
+    workers = WebhookWorkers(queue, handler, workers=2, poll_interval=0.05)
+    workers.start()
+    try:
+        workers.submit('payment.succeeded', {'object': {'id': 'yk-1'}})
+        assert done.wait(5)
+        for _ in range(100):
+            stats = workers.stats()
+            if stats['processed']:
+                break
+            time.sleep(0.01)
+        assert (stats['processed'], stats['retried'], stats['failed']) == (1, 2, 0)
+        assert stats['workers'] == 2
+        assert stats['queued'] == stats['processing'] == 0
+    finally:
+        workers.stop()
+
+def test_worker_survives_queue_errors(tmp_path, monkeypatch):
+    queue = WebhookQueue(str(tmp_path / 'queue.db'))
+    handled = threading.Event()
+    ack = queue.ack
+    failures = []
+
+    def flaky_ack(job):
+        if not failures:
+            failures.append(job.job_id)
+            raise RuntimeError('database is locked')
+        ack(job)
+        handled.set()
+
+    monkeypatch.setattr(queue, 'ack', flaky_ack)
+    monkeypatch.setattr(queue, 'lease', 0.1)
+    workers = WebhookWorkers(queue, lambda event, payload: True, workers=1, poll_interval=0.05)
+    workers.start()
+    try:
+        workers.submit('payment.succeeded', {})
+        # Неподтвержденное задание снова выполняется после аренды тем же потоком
+        assert handled.wait(5)
+        assert workers.stats()['workers'] == 1
+    finally:
+        workers.stop()
+
+# ===== ДЕДУПЛИКАЦИЯ =====
+
+def test_duplicate_is_not_queued(queue):
+    assert queue.put('payment.succeeded', {}, 'payment.succeeded:yk-1') is not None
+    assert queue.put('payment.succeeded', {}, 'payment.succeeded:yk-1') is None
+    assert queue.put('payment.canceled', {}, 'payment.canceled:yk-1') is not None
+    # Без ключа уведомления не сравниваются
+    assert queue.put('payment.succeeded', {}) is not None
+    assert queue.put('payment.succeeded', {}) is not None
+
+    stats = queue.stats()
+    assert stats['queued'] == 4
+    assert stats['dedup'] == {'entries': 2, 'hits': 1, 'duplicates': 1}
+
+def test_concurrent_duplicates_from_two_processes_queue_one_job(tmp_path):
+    path = str(tmp_path / 'queue.db')
+    queues = [WebhookQueue(path), WebhookQueue(path)]
+    barrier = threading.Barrier(20)
+    results = []
+
+    def deliver(queue):
+        barrier.wait()
+        results.append(queue.put('payment.succeeded', {'object': {'id': 'yk-1'}}, 'payment.succeeded:yk-1'))
+
+    threads = [threading.Thread(target=deliver, args=(queues[i % 2],)) for i in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len([job_id for job_id in results if job_id is not None]) == 1
+    assert queues[0].stats()['queued'] == 1
+    assert queues[0].stats()['dedup']['hits'] == 19
+
+def test_dedup_keys_expire_after_ttl(tmp_path, clock):
+    queue = WebhookQueue(str(tmp_path / 'queue.db'), dedup_ttl=100, dedup_purge_interval=10)
+    queue.put('payment.succeeded', {}, 'payment.succeeded:yk-1')
+    clock.now += 50
+    queue.put('payment.succeeded', {}, 'payment.succeeded:yk-2')
+    assert queue.put('payment.succeeded', {}, 'payment.succeeded:yk-1') is None
+
+    # Очистка идет при добавлении, не чаще раза в dedup_purge_interval
+    clock.now += 51
+    assert queue.put('payment.succeeded', {}, 'payment.succeeded:yk-1') is not None
+    assert queue.put('payment.succeeded', {}, 'payment.succeeded:yk-2') is None
+    assert queue.stats()['dedup']['entries'] == 2
+
+def test_dead_job_releases_its_dedup_key(queue, clock):
+    key = 'payment.succeeded:yk-1'
+    queue.put('payment.succeeded', {}, key)
+    job = queue.claim()
+    assert queue.fail(job, 'boom')
+    # Пока задание повторяется, повторная доставка - дубликат
+    assert queue.put('payment.succeeded', {}, key) is None
+
+    for attempt in range(2, 4):
+        clock.now += queue.retry_delay(attempt - 1)
+        job = queue.claim()
+        assert job.attempts == attempt
+        queue.fail(job, 'boom')
+    assert statuses(queue)['dead'] == 1
+
+    # Уведомление не применено: его повторная доставка снова ставится в очередь
+    assert queue.put('payment.succeeded', {}, key) is not None
+    assert queue.claim().attempts == 1
+    assert queue.put('payment.succeeded', {}, key) is None
+
+def test_acked_job_keeps_its_dedup_key(queue):
+    queue.put('payment.succeeded', {}, 'payment.succeeded:yk-1')
+    queue.ack(queue.claim())
+    assert queue.put('payment.succeeded', {}, 'payment.succeeded:yk-1') is None
@@ -0,0 +1,72 @@
+# utils/async_bot.py - асинхронный бот с учетом отправленных сообщений
+
+import asyncio
+from typing import Iterable, Optional
+from telebot import asyncio_helper
+from telebot.async_telebot import AsyncTeleBot
+from utils.bot import is_not_modified
+from utils.chat_cleanup import track_message, chat_history, DELETE_BATCH_SIZE
+from utils.outbox import AsyncOutbox
+from utils.render_cache import render_cache
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Ссылки на фоновые задачи удаления, чтобы их не собрал сборщик мусора
+_cleanup_tasks = set()
+
+class AsyncSalesBot(AsyncTeleBot):
+    """AsyncTeleBot, который запоминает отправленные сообщения (см. utils.bot.SalesBot)"""
+
+    def __init__(self, token: str, *args, outbox: Optional[AsyncOutbox] = None, **kwargs):
+        super().__init__(token, *args, **kwargs)
+        self.outbox = outbox
+
+    async def _send(self, chat_id, coro_func, /, *args, **kwargs):
+        if self.outbox is None:
+            return await coro_func(*args, **kwargs)
+        return await self.outbox.call(chat_id, coro_func, *args, **kwargs)
+
+    async def send_message(self, chat_id, text, *args, **kwargs):
+        message = await self._send(chat_id, super().send_message, chat_id, text, *args, **kwargs)
+        track_message(message.chat.id, message.message_id)
+        render_cache.store(message.chat.id, message.message_id, text,
+                           kwargs.get('parse_mode'), kwargs.get('reply_markup'), message)
+        return message
+
+    async def edit_message_text(self, text, chat_id=None, message_id=None, inline_message_id=None,
+                                parse_mode=None, reply_markup=None, **kwargs):
+        cacheable = chat_id is not None and message_id is not None
+        if cacheable and not render_cache.should_edit(chat_id, message_id, text, parse_mode, reply_markup):
+            return True
+        try:
+            result = await self._send(chat_id, super().edit_message_text, text, chat_id=chat_id,
+                                      message_id=message_id, inline_message_id=inline_message_id,
+                                      parse_mode=parse_mode, reply_markup=reply_markup, **kwargs)
+        except asyncio_helper.ApiTelegramException as e:
+            if not is_not_modified(e):
+                raise
+            result = True
+        if cacheable:
+            render_cache.store(chat_id, message_id, text, parse_mode, reply_markup, result)
+        return result
+
+    async def process_new_callback_query(self, new_callback_queries):
+        for call in new_callback_queries:
+            render_cache.validate(call.message)
+        await super().process_new_callback_query(new_callback_queries)
+
+def cleanup_chat(bot, chat_id: int, keep: Iterable[int] = ()):
+    """Удалить в фоновой задаче отправленные ботом сообщения чата, кроме keep"""
+    message_ids = chat_history.take(chat_id, keep)
+    if message_ids:
+        task = asyncio.get_running_loop().create_task(_delete_messages(bot, chat_id, message_ids))
+        _cleanup_tasks.add(task)
+        task.add_done_callback(_cleanup_tasks.discard)
+
+async def _delete_messages(bot, chat_id: int, message_ids):
+    for start in range(0, len(message_ids), DELETE_BATCH_SIZE):
+        try:
+            await bot.delete_messages(chat_id, message_ids[start:start + DELETE_BATCH_SIZE])
+        except Exception as e:
+            logger.debug(f"Chat {chat_id} cleanup failed: {e}")
@@ -0,0 +1,81 @@
+# utils/async_runtime.py - общие ресурсы асинхронного режима (AsyncTeleBot)
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Callable, Dict, Hashable
+from config import EDIT_DELAY, ASYNC_HTTP_LIMIT, ASYNC_OFFLOAD_WORKERS
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Пул потоков для блокирующих вызовов (хранилище, YooKassa SDK) из корутин
+_executor: Optional[ThreadPoolExecutor] = None
+
+# Отложенные действия по ключу: новое действие с тем же ключом отменяет прежнее
+_pending: Dict[Hashable, asyncio.Task] = {}
+
+def get_executor() -> ThreadPoolExecutor:
+    """Пул потоков для блокирующих вызовов (создается при первом обращении)"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=ASYNC_OFFLOAD_WORKERS, thread_name_prefix='offload')
+    return _executor
+
+async def run_blocking(func: Callable, *args, **kwargs):
+    """Выполнить блокирующую функцию в пуле потоков, не останавливая event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), functools.partial(func, *args, **kwargs))
+
+# ===== HTTP СЕССИЯ =====
+
+def configure_http_session():
+    """Настройка общей aiohttp сессии AsyncTeleBot (вызывать до первого запроса)"""
+    from telebot import asyncio_helper
+    asyncio_helper.REQUEST_LIMIT = ASYNC_HTTP_LIMIT
+
+async def get_http_session():
+    """Общая aiohttp сессия: через нее идут все запросы к Bot API, ее же используют остальные клиенты"""
+    from telebot import asyncio_helper
+    return await asyncio_helper.session_manager.get_session()
+
+async def close_http_session():
+    """Закрытие общей сессии и пула потоков при остановке"""
+    global _executor
+    from telebot import asyncio_helper
+    session = asyncio_helper.session_manager.session
+    if session is not None and not session.closed:
+        await session.close()
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+        _executor = None
+
+# ===== ОТЛОЖЕННЫЕ ДЕЙСТВИЯ =====
+
+def run_later(delay: float, coro_func: Callable, *args, key: Optional[Hashable] = None, **kwargs) -> asyncio.Task:
+    """Выполнить корутину через delay секунд в фоне (аналог utils.delayed_actions.run_later)"""
+    if key is not None:
+        previous = _pending.pop(key, None)
+        if previous is not None:
+            previous.cancel()
+    task = asyncio.get_running_loop().create_task(_run_after(delay, key, coro_func, args, kwargs))
+    if key is not None:
+        _pending[key] = task
+    return task
+
+async def _run_after(delay: float, key: Optional[Hashable], coro_func: Callable, args: tuple, kwargs: dict):
+    try:
+        await asyncio.sleep(delay)
+        await coro_func(*args, **kwargs)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.error(f"Delayed action {getattr(coro_func, '__name__', coro_func)} failed: {e}")
+    finally:
+        if key is not None and _pending.get(key) is asyncio.current_task():
+            del _pending[key]
+
+def edit_message_later(bot, chat_id: int, message_id: int, text: str, delay: float = EDIT_DELAY, **kwargs):
+    """Отредактировать сообщение через delay секунд (повторная правка того же сообщения заменяет прежнюю)"""
+    run_later(delay, bot.edit_message_text, key=('edit', chat_id, message_id),
+              chat_id=chat_id, message_id=message_id, text=text, **kwargs)
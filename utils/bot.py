@@ -0,0 +1,139 @@
+# utils/bot.py - бот с учетом отправленных сообщений
+
+import telebot
+from concurrent.futures import Future
+from typing import Optional
+from utils.chat_cleanup import track_message
+from utils.chat_executor import ChatOrderedExecutor, update_chat_key
+from utils.outbox import Outbox
+from utils.render_cache import render_cache
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+def is_not_modified(error: Exception) -> bool:
+    """Ошибка Bot API "message is not modified": сообщение уже показывает это содержимое"""
+    return 'message is not modified' in str(getattr(error, 'description', '') or error)
+
+class SalesBot(telebot.TeleBot):
+    """TeleBot, который запоминает отправленные сообщения.
+
+    ID сообщений нужны для очистки чата (utils.chat_cleanup), а их содержимое -
+    для пропуска правок, которые ничего не меняют (utils.render_cache).
+
+    При chat_workers обновления выполняются в ChatOrderedExecutor вместо общего
+    пула telebot: по порядку внутри чата и параллельно между чатами.
+
+    При outbox отправка и правка сообщений идут через очередь с ограничением
+    частоты (utils.outbox): общий и поканальный лимиты, повтор после 429.
+    send_message и edit_message_text ждут, пока очередь выполнит запрос;
+    обработчики, которым результат не нужен, используют *_nowait - они не
+    занимают поток, пока чат ждет своей очереди (иначе ждут и другие чаты,
+    попавшие в тот же поток ChatOrderedExecutor).
+    """
+
+    def __init__(self, token: str, *args, chat_workers: Optional[int] = None,
+                 outbox: Optional[Outbox] = None, **kwargs):
+        super().__init__(token, *args, **kwargs)
+        self.chat_executor: Optional[ChatOrderedExecutor] = None
+        if chat_workers and self.threaded:
+            self.chat_executor = ChatOrderedExecutor(chat_workers, on_error=self._handle_exception)
+        self.outbox = outbox
+
+    def _exec_task(self, task, *args, **kwargs):
+        if self.chat_executor is None:
+            return super()._exec_task(task, *args, **kwargs)
+        # Первый аргумент - обновление (сообщение, callback) или список сообщений для listener
+        key = update_chat_key(args[0]) if args else None
+        self.chat_executor.submit(key, task, *args, **kwargs)
+
+    def _send(self, chat_id, func, /, *args, **kwargs):
+        if self.outbox is None:
+            return func(*args, **kwargs)
+        return self.outbox.call(chat_id, func, *args, **kwargs)
+
+    def _submit(self, chat_id, func, /, *args, **kwargs) -> Future:
+        """Как _send, но без ожидания: Future с результатом запроса"""
+        if self.outbox is not None:
+            return self.outbox.submit(chat_id, func, *args, **kwargs)
+        future = Future()
+        try:
+            future.set_result(func(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    @staticmethod
+    def _remember_sent(message, text, kwargs):
+        track_message(message.chat.id, message.message_id)
+        render_cache.store(message.chat.id, message.message_id, text,
+                           kwargs.get('parse_mode'), kwargs.get('reply_markup'), message)
+
+    def send_message(self, chat_id, text, *args, **kwargs):
+        message = self._send(chat_id, super().send_message, chat_id, text, *args, **kwargs)
+        self._remember_sent(message, text, kwargs)
+        return message
+
+    def send_message_nowait(self, chat_id, text, *args, **kwargs) -> Future:
+        """Отправка без ожидания очереди. Ошибка пишется в лог; Future - с отправленным сообщением."""
+        future = self._submit(chat_id, super().send_message, chat_id, text, *args, **kwargs)
+
+        def remember(done: Future):
+            error = done.exception()
+            if error is not None:
+                logger.error(f"Failed to send message to chat {chat_id}: {error}")
+                return
+            self._remember_sent(done.result(), text, kwargs)
+
+        # Колбэки выполняются по порядку: сообщение запомнено до колбэков вызывающего
+        future.add_done_callback(remember)
+        return future
+
+    def reply_to_nowait(self, message, text, **kwargs) -> Future:
+        """Ответ на сообщение без ожидания очереди (как reply_to)"""
+        kwargs.setdefault('reply_parameters', telebot.types.ReplyParameters(message.message_id))
+        return self.send_message_nowait(message.chat.id, text, **kwargs)
+
+    def edit_message_text(self, text, chat_id=None, message_id=None, inline_message_id=None,
+                          parse_mode=None, reply_markup=None, **kwargs):
+        cacheable = chat_id is not None and message_id is not None
+        if cacheable and not render_cache.should_edit(chat_id, message_id, text, parse_mode, reply_markup):
+            return True
+        try:
+            result = self._send(chat_id, super().edit_message_text, text, chat_id=chat_id,
+                                message_id=message_id, inline_message_id=inline_message_id,
+                                parse_mode=parse_mode, reply_markup=reply_markup, **kwargs)
+        except telebot.apihelper.ApiTelegramException as e:
+            if not is_not_modified(e):
+                raise
+            result = True
+        if cacheable:
+            render_cache.store(chat_id, message_id, text, parse_mode, reply_markup, result)
+        return result
+
+    def edit_message_text_nowait(self, text, chat_id, message_id, parse_mode=None, reply_markup=None,
+                                 **kwargs) -> Future:
+        """Правка без ожидания очереди. Ошибка пишется в лог ("not modified" - не ошибка)."""
+        future = Future()
+        if not render_cache.should_edit(chat_id, message_id, text, parse_mode, reply_markup):
+            future.set_result(True)
+            return future
+        future = self._submit(chat_id, super().edit_message_text, text, chat_id=chat_id, message_id=message_id,
+                              parse_mode=parse_mode, reply_markup=reply_markup, **kwargs)
+
+        def remember(done: Future):
+            error = done.exception()
+            if error is not None and not is_not_modified(error):
+                logger.error(f"Failed to edit message {message_id} in chat {chat_id}: {error}")
+                return
+            render_cache.store(chat_id, message_id, text, parse_mode, reply_markup,
+                               True if error is not None else done.result())
+
+        future.add_done_callback(remember)
+        return future
+
+    def process_new_callback_query(self, new_callback_queries):
+        # Callback несет сообщение в текущем виде - сверяем с ним кэш перед обработчиками
+        for call in new_callback_queries:
+            render_cache.validate(call.message)
+        super().process_new_callback_query(new_callback_queries)
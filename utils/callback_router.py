@@ -0,0 +1,189 @@
+# utils/callback_router.py - маршрутизация callback запросов и формат callback_data
+
+import inspect
+import threading
+import time
+from typing import Optional, Callable, Dict, List, Tuple
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Ограничение Bot API на длину callback_data (в байтах UTF-8)
+CALLBACK_DATA_LIMIT = 64
+SEPARATOR = ':'
+_DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+
+# ===== ФОРМАТ CALLBACK_DATA =====
+
+def _int_to_base36(value: int) -> str:
+    if value < 0:
+        return '-' + _int_to_base36(-value)
+    digits = []
+    while True:
+        value, remainder = divmod(value, 36)
+        digits.append(_DIGITS[remainder])
+        if not value:
+            return ''.join(reversed(digits))
+
+def encode_callback(action: str, *args) -> str:
+    """Упаковка действия и аргументов в callback_data: action:arg1:arg2 (целые числа - в base36)"""
+    parts = [action]
+    for arg in args:
+        if isinstance(arg, bool):
+            part = '1' if arg else '0'
+        elif isinstance(arg, int):
+            part = _int_to_base36(arg)
+        else:
+            part = str(arg)
+        if SEPARATOR in part:
+            raise ValueError(f"Callback argument must not contain '{SEPARATOR}': {part!r}")
+        parts.append(part)
+    data = SEPARATOR.join(parts)
+    if len(data.encode('utf-8')) > CALLBACK_DATA_LIMIT:
+        raise ValueError(f"Callback data exceeds {CALLBACK_DATA_LIMIT} bytes: {data!r}")
+    return data
+
+def _parse_arg(value: str, arg_type: type):
+    if arg_type is int:
+        return int(value, 36)
+    if arg_type is bool:
+        return value == '1'
+    return arg_type(value)
+
+# ===== МАРШРУТИЗАТОР =====
+
+class RouteStats:
+    """Счетчики маршрута: вызовы, ошибки, суммарное и максимальное время"""
+    __slots__ = ('calls', 'errors', 'total_time', 'max_time')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def record(self, elapsed: float, failed: bool):
+        self.calls += 1
+        self.errors += failed
+        self.total_time += elapsed
+        if elapsed > self.max_time:
+            self.max_time = elapsed
+
+    def to_dict(self) -> Dict:
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'avg_ms': round(self.total_time / self.calls * 1000, 3) if self.calls else 0.0,
+            'max_ms': round(self.max_time * 1000, 3)
+        }
+
+class CallbackRouter:
+    """Маршрутизатор callback запросов: выбор обработчика по действию за O(1).
+
+    Обработчики регистрируются декоратором route(action, *arg_types) и получают
+    (call, *args). Старый формат кнопок ("subscribe_basic") тоже разбирается:
+    если действие целиком не найдено, оно делится по первому "_".
+    """
+
+    def __init__(self):
+        self._routes: Dict[str, Tuple[Callable, Tuple[type, ...]]] = {}
+        self._stats: Dict[str, RouteStats] = {}
+        self._lock = threading.Lock()
+
+    def route(self, action: str, *arg_types: type):
+        """Декоратор регистрации обработчика действия"""
+        if SEPARATOR in action:
+            raise ValueError(f"Action must not contain '{SEPARATOR}': {action!r}")
+
+        def decorator(func: Callable) -> Callable:
+            self._routes[action] = (func, arg_types)
+            self._stats[action] = RouteStats()
+            return func
+        return decorator
+
+    def resolve(self, data: Optional[str]) -> Optional[Tuple[str, Callable, List]]:
+        """Разбор callback_data: (действие, обработчик, аргументы) или None"""
+        if not data:
+            return None
+        action, *raw_args = data.split(SEPARATOR)
+        route = self._routes.get(action)
+        if route is None and not raw_args and '_' in action:
+            # Кнопки, отправленные до перехода на action:args
+            action, legacy_arg = action.split('_', 1)
+            route = self._routes.get(action)
+            raw_args = [legacy_arg]
+        if route is None:
+            return None
+
+        func, arg_types = route
+        if len(raw_args) != len(arg_types):
+            return None
+        try:
+            args = [_parse_arg(value, arg_type) for value, arg_type in zip(raw_args, arg_types)]
+        except ValueError:
+            return None
+        return action, func, args
+
+    def _record(self, action: str, started: float, failed: bool):
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._stats[action].record(elapsed, failed)
+
+    def dispatch(self, call) -> bool:
+        """Вызов обработчика для callback запроса. False - маршрут не найден."""
+        resolved = self.resolve(call.data)
+        if resolved is None:
+            return False
+        action, func, args = resolved
+        started = time.perf_counter()
+        failed = True
+        try:
+            func(call, *args)
+            failed = False
+        finally:
+            self._record(action, started, failed)
+        return True
+
+    async def dispatch_async(self, call) -> bool:
+        """То же, что dispatch, для обработчиков-корутин AsyncTeleBot"""
+        resolved = self.resolve(call.data)
+        if resolved is None:
+            return False
+        action, func, args = resolved
+        started = time.perf_counter()
+        failed = True
+        try:
+            await func(call, *args)
+            failed = False
+        finally:
+            self._record(action, started, failed)
+        return True
+
+    def stats(self) -> Dict[str, Dict]:
+        """Счетчики и задержки по маршрутам"""
+        with self._lock:
+            return {action: stats.to_dict() for action, stats in self._stats.items()}
+
+def get_callback_router(bot) -> CallbackRouter:
+    """Маршрутизатор бота: при первом обращении регистрирует один общий callback обработчик"""
+    router = getattr(bot, 'callback_router', None)
+    if router is not None:
+        return router
+
+    router = CallbackRouter()
+    bot.callback_router = router
+
+    if inspect.iscoroutinefunction(bot.answer_callback_query):
+        @bot.callback_query_handler(func=lambda call: True)
+        async def route_callback_async(call):
+            if not await router.dispatch_async(call):
+                logger.warning(f"Unknown callback data: {call.data!r}")
+                await bot.answer_callback_query(call.id)
+    else:
+        @bot.callback_query_handler(func=lambda call: True)
+        def route_callback(call):
+            if not router.dispatch(call):
+                logger.warning(f"Unknown callback data: {call.data!r}")
+                bot.answer_callback_query(call.id)
+
+    return router
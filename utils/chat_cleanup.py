@@ -0,0 +1,102 @@
+# utils/chat_cleanup.py - учет отправленных сообщений и фоновая очистка чата
+
+import queue
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from typing import Dict, Iterable, List, Tuple
+from config import CHAT_HISTORY_SIZE, CHAT_HISTORY_CHATS
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Bot API удаляет не больше 100 сообщений за один вызов deleteMessages
+DELETE_BATCH_SIZE = 100
+
+class ChatHistory:
+    """ID сообщений, отправленных ботом, по чатам.
+
+    Для каждого чата хранится кольцевой буфер последних size сообщений,
+    число чатов ограничено max_chats (давно неактивные вытесняются).
+    """
+
+    def __init__(self, size: int = 50, max_chats: int = 10000):
+        self.size = size
+        self.max_chats = max_chats
+        self._chats: 'OrderedDict[int, deque]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def track(self, chat_id: int, message_id: int):
+        """Запомнить отправленное сообщение"""
+        with self._lock:
+            history = self._chats.get(chat_id)
+            if history is None:
+                history = self._chats[chat_id] = deque(maxlen=self.size)
+                if len(self._chats) > self.max_chats:
+                    self._chats.popitem(last=False)
+            else:
+                self._chats.move_to_end(chat_id)
+            history.append(message_id)
+
+    def take(self, chat_id: int, keep: Iterable[int] = ()) -> List[int]:
+        """Забрать ID сообщений чата для удаления (сообщения из keep остаются в истории)"""
+        keep = set(keep)
+        with self._lock:
+            history = self._chats.get(chat_id)
+            if not history:
+                return []
+            message_ids = [message_id for message_id in history if message_id not in keep]
+            history.clear()
+            history.extend(message_id for message_id in keep if message_id is not None)
+            return message_ids
+
+    def __len__(self):
+        with self._lock:
+            return len(self._chats)
+
+class CleanupWorker:
+    """Фоновый поток, который удаляет сообщения пачками через deleteMessages"""
+
+    def __init__(self):
+        self._queue: 'queue.Queue[Tuple[object, int, List[int]]]' = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, bot, chat_id: int, message_ids: List[int]):
+        if not message_ids:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='chat-cleanup', daemon=True)
+                self._thread.start()
+        self._queue.put((bot, chat_id, message_ids))
+
+    def _run(self):
+        while True:
+            bot, chat_id, message_ids = self._queue.get()
+            for start in range(0, len(message_ids), DELETE_BATCH_SIZE):
+                try:
+                    bot.delete_messages(chat_id, message_ids[start:start + DELETE_BATCH_SIZE])
+                except Exception as e:
+                    # Старые (более 48 часов) или уже удаленные сообщения - не ошибка
+                    logger.debug(f"Chat {chat_id} cleanup failed: {e}")
+
+# Глобальные экземпляры
+chat_history = ChatHistory(size=CHAT_HISTORY_SIZE, max_chats=CHAT_HISTORY_CHATS)
+cleanup_worker = CleanupWorker()
+
+# Вспомогательные функции
+def track_message(chat_id: int, message_id: int):
+    """Запомнить сообщение, отправленное ботом"""
+    chat_history.track(chat_id, message_id)
+
+def cleanup_chat(bot, chat_id: int, keep: Iterable[int] = ()):
+    """Удалить в фоне отправленные ботом сообщения чата, кроме keep"""
+    cleanup_worker.submit(bot, chat_id, chat_history.take(chat_id, keep))
+
+def cleanup_chat_after(bot, chat_id: int, sent: Future):
+    """cleanup_chat после отправки сообщения (Future из send_message_nowait), само сообщение остается"""
+    def run(done: Future):
+        if done.exception() is None:
+            cleanup_chat(bot, chat_id, keep=[done.result().message_id])
+    sent.add_done_callback(run)
@@ -0,0 +1,97 @@
+# utils/chat_executor.py - обработка обновлений с сохранением порядка внутри чата
+
+import queue
+import threading
+import time
+from typing import Optional, Callable, Dict, List, Hashable
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+def update_chat_key(update) -> Optional[Hashable]:
+    """Ключ шардирования обновления: ID чата, для запросов без чата - ID пользователя"""
+    message = getattr(update, 'message', None)  # callback query
+    chat = getattr(update, 'chat', None) or getattr(message, 'chat', None)
+    if chat is not None:
+        return chat.id
+    from_user = getattr(update, 'from_user', None)
+    if from_user is not None:
+        return from_user.id
+    return None
+
+class _Shard:
+    """Очередь и поток одного шарда"""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.queue: 'queue.Queue' = queue.Queue()
+        self.processed = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.busy_since: Optional[float] = None
+        self.thread: Optional[threading.Thread] = None
+
+class ChatOrderedExecutor:
+    """Пул из N потоков, между которыми обновления распределяются по chat_id.
+
+    Обновления одного чата всегда попадают в один поток и выполняются по
+    очереди (два быстрых нажатия не выполняются параллельно), разные чаты
+    обрабатываются параллельно. Для каждого шарда доступны глубина очереди
+    и задержка (время от постановки в очередь до начала обработки).
+    """
+
+    def __init__(self, workers: int = 8, on_error: Optional[Callable[[Exception], bool]] = None):
+        self.workers = workers
+        self.on_error = on_error
+        self._shards = [_Shard(index) for index in range(workers)]
+        self._next = 0  # для обновлений без чата - по кругу
+        for shard in self._shards:
+            shard.thread = threading.Thread(target=self._run, args=(shard,),
+                                            name=f'chat-worker-{shard.index}', daemon=True)
+            shard.thread.start()
+
+    def submit(self, key: Optional[Hashable], func: Callable, *args, **kwargs):
+        """Поставить задачу в очередь шарда, которому принадлежит key"""
+        if key is None:
+            self._next = (self._next + 1) % self.workers
+            index = self._next
+        else:
+            index = hash(key) % self.workers
+        self._shards[index].queue.put((time.monotonic(), func, args, kwargs))
+
+    def _run(self, shard: _Shard):
+        while True:
+            enqueued_at, func, args, kwargs = shard.queue.get()
+            started = time.monotonic()
+            shard.last_lag = started - enqueued_at
+            if shard.last_lag > shard.max_lag:
+                shard.max_lag = shard.last_lag
+            shard.busy_since = started
+            try:
+                func(*args, **kwargs)
+            except Exception as e:
+                if not (self.on_error and self.on_error(e)):
+                    logger.error(f"Update processing error in shard {shard.index}: {e}")
+            finally:
+                shard.busy_since = None
+                shard.processed += 1
+
+    def queue_depth(self) -> int:
+        """Общее количество ожидающих обновлений"""
+        return sum(shard.queue.qsize() for shard in self._shards)
+
+    def stats(self) -> List[Dict]:
+        """Состояние шардов: глубина очереди, обработано, задержка (мс), время текущей задачи (мс)"""
+        now = time.monotonic()
+        result = []
+        for shard in self._shards:
+            busy_since = shard.busy_since
+            result.append({
+                'shard': shard.index,
+                'depth': shard.queue.qsize(),
+                'processed': shard.processed,
+                'last_lag_ms': round(shard.last_lag * 1000, 1),
+                'max_lag_ms': round(shard.max_lag * 1000, 1),
+                'busy_ms': round((now - busy_since) * 1000, 1) if busy_since else 0.0
+            })
+        return result
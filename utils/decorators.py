@@ -1,17 +1,42 @@
 # utils/decorators.py - декораторы для бота
 
 import functools
+import inspect
 from utils.logger import get_logger
 
 logger = get_logger(__name__)
 
 def admin_required(func):
-    """Декоратор для проверки прав администратора"""
+    """Декоратор для проверки прав администратора (первый аргумент - message или call).
+
+    Поддерживает и обычные обработчики, и корутины AsyncTeleBot.
+    """
+    def allowed(args) -> bool:
+        from services.user_service import is_admin
+
+        user_id = None
+        if args and hasattr(args[0], 'from_user'):
+            user_id = args[0].from_user.id
+
+        if user_id is None or not is_admin(user_id):
+            logger.warning(f"Admin function {func.__name__} denied for user {user_id}")
+            return False
+
+        logger.info(f"Admin function called: {func.__name__} by {user_id}")
+        return True
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            if not allowed(args):
+                return None
+            return await func(*args, **kwargs)
+        return async_wrapper
+
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        # Здесь можно добавить проверку на администратора
-        # Пока что просто логируем
-        logger.info(f"Admin function called: {func.__name__}")
+        if not allowed(args):
+            return None
         return func(*args, **kwargs)
     return wrapper
 
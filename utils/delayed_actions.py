@@ -0,0 +1,99 @@
+# utils/delayed_actions.py - отложенное выполнение действий (правок сообщений) без блокировки обработчиков
+
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Callable, Dict, List, Tuple, Hashable
+from config import EDIT_DELAY, DELAYED_ACTION_WORKERS
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+class DelayedActionScheduler:
+    """Очередь таймеров на min-heap: действие выполняется через заданную задержку.
+
+    Обработчик только ставит действие в очередь и сразу освобождает поток
+    telebot. Один поток ждет ближайший срок и передает действия в небольшой
+    пул исполнителей. Действие с тем же ключом (например, правка того же
+    сообщения) заменяет ранее запланированное - выполняется только последнее.
+    """
+
+    def __init__(self, workers: int = 4):
+        self.workers = workers
+        self._heap: List[Tuple[float, int, Hashable]] = []
+        self._actions: Dict[Hashable, Tuple[int, Callable, tuple, dict]] = {}
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def schedule(self, delay: float, func: Callable, *args, key: Optional[Hashable] = None, **kwargs):
+        """Выполнить func(*args, **kwargs) через delay секунд"""
+        with self._cond:
+            self._ensure_started()
+            seq = next(self._counter)
+            if key is None:
+                key = ('seq', seq)
+            # Прежнее действие с этим ключом остается в куче и пропускается по seq
+            self._actions[key] = (seq, func, args, kwargs)
+            due = time.monotonic() + max(delay, 0)
+            heapq.heappush(self._heap, (due, seq, key))
+            if self._heap[0][1] == seq:
+                self._cond.notify()
+
+    def pending(self) -> int:
+        """Количество запланированных действий"""
+        with self._cond:
+            return len(self._actions)
+
+    def _ensure_started(self):
+        if self._thread is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='delayed-action')
+            self._thread = threading.Thread(target=self._run, name='delayed-actions', daemon=True)
+            self._thread.start()
+
+    def _pop_due(self) -> List[Tuple[Callable, tuple, dict]]:
+        """Забрать из кучи все действия, срок которых наступил (под блокировкой)"""
+        now = time.monotonic()
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            _, seq, key = heapq.heappop(self._heap)
+            action = self._actions.get(key)
+            if action is not None and action[0] == seq:
+                del self._actions[key]
+                due.append(action[1:])
+        return due
+
+    def _run(self):
+        while True:
+            with self._cond:
+                due = self._pop_due()
+                while not due:
+                    timeout = self._heap[0][0] - time.monotonic() if self._heap else None
+                    self._cond.wait(timeout)
+                    due = self._pop_due()
+
+            for func, args, kwargs in due:
+                self._executor.submit(self._execute, func, args, kwargs)
+
+    @staticmethod
+    def _execute(func: Callable, args: tuple, kwargs: dict):
+        try:
+            func(*args, **kwargs)
+        except Exception as e:
+            logger.error(f"Delayed action {getattr(func, '__name__', func)} failed: {e}")
+
+# Глобальный экземпляр планировщика
+delayed_actions = DelayedActionScheduler(workers=DELAYED_ACTION_WORKERS)
+
+# Вспомогательные функции
+def run_later(delay: float, func: Callable, *args, key: Optional[Hashable] = None, **kwargs):
+    """Выполнить функцию через delay секунд, не занимая текущий поток"""
+    delayed_actions.schedule(delay, func, *args, key=key, **kwargs)
+
+def edit_message_later(bot, chat_id: int, message_id: int, text: str, delay: float = EDIT_DELAY, **kwargs):
+    """Отредактировать сообщение через delay секунд (повторная правка того же сообщения заменяет прежнюю)"""
+    delayed_actions.schedule(delay, bot.edit_message_text, key=('edit', chat_id, message_id),
+                             chat_id=chat_id, message_id=message_id, text=text, **kwargs)
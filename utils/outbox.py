@@ -0,0 +1,321 @@
+# utils/outbox.py - очередь исходящих запросов к Bot API с ограничением частоты
+
+import asyncio
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Optional, Callable, Dict, List, Tuple
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Приоритеты: чем меньше число, тем раньше отправка
+PRIORITY_PAYMENT = 0   # подтверждения оплаты
+PRIORITY_DEFAULT = 5   # ответы пользователю, правки меню
+PRIORITY_BULK = 9      # рассылки
+
+_priority: contextvars.ContextVar = contextvars.ContextVar('send_priority', default=PRIORITY_DEFAULT)
+
+@contextmanager
+def send_priority(priority: int):
+    """Приоритет отправок внутри блока:
+
+    with send_priority(PRIORITY_PAYMENT):
+        bot.send_message(chat_id, text)
+    """
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+def current_priority() -> int:
+    return _priority.get()
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Задержка из ответа 429 Too Many Requests (None - ошибка другого типа)"""
+    if getattr(error, 'error_code', None) != 429:
+        return None
+    parameters = (getattr(error, 'result_json', None) or {}).get('parameters') or {}
+    return float(parameters.get('retry_after', 1))
+
+class TokenBucket:
+    """Ведро токенов: rate токенов в секунду, не больше capacity подряд"""
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated', 'blocked_until')
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+        self.blocked_until = 0.0  # пауза после 429
+
+    def wait_time(self, now: float) -> float:
+        """Через сколько секунд будет доступен токен (0 - доступен сейчас)"""
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def consume(self):
+        self.tokens -= 1
+
+    def is_idle(self, now: float) -> bool:
+        return now >= self.blocked_until and self.tokens + (now - self.updated) * self.rate >= self.capacity
+
+class SendJob:
+    """Запрос в очереди отправки"""
+    __slots__ = ('priority', 'seq', 'chat_id', 'func', 'args', 'kwargs', 'future', 'enqueued_at', 'attempts')
+
+    def __init__(self, priority: int, seq: int, chat_id, func: Callable, args: tuple, kwargs: dict, future):
+        self.priority = priority
+        self.seq = seq
+        self.chat_id = chat_id
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.future = future
+        self.enqueued_at = time.monotonic()
+        self.attempts = 0
+
+    def __lt__(self, other: 'SendJob') -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+class SendScheduler:
+    """Планирование отправок (без потоков): кто следующий и когда.
+
+    Порядок - по приоритету, внутри приоритета - по времени постановки.
+    Запрос выполняется, если есть токен в общем ведре и в ведре его чата;
+    в каждом чате одновременно выполняется не больше одного запроса, поэтому
+    сообщения одного чата уходят по порядку.
+    """
+
+    def __init__(self, global_rate: float = 30.0, chat_rate: float = 1.0, chat_burst: float = 3.0,
+                 max_chats: int = 10000):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_chats = max_chats
+        self._global = TokenBucket(global_rate, global_rate, time.monotonic())
+        self._chats: Dict[object, TokenBucket] = {}
+        self._ready: List[SendJob] = []
+        self._delayed: List[Tuple[float, SendJob]] = []
+        self._in_flight = set()
+        self._seq = itertools.count()
+        self._stats = {'sent': 0, 'retried': 0, 'failed': 0}
+        self._wait: Dict[int, List[float]] = {}  # приоритет -> [количество, сумма, максимум]
+
+    def push(self, chat_id, func: Callable, args: tuple, kwargs: dict, priority: int, future) -> SendJob:
+        job = SendJob(priority, next(self._seq), chat_id, func, args, kwargs, future)
+        heapq.heappush(self._ready, job)
+        return job
+
+    def _chat_bucket(self, chat_id, now: float) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= self.max_chats:
+                # Полные ведра без пауз ничего не ограничивают - их можно забыть
+                self._chats = {key: value for key, value in self._chats.items() if not value.is_idle(now)}
+            bucket = self._chats[chat_id] = TokenBucket(self.chat_rate, self.chat_burst, now)
+        return bucket
+
+    def next_job(self, now: float) -> Tuple[Optional[SendJob], Optional[float]]:
+        """Следующий запрос для выполнения, либо (None, сколько ждать; None - очередь пуста)"""
+        while self._delayed and self._delayed[0][0] <= now:
+            heapq.heappush(self._ready, heapq.heappop(self._delayed)[1])
+
+        job = None
+        wait = self._global.wait_time(now)
+        if wait == 0:
+            busy = []
+            while self._ready:
+                candidate = heapq.heappop(self._ready)
+                if candidate.chat_id is not None and candidate.chat_id in self._in_flight:
+                    busy.append(candidate)
+                    continue
+                if candidate.chat_id is not None:
+                    bucket = self._chat_bucket(candidate.chat_id, now)
+                    chat_wait = bucket.wait_time(now)
+                    if chat_wait > 0:
+                        heapq.heappush(self._delayed, (now + chat_wait, candidate))
+                        continue
+                    bucket.consume()
+                    self._in_flight.add(candidate.chat_id)
+                self._global.consume()
+                job = candidate
+                break
+            for candidate in busy:
+                heapq.heappush(self._ready, candidate)
+            if job is not None:
+                self._record_wait(job, now)
+                return job, 0.0
+            wait = None
+
+        if self._delayed:
+            delayed_wait = self._delayed[0][0] - now
+            wait = delayed_wait if wait is None else min(wait, delayed_wait)
+        return None, wait if (self._ready or self._delayed) else None
+
+    def _record_wait(self, job: SendJob, now: float):
+        if job.attempts:
+            return
+        waited = now - job.enqueued_at
+        stats = self._wait.setdefault(job.priority, [0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += waited
+        stats[2] = max(stats[2], waited)
+
+    def finish(self, job: SendJob, failed: bool = False):
+        self._in_flight.discard(job.chat_id)
+        self._stats['failed' if failed else 'sent'] += 1
+
+    def retry(self, job: SendJob, delay: float, now: float):
+        """Повтор после 429: чат (или вся очередь для запросов без чата) ставится на паузу"""
+        self._in_flight.discard(job.chat_id)
+        job.attempts += 1
+        self._stats['retried'] += 1
+        bucket = self._chat_bucket(job.chat_id, now) if job.chat_id is not None else self._global
+        bucket.blocked_until = max(bucket.blocked_until, now + delay)
+        heapq.heappush(self._delayed, (now + delay, job))
+
+    def stats(self) -> Dict:
+        return {
+            **self._stats,
+            'queued': len(self._ready) + len(self._delayed),
+            'in_flight': len(self._in_flight),
+            'wait_by_priority': {
+                priority: {
+                    'count': count,
+                    'avg_ms': round(total / count * 1000, 1) if count else 0.0,
+                    'max_ms': round(maximum * 1000, 1)
+                }
+                for priority, (count, total, maximum) in sorted(self._wait.items())
+            }
+        }
+
+class Outbox:
+    """Очередь отправки для TeleBot: поток-диспетчер и пул потоков для запросов.
+
+    call() ставит запрос в очередь и ждет результат, поэтому вызывающий код
+    получает Message как при прямом вызове. Ошибки 429 повторяются после
+    retry_after, остальные ошибки передаются вызывающему.
+    """
+
+    def __init__(self, global_rate: float = 30.0, chat_rate: float = 1.0, chat_burst: float = 3.0,
+                 workers: int = 8, max_retries: int = 5):
+        self.max_retries = max_retries
+        self._scheduler = SendScheduler(global_rate, chat_rate, chat_burst)
+        self._cond = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='outbox')
+        self._thread = threading.Thread(target=self._run, name='outbox-dispatcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, chat_id, func: Callable, /, *args, **kwargs) -> Future:
+        """Поставить запрос в очередь (приоритет берется из send_priority)"""
+        future = Future()
+        with self._cond:
+            self._scheduler.push(chat_id, func, args, kwargs, current_priority(), future)
+            self._cond.notify()
+        return future
+
+    def call(self, chat_id, func: Callable, /, *args, **kwargs):
+        """Выполнить запрос через очередь и дождаться результата"""
+        return self.submit(chat_id, func, *args, **kwargs).result()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                job, wait = self._scheduler.next_job(time.monotonic())
+                while job is None:
+                    self._cond.wait(wait)
+                    job, wait = self._scheduler.next_job(time.monotonic())
+            self._executor.submit(self._execute, job)
+
+    def _execute(self, job: SendJob):
+        try:
+            result = job.func(*job.args, **job.kwargs)
+        except Exception as e:
+            delay = retry_after(e)
+            with self._cond:
+                if delay is not None and job.attempts < self.max_retries:
+                    logger.warning(f"Rate limited for chat {job.chat_id}, retry after {delay}s")
+                    self._scheduler.retry(job, delay, time.monotonic())
+                    self._cond.notify()
+                    return
+                self._scheduler.finish(job, failed=True)
+                self._cond.notify()
+            job.future.set_exception(e)
+            return
+        with self._cond:
+            self._scheduler.finish(job)
+            self._cond.notify()
+        job.future.set_result(result)
+
+    def stats(self) -> Dict:
+        """Счетчики очереди: отправлено, повторы, ошибки, длина очереди, ожидание по приоритетам"""
+        with self._cond:
+            return self._scheduler.stats()
+
+class AsyncOutbox:
+    """Очередь отправки для AsyncTeleBot: то же планирование в задаче event loop"""
+
+    def __init__(self, global_rate: float = 30.0, chat_rate: float = 1.0, chat_burst: float = 3.0,
+                 max_retries: int = 5):
+        self.max_retries = max_retries
+        self._scheduler = SendScheduler(global_rate, chat_rate, chat_burst)
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._tasks = set()
+
+    def _ensure_started(self):
+        if self._dispatcher is None:
+            self._wakeup = asyncio.Event()
+            self._dispatcher = asyncio.get_running_loop().create_task(self._run())
+
+    async def call(self, chat_id, coro_func: Callable, /, *args, **kwargs):
+        """Выполнить запрос через очередь и дождаться результата"""
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        self._scheduler.push(chat_id, coro_func, args, kwargs, current_priority(), future)
+        self._wakeup.set()
+        return await future
+
+    async def _run(self):
+        while True:
+            job, wait = self._scheduler.next_job(time.monotonic())
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            task = asyncio.get_running_loop().create_task(self._execute(job))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _execute(self, job: SendJob):
+        try:
+            result = await job.func(*job.args, **job.kwargs)
+        except Exception as e:
+            delay = retry_after(e)
+            if delay is not None and job.attempts < self.max_retries:
+                logger.warning(f"Rate limited for chat {job.chat_id}, retry after {delay}s")
+                self._scheduler.retry(job, delay, time.monotonic())
+            else:
+                self._scheduler.finish(job, failed=True)
+                if not job.future.done():
+                    job.future.set_exception(e)
+            self._wakeup.set()
+            return
+        self._scheduler.finish(job)
+        if not job.future.done():
+            job.future.set_result(result)
+        self._wakeup.set()
+
+    def stats(self) -> Dict:
+        return self._scheduler.stats()
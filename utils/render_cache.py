@@ -0,0 +1,113 @@
+# utils/render_cache.py - кэш отображаемого содержимого сообщений для пропуска пустых правок
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Tuple
+from config import RENDER_CACHE_SIZE
+
+def _digest(*parts) -> bytes:
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        h.update(b'\x00' if part is None else str(part).encode('utf-8'))
+        h.update(b'\x1f')
+    return h.digest()
+
+def markup_json(markup) -> Optional[str]:
+    """Разметка клавиатуры в JSON (объект telebot, готовая строка или словарь)"""
+    if markup is None or isinstance(markup, str):
+        return markup
+    if hasattr(markup, 'to_json'):
+        return markup.to_json()
+    return json.dumps(markup, ensure_ascii=False, sort_keys=True, default=str)
+
+def source_signature(text: str, parse_mode: Optional[str], markup) -> bytes:
+    """Хэш того, что бот отправляет: исходный текст, режим разметки и клавиатура"""
+    return _digest(text, parse_mode, markup_json(markup))
+
+def rendered_signature(message) -> bytes:
+    """Хэш того, что видит пользователь (текст и клавиатура из ответа Bot API или callback)"""
+    return _digest(message.text, markup_json(message.reply_markup))
+
+class RenderCache:
+    """Последнее отображенное содержимое по (chat_id, message_id).
+
+    Для каждого сообщения хранится пара хэшей: исходное содержимое (текст,
+    parse_mode, клавиатура) и отображенное (как его вернул Bot API). Правка с тем
+    же исходным содержимым пропускается без запроса к API. Callback запрос несет
+    актуальное отображенное сообщение - если оно не совпадает с кэшем (сообщение
+    изменил другой процесс), запись сбрасывается.
+    """
+
+    def __init__(self, max_size: int = 50000):
+        self.max_size = max_size
+        self._entries: 'OrderedDict[Tuple[int, int], Tuple[bytes, bytes]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'skipped': 0, 'edited': 0, 'invalidated': 0}
+
+    def is_current(self, chat_id: int, message_id: int, text: str, parse_mode: Optional[str] = None,
+                   markup=None) -> bool:
+        """Сообщение уже показывает это содержимое"""
+        signature = source_signature(text, parse_mode, markup)
+        with self._lock:
+            entry = self._entries.get((chat_id, message_id))
+            return entry is not None and entry[0] == signature
+
+    def should_edit(self, chat_id: int, message_id: int, text: str, parse_mode: Optional[str],
+                    markup) -> bool:
+        """Проверка перед правкой: False - содержимое не изменилось, запрос не нужен"""
+        signature = source_signature(text, parse_mode, markup)
+        with self._lock:
+            entry = self._entries.get((chat_id, message_id))
+            if entry is not None and entry[0] == signature:
+                self._entries.move_to_end((chat_id, message_id))
+                self._stats['skipped'] += 1
+                return False
+            self._stats['edited'] += 1
+            return True
+
+    def store(self, chat_id: int, message_id: int, text: str, parse_mode: Optional[str], markup,
+              message=None):
+        """Запомнить содержимое после отправки или правки (message - ответ Bot API)"""
+        signature = source_signature(text, parse_mode, markup)
+        rendered = rendered_signature(message) if message is not None and message is not True else None
+        key = (chat_id, message_id)
+        with self._lock:
+            if rendered is None:
+                # Ответ без сообщения ("message is not modified") - отображение не изменилось
+                entry = self._entries.get(key)
+                rendered = entry[1] if entry is not None else b''
+            self._entries[key] = (signature, rendered)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def validate(self, message):
+        """Сверить кэш с фактическим сообщением из callback запроса"""
+        # Недоступное (старое) сообщение приходит без текста - сверять не с чем
+        if message is None or getattr(message, 'text', None) is None:
+            return
+        key = (message.chat.id, message.message_id)
+        rendered = rendered_signature(message)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] and entry[1] != rendered:
+                del self._entries[key]
+                self._stats['invalidated'] += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {**self._stats, 'entries': len(self._entries)}
+
+# Глобальный экземпляр кэша
+render_cache = RenderCache(max_size=RENDER_CACHE_SIZE)
+
+def is_message_current(chat_id: int, message_id: int, text: str, parse_mode: Optional[str] = None,
+                       markup=None) -> bool:
+    """Показывает ли сообщение уже это содержимое (без запроса к API)"""
+    return render_cache.is_current(chat_id, message_id, text, parse_mode, markup)
+
+def get_render_cache_stats() -> Dict:
+    """Статистика кэша: пропущенные и выполненные правки, сбросы, размер"""
+    return render_cache.stats()
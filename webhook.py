@@ -1,11 +1,14 @@
 # webhook.py - обработка webhook уведомлений от YooKassa
 
-import json
+import threading
 from datetime import datetime
 from flask import Flask, request, jsonify
-from services.payment_service import process_webhook_payment_succeeded, process_webhook_payment_failed, process_payment_success
+from services.payment_service import process_webhook_payment_succeeded, process_webhook_payment_failed, process_payment_success, resolve_webhook_payment_id, payment_contexts
+from services.webhook_queue import WebhookQueue, WebhookWorkers
+from db.database import get_read_cache_stats
 from utils.logger import get_logger
-from config import WEBHOOK_HOST, WEBHOOK_PORT, DEBUG, API_TOKEN
+from config import (WEBHOOK_PORT, DEBUG, API_TOKEN, WEBHOOK_QUEUE_FILE, WEBHOOK_WORKERS, WEBHOOK_MAX_ATTEMPTS,
+                    WEBHOOK_RETRY_MAX, WEBHOOK_DEDUP_TTL)
 
 logger = get_logger(__name__)
 
@@ -74,118 +77,123 @@ def index():
     </html>
     '''
 
+# ===== ОБРАБОТКА УВЕДОМЛЕНИЙ =====
+
+# События, которые сохраняются в очередь; остальные только логируются
+QUEUED_EVENTS = ('payment.succeeded', 'payment.failed')
+
+_notify_bot = None
+
+def get_notify_bot():
+    """Бот для уведомлений из webhook процесса (один на процесс)"""
+    global _notify_bot
+    if _notify_bot is None:
+        import telebot
+        _notify_bot = telebot.TeleBot(API_TOKEN)
+    return _notify_bot
+
+def handle_webhook_event(event: str, data: dict) -> bool:
+    """Обработка уведомления из очереди. False или исключение - повтор позже."""
+    if event == 'payment.succeeded':
+        if not process_webhook_payment_succeeded(data):
+            return False
+        # Получаем наш payment_id из metadata или по YooKassa ID
+        payment_id = resolve_webhook_payment_id(data)
+        if payment_id:
+            # Подписка уже активирована - ошибка уведомления не повод повторять задание
+            try:
+                process_payment_success(get_notify_bot(), payment_id)
+                logger.info(f"Payment {payment_id} success notification sent to user")
+            except Exception as e:
+                logger.error(f"Error sending payment success notification: {e}")
+        else:
+            logger.warning("No payment_id in webhook metadata for user notification")
+        return True
+
+    if event == 'payment.failed':
+        return process_webhook_payment_failed(data)
+
+    logger.warning(f"Unhandled queued webhook event: {event}")
+    return True
+
+_webhook_workers = None
+_webhook_workers_lock = threading.Lock()
+
+def start_webhook_workers() -> WebhookWorkers:
+    """Очередь уведомлений и потоки ее обработки (создаются и запускаются при первом вызове).
+
+    Вызывается при запуске сервера, чтобы сразу выполнить уведомления, оставшиеся
+    с прошлого запуска, и из обработчиков запросов - поэтому под gunicorn потоки
+    запускаются в рабочем процессе, а не в мастере до fork.
+    """
+    global _webhook_workers
+    if _webhook_workers is None:
+        with _webhook_workers_lock:
+            if _webhook_workers is None:
+                queue = WebhookQueue(WEBHOOK_QUEUE_FILE, max_attempts=WEBHOOK_MAX_ATTEMPTS,
+                                     retry_max=WEBHOOK_RETRY_MAX, dedup_ttl=WEBHOOK_DEDUP_TTL)
+                workers = WebhookWorkers(queue, handle_webhook_event, workers=WEBHOOK_WORKERS)
+                workers.start()
+                _webhook_workers = workers
+    return _webhook_workers
+
+def _parse_webhook_data():
+    """JSON тела запроса (None, если разобрать не удалось)"""
+    data = request.get_json(force=True, silent=True)
+    if data is None:
+        raw_data = request.get_data(as_text=True)
+        logger.error(f"Cannot parse webhook data as JSON (length: {len(raw_data)}): {raw_data[:500]}")
+    return data
+
 @app.route('/yookassa/webhook', methods=['GET', 'POST', 'PUT'])
 def yookassa_webhook():
-    """Обработка webhook уведомлений от YooKassa"""
+    """Прием webhook уведомлений от YooKassa: проверка, запись в очередь и сразу ответ 200.
 
-    try:
-        logger.info(f"Webhook received: Method={request.method}, URL={request.url}")
-        logger.info(f"Headers: {dict(request.headers)}")
-        logger.info(f"Content-Type: {request.headers.get('Content-Type')}")
-        logger.info(f"Content-Length: {request.headers.get('Content-Length')}")
-
-        # Получаем данные от YooKassa - всегда пробуем парсить как JSON
-        try:
-            # Сначала пробуем стандартный способ
-            data = request.get_json()
-        except Exception:
-            try:
-                # Если не получилось, пробуем force parsing
-                data = request.get_json(force=True)
-            except Exception:
-                # Если и force не помог, получаем raw data
-                raw_data = request.get_data(as_text=True)
-                logger.info(f"Raw webhook data (length: {len(raw_data)}): {raw_data[:500]}...")
-                try:
-                    # Пробуем распарсить как JSON
-                    data = json.loads(raw_data)
-                except Exception as e:
-                    logger.error(f"Cannot parse webhook data as JSON: {e}")
-                    logger.error(f"Raw data: {raw_data}")
-                    return jsonify({'status': 'error', 'message': 'Cannot parse data'}), 400
-
-        if not data:
-            logger.warning("No data received in webhook")
-            return jsonify({'status': 'error', 'message': 'No data received'}), 400
-
-        logger.info(f"Webhook data: {data}")
-
-        # Проверяем тип события
-        event = data.get('event')
-        logger.info(f"Received webhook event: {event}")
-
-        if event == 'payment.succeeded':
-            # Платеж успешно завершен
-            logger.info(f"Processing payment.succeeded event")
-
-            # Отладка извлечения metadata
-            logger.info(f"Full data structure: {data}")
-            object_data = data.get('object', {})
-            logger.info(f"Object data: {object_data}")
-            metadata = object_data.get('metadata', {})
-            logger.info(f"Metadata: {metadata}")
-            payment_id = metadata.get('payment_id')
-            logger.info(f"Extracted payment_id: {payment_id}")
-
-            if process_webhook_payment_succeeded(data):
-                # Создаем временный экземпляр бота для отправки уведомления
-                try:
-                    import telebot
-                    temp_bot = telebot.TeleBot(API_TOKEN)
-
-                    # Получаем информацию о платеже из metadata
-                    metadata = data.get('object', {}).get('metadata', {})
-                    payment_id = metadata.get('payment_id')
-
-                    if payment_id:
-                        # Отправляем уведомление пользователю
-                        process_payment_success(temp_bot, payment_id)
-                        logger.info("Payment success notification sent to user")
-                    else:
-                        logger.warning("No payment_id in webhook metadata for user notification")
-
-                except Exception as e:
-                    logger.error(f"Error sending payment success notification: {e}")
-
-                logger.info("Payment succeeded webhook processed successfully")
-                return jsonify({'status': 'success'}), 200
-            else:
-                logger.error("Failed to process payment succeeded webhook")
-                return jsonify({'status': 'error', 'message': 'Processing failed'}), 500
-
-        elif event == 'payment.canceled':
-            # Платеж отменен
-            payment_data = data.get('object', {})
-            logger.info(f"Payment {payment_data.get('id')} was canceled")
-            # Можно добавить дополнительную обработку отмены платежа
-            return jsonify({'status': 'success'}), 200
-
-        elif event == 'payment.failed':
-            # Платеж не удался
-            if process_webhook_payment_failed(data):
-                logger.info("Payment failed webhook processed successfully")
-                return jsonify({'status': 'success'}), 200
-            else:
-                logger.error("Failed to process payment failed webhook")
-                return jsonify({'status': 'error', 'message': 'Processing failed'}), 500
-
-        elif event == 'payment.waiting_for_capture':
-            # Платеж ожидает подтверждения
-            payment_data = data.get('object', {})
-            logger.info(f"Payment {payment_data.get('id')} is waiting for capture")
-            return jsonify({'status': 'success'}), 200
-
-        logger.warning(f"Unhandled webhook event: {event}")
+    Обработка платежа и уведомление пользователя выполняются потоками очереди,
+    поэтому ответ не зависит от хранилища и Telegram и YooKassa не повторяет запрос.
+    """
+
+    data = _parse_webhook_data()
+    if not data:
+        return jsonify({'status': 'error', 'message': 'Cannot parse data'}), 400
+
+    event = data.get('event') if isinstance(data, dict) else None
+    object_data = data.get('object') if isinstance(data, dict) else None
+    if not isinstance(event, str) or not isinstance(object_data, dict):
+        # Как и раньше, разобранное уведомление подтверждаем - повтор не сделает его корректным
+        logger.warning(f"Invalid webhook notification: {str(data)[:500]}")
         return jsonify({'status': 'success'}), 200
 
+    if event not in QUEUED_EVENTS:
+        # payment.canceled, payment.waiting_for_capture и прочие - только фиксируем
+        logger.info(f"Webhook event {event} for payment {object_data.get('id')}")
+        return jsonify({'status': 'success'}), 200
+
+    # YooKassa повторяет уведомления - событие по платежу принимаем один раз
+    payment_object_id = object_data.get('id')
+    dedup_key = f"{event}:{payment_object_id}" if payment_object_id else None
+    try:
+        job_id = start_webhook_workers().submit(event, data, dedup_key)
     except Exception as e:
-        logger.error(f"Webhook processing error: {e}")
-        return jsonify({'status': 'error', 'message': str(e)}), 500
+        # Не сохранили - отвечаем ошибкой, YooKassa пришлет уведомление повторно
+        logger.error(f"Cannot queue webhook event {event}: {e}")
+        return jsonify({'status': 'error', 'message': 'Queue unavailable'}), 500
+
+    if job_id is None:
+        logger.info(f"Duplicate webhook event {event} for payment {payment_object_id} ignored")
+        return jsonify({'status': 'success'}), 200
+
+    logger.info(f"Webhook event {event} for payment {payment_object_id} queued as job {job_id}")
+    return jsonify({'status': 'success'}), 200
 
 @app.route('/health', methods=['GET'])
 def health_check():
     """Проверка работоспособности сервера"""
-    return jsonify({'status': 'healthy'}), 200
+    # Проверка не создает очередь и не запускает потоки - только показывает уже запущенные
+    workers = _webhook_workers
+    return jsonify({'status': 'healthy', 'read_cache': get_read_cache_stats(),
+                    'payment_contexts': payment_contexts.stats(),
+                    'webhook_queue': workers.stats() if workers is not None else None}), 200
 
 @app.route('/test-payment/<user_id>/<plan>', methods=['GET'])
 def test_payment(user_id, plan):
@@ -222,4 +230,5 @@ def test_payment(user_id, plan):
 if __name__ == '__main__':
     # В продакшене используйте WSGI сервер (gunicorn, uwsgi)
     logger.info(f"Starting webhook server on port {WEBHOOK_PORT}")
+    start_webhook_workers()
     app.run(host='0.0.0.0', port=WEBHOOK_PORT, debug=DEBUG)